@@ -0,0 +1,68 @@
+"""
+Бенчмарк: объём передачи и скорость загрузки страниц товаров без сжатия и со сжатием gzip, br и zstd.
+
+Stub-сервер сжимает ответы так, как клиент попросил в Accept-Encoding; сжатия без установленного
+декодера (Brotli, zstandard) клиент не объявляет и получает ответ без сжатия. Перед замером товары,
+извлечённые из сжатых ответов, сверяются с несжатыми.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_content_encoding --requests 300 --concurrency 20
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fixtures import product_slug
+from benchmarks.stub_server import build_app, compression_middleware, start_stub_server
+from metro_parser.extract import extract_product
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.logger import logger
+
+CODINGS = ("identity", "gzip", "br", "zstd")
+
+
+async def run(urls, concurrency, coding):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with HTTPClient(save_responses=False, accept_encodings=(coding,)) as client:
+
+        async def fetch(url):
+            async with semaphore:
+                return extract_product(await client.fetch(url, raw=True), url)
+
+        return client.accept_encoding, await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def main(requests, concurrency):
+    stats = {}
+    runner, base_url = await start_stub_server(build_app(middlewares=[compression_middleware(stats=stats)]))
+    urls = [f"{base_url}/products/{product_slug(index)}" for index in range(requests)]
+    try:
+        _, expected = await run(urls, concurrency, "identity")
+        for coding in CODINGS:
+            stats["bytes_sent"] = 0
+            start = time.perf_counter()
+            accepted, products = await run(urls, concurrency, coding)
+            elapsed = time.perf_counter() - start
+            if products != expected:
+                raise SystemExit(f"Товары из ответов {coding} отличаются от несжатых")
+            if accepted != coding:
+                print(f"{coding:<9} декодер не установлен, сжатие не объявляется")
+                continue
+            print(
+                f"{coding:<9} {requests / elapsed:8.1f} стр/с ({elapsed:.2f} с), "
+                f"передано {stats['bytes_sent'] / requests / 1024:6.1f} КБ/стр"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--requests", type=int, default=300)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    asyncio.run(main(args.requests, args.concurrency))
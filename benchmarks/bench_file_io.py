@@ -0,0 +1,86 @@
+"""
+Бенчмарк: влияние сохранения HTML-ответов на скорость загрузки.
+
+Страницы товаров загружаются со stub-сервера тремя способами: без сохранения ответов,
+с синхронной записью в цикле событий и с фоновой записью через BackgroundFileWriter.
+Параметр --disk-latency добавляет задержку к каждой записи, имитируя медленный диск
+(сетевую ФС, HDD под нагрузкой).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_file_io --products 300 --concurrency 20 --disk-latency 5
+"""
+import argparse
+import asyncio
+import tempfile
+import time
+
+from benchmarks.stub_server import build_app, start_stub_server
+from metro_parser.utils.file_handler import FileHandler
+from metro_parser.utils.http_client import HTTPClient
+
+SCENARIOS = (
+    ("без сохранения", False, False),
+    ("синхронная запись", True, False),
+    ("фоновая запись", True, True),
+)
+
+
+def slow_disk(latency):
+    """
+    Оборачивает FileHandler.write_response задержкой на каждую запись.
+    :param latency: Задержка в секундах.
+    """
+    write_response = FileHandler.write_response
+
+    def slow_write_response(*args, **kwargs):
+        time.sleep(latency)
+        return write_response(*args, **kwargs)
+
+    FileHandler.write_response = staticmethod(slow_write_response)
+
+
+async def crawl(base_url, products, concurrency, save_responses, async_file_io, responses_dir):
+    """
+    Загружает страницы товаров.
+    :return: Кортеж (время загрузки всех страниц, время вместе с дозаписью ответов на диск), в секундах.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    client = HTTPClient(save_responses=save_responses, responses_dir=responses_dir, async_file_io=async_file_io)
+
+    async def fetch(index):
+        async with semaphore:
+            await client.fetch(f"{base_url}/products/product-{index}", raw=True)
+
+    start = time.perf_counter()
+    async with client:
+        await asyncio.gather(*(fetch(index) for index in range(products)))
+        fetched = time.perf_counter() - start
+    return fetched, time.perf_counter() - start
+
+
+async def main(products, concurrency):
+    runner, base_url = await start_stub_server(build_app())
+    try:
+        for name, save_responses, async_file_io in SCENARIOS:
+            with tempfile.TemporaryDirectory() as responses_dir:
+                fetched, elapsed = await crawl(
+                    base_url, products, concurrency, save_responses, async_file_io, responses_dir
+                )
+            print(
+                f"{name:<18} загрузка {fetched:6.2f} с ({products / fetched:7.1f} товаров/с), "
+                f"с дозаписью на диск {elapsed:6.2f} с"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--products", type=int, default=300)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    arg_parser.add_argument("--disk-latency", type=float, default=0, help="Задержка записи файла (в мс)")
+    args = arg_parser.parse_args()
+
+    if args.disk_latency:
+        slow_disk(args.disk_latency / 1000)
+    asyncio.run(main(args.products, args.concurrency))
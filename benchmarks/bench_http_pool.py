@@ -0,0 +1,67 @@
+"""
+Бенчмарк: запросы в секунду с отдельной сессией на каждый запрос против общего пула соединений.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_http_pool --requests 500 --concurrency 50
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fixtures import product_slug
+from benchmarks.stub_server import build_app, start_stub_server
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.logger import logger
+
+
+async def per_request_sessions(urls, concurrency):
+    """
+    Старое поведение: новый HTTPClient (сессия и коннектор) на каждую страницу.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def fetch(url):
+        async with semaphore:
+            async with HTTPClient() as client:
+                return await client.fetch(url)
+
+    await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def shared_session(urls, concurrency):
+    """
+    Новое поведение: один HTTPClient с пулом соединений на весь прогон.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with HTTPClient() as client:
+
+        async def fetch(url):
+            async with semaphore:
+                return await client.fetch(url)
+
+        await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def main(requests, concurrency):
+    runner, base_url = await start_stub_server(build_app())
+    urls = [f"{base_url}/products/{product_slug(index)}" for index in range(requests)]
+    try:
+        for name, scenario in (("per-request session", per_request_sessions), ("shared pool", shared_session)):
+            start = time.perf_counter()
+            await scenario(urls, concurrency)
+            elapsed = time.perf_counter() - start
+            print(f"{name:<20} {requests / elapsed:8.1f} req/s ({elapsed:.2f} с)")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--requests", type=int, default=500)
+    arg_parser.add_argument("--concurrency", type=int, default=50)
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    asyncio.run(main(args.requests, args.concurrency))
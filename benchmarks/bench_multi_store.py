@@ -0,0 +1,112 @@
+"""
+Бенчмарк: цены товаров в нескольких магазинах (STORE_IDS).
+
+Stub-сервер отдаёт страницы товаров с ценами, зависящими от магазина в cookie сессии. Сравниваются:
+отдельный проход по товарам для каждого магазина с полным разбором каждой страницы и загрузка товара
+во всех магазинах одновременно (HTTPClient.fetch_stores) с разбором общих полей один раз
+(extract_store_product). Перед замером цены обоих способов сверяются с данными stub-сервера.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_multi_store --requests 200 --stores 4 --concurrency 20 --latency 20
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fixtures import product_data, product_slug
+from benchmarks.stub_server import build_app, fault_middleware, start_stub_server
+from metro_parser.extract import extract_product, extract_store_product, PRICE_KEYS
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.logger import logger
+
+
+def expected_price(index, store):
+    data = product_data(index, store)
+    return data["rubles"] + data["pennies"] / 100
+
+
+async def per_store(client, urls, concurrency):
+    """
+    Отдельный проход для каждого магазина: каждая страница разбирается целиком.
+    :return: Список товаров со словарём цен по магазинам.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    parse_time = 0
+
+    async def fetch(url, store):
+        nonlocal parse_time
+        async with semaphore:
+            html_content = await client.fetch(url, raw=True, store=store)
+        start = time.perf_counter()
+        product = extract_product(html_content, url)
+        parse_time += time.perf_counter() - start
+        return product
+
+    products = {}
+    for store in client.stores:
+        for url, product in zip(urls, await asyncio.gather(*(fetch(url, store) for url in urls))):
+            merged = products.setdefault(url, {**product, "store_prices": {}})
+            merged["store_prices"][store] = {key: product[key] for key in PRICE_KEYS}
+    return list(products.values()), parse_time
+
+
+async def all_stores(client, urls, concurrency):
+    """
+    Товар загружается во всех магазинах одновременно, общие поля разбираются один раз.
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+    parse_time = 0
+
+    async def fetch(url):
+        nonlocal parse_time
+        async with semaphore:
+            pages = await client.fetch_stores(url)
+        start = time.perf_counter()
+        product = extract_store_product(pages, url, client.stores)
+        parse_time += time.perf_counter() - start
+        return product
+
+    return await asyncio.gather(*(fetch(url) for url in urls)), parse_time
+
+
+SCENARIOS = {"по магазинам": per_store, "все магазины": all_stores}
+
+
+async def main(requests, stores, concurrency, latency):
+    runner, base_url = await start_stub_server(build_app(middlewares=[fault_middleware(latency / 1000)]))
+    urls = [f"{base_url}/products/{product_slug(index)}" for index in range(requests)]
+    store_ids = [str(10 + index) for index in range(stores)]
+    try:
+        async with HTTPClient(save_responses=False, stores=store_ids) as client:
+            results = {}
+            for name, scenario in SCENARIOS.items():
+                start = time.perf_counter()
+                products, parse_time = await scenario(client, urls, concurrency)
+                elapsed = time.perf_counter() - start
+                results[name] = products
+                print(
+                    f"{name:<13} {requests / elapsed:8.1f} товаров/с ({elapsed:.2f} с), "
+                    f"разбор {parse_time * 1000 / requests:5.2f} мс/товар"
+                )
+
+        for index, product in enumerate(results["все магазины"]):
+            for store in store_ids:
+                if product["store_prices"][store]["current_price"] != expected_price(index, store):
+                    raise SystemExit(f"Неверная цена товара {product['link']} в магазине {store}")
+        if results["все магазины"] != results["по магазинам"]:
+            raise SystemExit("Способы загрузки извлекли разные товары")
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--stores", type=int, default=4)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    arg_parser.add_argument("--latency", type=float, default=20, help="Задержка ответа stub-сервера (в мс)")
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    asyncio.run(main(args.requests, args.stores, args.concurrency, args.latency))
@@ -0,0 +1,66 @@
+"""
+Бенчмарк: товаров в секунду при парсинге корпуса страниц в каждом режиме ParseExecutor.
+
+Корпус берётся из папки с сохранёнными HTML-ответами (--corpus, например data/responses),
+а если она не указана — из синтетических страниц benchmarks/fixtures.py.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_parse_executor --pages 200
+"""
+import argparse
+import asyncio
+import os
+import time
+
+from benchmarks.fixtures import product_page
+from metro_parser.extract import extract_product
+from metro_parser.utils.parse_executor import ParseExecutor, PARSE_EXECUTOR_MODES
+
+
+def load_corpus(corpus_dir, pages):
+    """
+    Загружает корпус страниц товаров в виде байт.
+    :param corpus_dir: Папка с .html файлами или None для синтетического корпуса.
+    :param pages: Количество страниц.
+    :return: Список байтовых строк.
+    """
+    if not corpus_dir:
+        return [product_page(index).encode("utf-8") for index in range(pages)]
+
+    corpus = []
+    for file_name in sorted(os.listdir(corpus_dir)):
+        if file_name.endswith(".html"):
+            with open(os.path.join(corpus_dir, file_name), "rb") as f:
+                corpus.append(f.read())
+    return corpus[:pages]
+
+
+async def parse_corpus(executor, corpus, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def parse(index, html_content):
+        async with semaphore:
+            return await executor.run(extract_product, html_content, f"corpus://{index}")
+
+    return await asyncio.gather(*(parse(index, html_content) for index, html_content in enumerate(corpus)))
+
+
+async def main(corpus, workers):
+    for mode in PARSE_EXECUTOR_MODES:
+        with ParseExecutor(mode, workers) as executor:
+            # Прогрев: запуск процессов пула не должен входить в замер
+            await parse_corpus(executor, corpus[:workers], workers)
+            start = time.perf_counter()
+            await parse_corpus(executor, corpus, workers)
+            elapsed = time.perf_counter() - start
+        print(f"{mode:<8} {len(corpus) / elapsed:8.1f} товаров/с ({elapsed:.2f} с, воркеров: {workers})")
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--corpus", help="Папка с сохранёнными страницами товаров")
+    arg_parser.add_argument("--pages", type=int, default=200)
+    arg_parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    args = arg_parser.parse_args()
+
+    asyncio.run(main(load_corpus(args.corpus, args.pages), args.workers))
@@ -0,0 +1,123 @@
+"""
+Микро-бенчмарк бэкендов парсинга: время разбора одной страницы товара для каждого бэкенда.
+
+Перед замером результат каждого бэкенда сверяется с эталонными файлами benchmarks/golden:
+бэкенд, выдающий хотя бы одно расхождение, не замеряется, а скрипт завершается с ошибкой.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_parser_backends --pages 100
+    python -m benchmarks.bench_parser_backends --check-only
+"""
+import argparse
+import json
+import os
+import sys
+import time
+
+from benchmarks.fixtures import product_page, category_page
+from metro_parser.backends import PARSER_BACKENDS, LexborHTMLParser
+from metro_parser.extract import (
+    extract_product,
+    extract_product_links,
+    extract_last_page,
+    extract_listing,
+    extract_embedded_products,
+)
+
+GOLDEN_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "golden")
+LISTING_URL = "https://online.metro-cc.ru/category/myasnye/myaso"
+
+
+def golden_cases():
+    """
+    Загружает эталонные страницы и ожидаемые результаты.
+    :return: Список кортежей (имя, HTML в байтах, ожидаемый товар).
+    """
+    with open(os.path.join(GOLDEN_DIR, "expected.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+
+    cases = []
+    for name, product in expected.items():
+        if name.startswith("fixture-"):
+            html_content = product_page(int(name.split("-", 1)[1])).encode("utf-8")
+        else:
+            with open(os.path.join(GOLDEN_DIR, "pages", name), "rb") as f:
+                html_content = f.read()
+        cases.append((name, html_content, product))
+    return cases
+
+
+def golden_listing_cases():
+    """
+    Загружает эталонные страницы категории со встроенным состоянием.
+    :return: Список кортежей (имя, HTML в байтах, ожидаемый словарь ссылка -> товар).
+    """
+    with open(os.path.join(GOLDEN_DIR, "expected_listing.json"), "r", encoding="utf-8") as f:
+        expected = json.load(f)
+
+    cases = []
+    for name, products in expected.items():
+        with open(os.path.join(GOLDEN_DIR, "pages", name), "rb") as f:
+            cases.append((name, f.read(), products))
+    return cases
+
+
+def available_backends():
+    return [backend for backend in PARSER_BACKENDS if backend != "selectolax" or LexborHTMLParser is not None]
+
+
+def check_golden(backend, cases, listing_cases=()):
+    """
+    Сверяет результат бэкенда с эталоном.
+    :return: Список имён страниц с расхождениями.
+    """
+    failures = []
+    for name, html_content, expected in cases:
+        if extract_product(html_content, f"golden://{name}", backend) != expected:
+            failures.append(name)
+
+    for name, html_content, expected in listing_cases:
+        links, _, _ = extract_listing(html_content, LISTING_URL, backend)
+        if extract_embedded_products(html_content, LISTING_URL, links) != expected:
+            failures.append(name)
+
+    category = category_page(2, 7, 30).encode("utf-8")
+    if extract_product_links(category, "https://example.test/c", backend) != [
+        f"https://example.test/products/product-{index}" for index in range(30, 60)
+    ] or extract_last_page(category, backend) != 7:
+        failures.append("category_page")
+    return failures
+
+
+def main(pages, check_only):
+    cases = golden_cases()
+    listing_cases = golden_listing_cases()
+    corpus = [product_page(index).encode("utf-8") for index in range(pages)]
+    failed = False
+
+    for backend in available_backends():
+        failures = check_golden(backend, cases, listing_cases)
+        if failures:
+            failed = True
+            print(f"{backend:<11} РАСХОЖДЕНИЕ С ЭТАЛОНОМ: {', '.join(failures)}")
+            continue
+        if check_only:
+            print(f"{backend:<11} совпадает с эталоном ({len(cases) + len(listing_cases)} страниц)")
+            continue
+
+        start = time.perf_counter()
+        for index, html_content in enumerate(corpus):
+            extract_product(html_content, f"corpus://{index}", backend)
+        elapsed = time.perf_counter() - start
+        print(f"{backend:<11} {1000 * elapsed / len(corpus):7.2f} мс/страница ({len(corpus) / elapsed:7.1f} страниц/с)")
+
+    return 1 if failed else 0
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--pages", type=int, default=100)
+    arg_parser.add_argument("--check-only", action="store_true", help="Только сверка с эталоном")
+    args = arg_parser.parse_args()
+
+    sys.exit(main(args.pages, args.check_only))
@@ -0,0 +1,133 @@
+"""
+Бенчмарк: аналитика цен по архивам результатов (output.json.<дата>.bak.gz) против истории цен в SQLite.
+
+Генерирует архивы --runs запусков по --products товаров (цены меняются от запуска к запуску),
+замеряет запросы по архивам (история товара — чтение всех архивов, снижения цен — двух,
+состояние на момент времени — одного), импорт архивов в PriceHistory и те же запросы к базе.
+Перед замером результаты обоих способов сверяются.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_price_history --runs 30 --products 20000
+"""
+import argparse
+import json
+import logging
+import os
+import random
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from benchmarks.fixtures import product_state
+from metro_parser.extract import product_from_state
+from metro_parser.utils.file_handler import FileHandler
+from metro_parser.utils.logger import logger
+from metro_parser.utils.price_history import PriceHistory, read_products
+
+CATEGORY_URL = "https://online.metro-cc.ru/category/myasnye/myaso"
+START = datetime(2024, 12, 1, 3, 0, 0)
+
+
+def run_products(count, run):
+    """
+    Товары одного запуска: каждый запуск у части товаров меняется цена.
+    """
+    for index in range(count):
+        product = product_from_state(product_state(index), CATEGORY_URL)
+        rnd = random.Random(run * 1000003 + index)
+        if run and rnd.random() < 0.3:
+            product["current_price"] = round(product["current_price"] * rnd.uniform(0.6, 1.2), 2)
+        yield product
+
+
+def write_archives(directory, runs, count):
+    """
+    :return: Список пар (время запуска, путь к архиву).
+    """
+    archives = []
+    for run in range(runs):
+        run_at = START + timedelta(days=run)
+        path = os.path.join(directory, f"output.json.{run_at:%Y-%m-%d_%H-%M-%S}.bak.gz")
+        with FileHandler.open_file(path, "wt") as f:
+            json.dump(list(run_products(count, run)), f, ensure_ascii=False, indent=4)
+        archives.append((run_at, path))
+    return archives
+
+
+def archive_history(archives, article):
+    return [
+        (run_at, product["current_price"])
+        for run_at, path in archives
+        for product in read_products(path)
+        if product["id"] == article
+    ]
+
+
+def archive_snapshot(archives, at):
+    path = [path for run_at, path in archives if run_at <= at][-1]
+    return {product["id"]: product["current_price"] for product in read_products(path)}
+
+
+def archive_drops(archives, since, limit):
+    before = archive_snapshot(archives, since)
+    after = archive_snapshot(archives, archives[-1][0])
+    drops = [
+        ((before[article] - price) / before[article], article)
+        for article, price in after.items()
+        if article in before and price < before[article]
+    ]
+    return [article for _, article in sorted(drops, reverse=True)[:limit]]
+
+
+def timed(function, *args):
+    start = time.perf_counter()
+    result = function(*args)
+    return result, time.perf_counter() - start
+
+
+def main(runs, count):
+    with tempfile.TemporaryDirectory() as directory:
+        archives, elapsed = timed(write_archives, directory, runs, count)
+        print(f"Архивы: {runs} запусков по {count} товаров ({elapsed:.1f} с на генерацию)")
+
+        article = str(100000 + count // 2)
+        at = archives[len(archives) // 2][0]
+        since = archives[0][0]
+
+        with PriceHistory(os.path.join(directory, "price_history.sqlite3")) as history:
+            _, import_time = timed(history.import_archives, directory)
+            print(f"Импорт архивов в историю цен: {import_time:.2f} с (однократно)")
+
+            queries = {
+                "история товара": (
+                    lambda: archive_history(archives, article),
+                    lambda: [(entry["run_at"], entry["current_price"]) for entry in history.history(article)],
+                ),
+                "снижения цен": (
+                    lambda: archive_drops(archives, since, 20),
+                    lambda: [drop["id"] for drop in history.biggest_drops(since, limit=20)],
+                ),
+                "состояние на дату": (
+                    lambda: archive_snapshot(archives, at),
+                    lambda: {entry["id"]: entry["current_price"] for entry in history.snapshot(at)},
+                ),
+            }
+            for name, (from_archives, from_history) in queries.items():
+                expected, archive_time = timed(from_archives)
+                result, history_time = timed(from_history)
+                if result != expected:
+                    raise SystemExit(f"Запрос '{name}': результаты по архивам и по истории цен различаются")
+                print(
+                    f"{name:<18} архивы {archive_time * 1000:9.1f} мс   "
+                    f"история цен {history_time * 1000:7.1f} мс   (x{archive_time / history_time:.0f})"
+                )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--runs", type=int, default=30)
+    arg_parser.add_argument("--products", type=int, default=20000)
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    main(args.runs, args.products)
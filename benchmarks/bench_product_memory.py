@@ -0,0 +1,71 @@
+"""
+Бенчмарк: память на хранение каталога товаров в виде словарей и Product.
+
+Товары строятся из синтетических записей (benchmarks/fixtures.py) так же, как парсер строит их
+из встроенного состояния страницы; для каждого представления замеряется память после загрузки
+всего каталога и время обратной сериализации в словари результатов.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_product_memory --products 100000
+"""
+import argparse
+import gc
+import time
+import tracemalloc
+
+from benchmarks.fixtures import product_state
+from metro_parser.extract import product_from_state
+from metro_parser.product import Product
+
+CATEGORY_URL = "https://online.metro-cc.ru/category/myasnye/myaso"
+
+
+def catalogue(count):
+    for index in range(count):
+        product = product_from_state(product_state(index), CATEGORY_URL)
+        product["categories"] = [CATEGORY_URL]
+        yield product
+
+
+REPRESENTATIONS = {
+    "dict": list,
+    "Product": lambda products: [Product.from_dict(product) for product in products],
+}
+
+
+def measure(name, count):
+    """
+    :return: Кортеж (байт на товар, время сериализации в секундах).
+    """
+    gc.collect()
+    tracemalloc.start()
+    store = REPRESENTATIONS[name](catalogue(count))
+    gc.collect()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    start = time.perf_counter()
+    if name == "dict":
+        for _ in store:
+            pass
+    else:
+        for product in store:
+            product.to_dict()
+    return size / count, time.perf_counter() - start
+
+
+def main(count):
+    baseline = None
+    for name in REPRESENTATIONS:
+        per_product, elapsed = measure(name, count)
+        baseline = baseline or per_product
+        print(
+            f"{name:<13} {per_product:8.0f} байт/товар  {per_product * count / 1024 / 1024:8.1f} МБ  "
+            f"({per_product / baseline:4.0%} от словарей), сериализация {elapsed:6.2f} с"
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--products", type=int, default=100000)
+    main(arg_parser.parse_args().products)
@@ -0,0 +1,85 @@
+"""
+Бенчмарк: страниц в секунду в зависимости от количества прокси в пуле.
+
+Stub-сервер ограничивает скорость запросов с одного IP (--site-rate, сверх лимита — 429),
+а локальные прокси-заглушки (SOCKS5 и HTTP CONNECT по очереди) подключаются к нему с разных
+адресов 127.0.0.N, поэтому пропускная способность должна расти с количеством здоровых прокси.
+--broken добавляет в пул неработающие прокси: они должны быть исключены после первых ошибок.
+
+Запуск из корня репозитория (нужен Linux: адреса 127.0.0.N без настройки есть только там):
+    python -m benchmarks.bench_proxy_pool --proxies 1 2 4 --pages 200 --site-rate 10 --broken 1
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fixtures import product_slug
+from benchmarks.stub_proxy import StubProxy
+from benchmarks.stub_server import build_app, fault_middleware, rate_limit_middleware, start_stub_server
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.logger import logger
+from metro_parser.utils.proxy_pool import ProxyPool
+from metro_parser.utils.scheduler import RequestScheduler
+
+
+async def crawl(base_url, proxy_urls, pages, site_rate, concurrency):
+    """
+    Загружает страницы товаров через пул прокси.
+    :return: Кортеж (время в секундах, загружено страниц, ProxyPool).
+    """
+    pool = ProxyPool(proxy_urls, rate=site_rate, recheck_interval=60)
+    semaphore = asyncio.Semaphore(concurrency)
+    loaded = 0
+
+    async with HTTPClient(scheduler=RequestScheduler(), proxy_pool=pool, save_responses=False) as client:
+
+        async def fetch(index):
+            nonlocal loaded
+            async with semaphore:
+                try:
+                    await client.fetch(f"{base_url}/products/{product_slug(index)}")
+                    loaded += 1
+                except Exception:
+                    pass
+
+        start = time.perf_counter()
+        await asyncio.gather(*(fetch(index) for index in range(pages)))
+        return time.perf_counter() - start, loaded, pool
+
+
+async def main(proxy_counts, pages, site_rate, broken, latency, concurrency):
+    app = build_app(middlewares=[rate_limit_middleware(site_rate), fault_middleware(latency / 1000)])
+    runner, base_url = await start_stub_server(app)
+    try:
+        for count in proxy_counts:
+            proxies = [
+                await StubProxy("socks5" if index % 2 == 0 else "http", source_ip=f"127.0.0.{10 + index}").start()
+                for index in range(count)
+            ]
+            proxies += [await StubProxy(broken=True).start() for _ in range(broken)]
+            try:
+                elapsed, loaded, pool = await crawl(base_url, [proxy.url for proxy in proxies], pages, site_rate, concurrency)
+            finally:
+                for proxy in proxies:
+                    await proxy.close()
+            print(
+                f"прокси {count:>2} (+{broken} нерабочих): {loaded}/{pages} страниц за {elapsed:6.2f} с, "
+                f"{loaded / elapsed:7.1f} страниц/с, здоровых в конце: {pool.healthy}/{len(pool.proxies)}"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--proxies", type=int, nargs="+", default=[1, 2, 4])
+    arg_parser.add_argument("--pages", type=int, default=200)
+    arg_parser.add_argument("--site-rate", type=float, default=10, help="Лимит сайта, запросов в секунду с одного IP")
+    arg_parser.add_argument("--broken", type=int, default=0, help="Количество нерабочих прокси в пуле")
+    arg_parser.add_argument("--latency", type=float, default=20, help="Задержка ответа stub-сервера (в мс)")
+    arg_parser.add_argument("--concurrency", type=int, default=40)
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    asyncio.run(main(args.proxies, args.pages, args.site_rate, args.broken, args.latency, args.concurrency))
@@ -0,0 +1,82 @@
+"""
+Бенчмарк: полная загрузка страниц товаров с разбором после загрузки против потоковой загрузки,
+которая прекращается, как только найдены все поля товара (STREAMING_PRODUCT_FETCH).
+
+Stub-сервер отдаёт страницы с ограничением скорости (--bandwidth), чтобы начало страницы приходило
+раньше конца, как по настоящей сети. Перед замером результаты обоих режимов сверяются.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_streaming_fetch --requests 200 --concurrency 20 --bandwidth 256
+"""
+import argparse
+import asyncio
+import logging
+import time
+
+from benchmarks.fixtures import product_slug
+from benchmarks.stub_server import build_app, bandwidth_middleware, start_stub_server
+from metro_parser.extract import extract_product, product_stream_reader, product_from_fields
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.logger import logger
+from metro_parser.utils.metrics import HTTP_BYTES
+
+
+async def full_fetch(client, url):
+    return extract_product(await client.fetch(url, raw=True), url)
+
+
+async def streaming_fetch(client, url):
+    return product_from_fields(await client.fetch(url, reader=product_stream_reader), url)
+
+
+# Имя -> (загрузка товара, предел дочитывания остатка ответа)
+SCENARIOS = {
+    "full": (full_fetch, 0),
+    "stream+drain": (streaming_fetch, 1024 * 1024),
+    "stream+close": (streaming_fetch, 0),
+}
+
+
+async def run(scenario, urls, concurrency, drain_limit=0):
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async with HTTPClient(save_responses=False, stream_drain_limit=drain_limit) as client:
+
+        async def fetch(url):
+            async with semaphore:
+                return await scenario(client, url)
+
+        return await asyncio.gather(*(fetch(url) for url in urls))
+
+
+async def main(requests, concurrency, bandwidth):
+    runner, base_url = await start_stub_server(build_app(middlewares=[bandwidth_middleware(bandwidth * 1024)]))
+    urls = [f"{base_url}/products/{product_slug(index)}" for index in range(requests)]
+    try:
+        expected = await run(full_fetch, urls[:10], concurrency)
+        if await run(streaming_fetch, urls[:10], concurrency) != expected:
+            raise SystemExit("Потоковая загрузка извлекла другие товары")
+
+        for name, (scenario, drain_limit) in SCENARIOS.items():
+            downloaded = HTTP_BYTES.total()
+            start = time.perf_counter()
+            await run(scenario, urls, concurrency, drain_limit)
+            elapsed = time.perf_counter() - start
+            downloaded = HTTP_BYTES.total() - downloaded
+            print(
+                f"{name:<13} {requests / elapsed:8.1f} стр/с ({elapsed:.2f} с), "
+                f"прочитано {downloaded / requests / 1024:6.1f} КБ/стр"
+            )
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--requests", type=int, default=200)
+    arg_parser.add_argument("--concurrency", type=int, default=20)
+    arg_parser.add_argument("--bandwidth", type=float, default=256, help="Скорость отдачи ответа (КБ/с)")
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    asyncio.run(main(args.requests, args.concurrency, args.bandwidth))
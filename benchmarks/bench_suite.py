@@ -0,0 +1,290 @@
+"""
+Воспроизводимый набор бенчмарков парсера без обращения к настоящему сайту.
+
+Сценарии:
+    crawl   — сквозной парсинг: python main.py в отдельном процессе против локального stub-сервера
+              (синтетические страницы или записанные ответы сайта) с заданной задержкой и долей ошибок;
+    parse   — только разбор: страниц товаров и категорий в секунду, без сети;
+    memory  — пик памяти: максимальный RSS процесса парсинга и пик выделений Python при разборе страницы.
+
+Результаты можно сохранить (--output) и сравнить с сохранёнными ранее (--baseline).
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_suite --output baseline.json
+    python -m benchmarks.bench_suite --baseline baseline.json
+    python -m benchmarks.bench_suite crawl --recorded data/responses --latency 50 --error-rate 0.05
+    python -m benchmarks.bench_suite crawl --profile sampling
+"""
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import tracemalloc
+
+from benchmarks.fixtures import CATEGORY_PATH, category_page, product_page
+from benchmarks.stub_server import (
+    build_app,
+    build_recorded_app,
+    fault_middleware,
+    load_recorded_pages,
+    start_stub_server,
+)
+from metro_parser.extract import extract_product, extract_listing
+
+SCENARIOS = ("crawl", "parse", "memory")
+REPO_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Метрики, для которых больше — лучше (для остальных лучше меньше)
+HIGHER_IS_BETTER = {"crawl_products_per_s", "crawl_requests_per_s", "parse_products_per_s", "parse_listings_per_s"}
+# Справочные значения, которые не сравниваются с базовыми
+INFORMATIONAL = {"crawl_products"}
+
+
+class StubServerThread:
+    def __init__(self, app):
+        """
+        Stub-сервер в отдельном потоке со своим циклом событий: процесс парсера
+        запускается синхронно, а сервер продолжает отвечать.
+        :param app: web.Application.
+        """
+        self.app = app
+        self.base_url = None
+        self._loop = None
+        self._stop = None
+        self._ready = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="stub-server", daemon=True)
+
+    def _run(self):
+        asyncio.run(self._serve())
+
+    async def _serve(self):
+        self._loop = asyncio.get_running_loop()
+        self._stop = asyncio.Event()
+        runner, self.base_url = await start_stub_server(self.app)
+        self._ready.set()
+        try:
+            await self._stop.wait()
+        finally:
+            await runner.cleanup()
+
+    def __enter__(self):
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self._loop.call_soon_threadsafe(self._stop.set)
+        self._thread.join()
+
+
+def recorded_corpus(directory):
+    """
+    Записанные страницы для сценария parse.
+    :return: Кортеж (страницы товаров, страницы категорий) в байтах.
+    """
+    products, listings = [], []
+    for key, filepath in load_recorded_pages(directory).items():
+        with open(filepath, "rb") as f:
+            content = f.read()
+        if key.startswith("_products_"):
+            products.append(content)
+        elif key.startswith("_category_"):
+            listings.append(content)
+    return products, listings
+
+
+def synthetic_corpus(pages, per_page):
+    products = [product_page(index).encode("utf-8") for index in range(pages * per_page)]
+    listings = [category_page(page, pages, per_page).encode("utf-8") for page in range(1, pages + 1)]
+    return products, listings
+
+
+def read_prometheus_total(filepath, name):
+    """
+    Сумма значений метрики по всем меткам из файла в формате Prometheus.
+    """
+    if not os.path.exists(filepath):
+        return None
+    total = 0.0
+    with open(filepath, "r", encoding="utf-8") as f:
+        for line in f:
+            sample = line.split(" ", 1)[0]
+            if sample == name or sample.startswith(name + "{"):
+                total += float(line.rsplit(" ", 1)[1])
+    return total
+
+
+def run_crawl_process(category_url, data_dir, profile=None, profile_output=None):
+    """
+    Запускает python main.py с отдельной папкой данных.
+    :return: Кортеж (код завершения, время в секундах, пиковый RSS в байтах или None).
+    """
+    command = [sys.executable, os.path.join(REPO_DIR, "main.py"), category_url]
+    if profile:
+        command += ["--profile", profile]
+        if profile_output:
+            command += ["--profile-output", profile_output]
+    env = dict(os.environ, METRO_PARSER_DATA_DIR=data_dir)
+
+    start = time.perf_counter()
+    process = subprocess.Popen(command, cwd=REPO_DIR, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    if not hasattr(os, "wait4"):
+        # Windows: пик памяти дочернего процесса недоступен
+        return process.wait(), time.perf_counter() - start, None
+    _, status, usage = os.wait4(process.pid, 0)
+    elapsed = time.perf_counter() - start
+    process.returncode = os.waitstatus_to_exitcode(status)
+    # ru_maxrss: килобайты в Linux, байты в macOS
+    max_rss = usage.ru_maxrss if sys.platform == "darwin" else usage.ru_maxrss * 1024
+    return process.returncode, elapsed, max_rss
+
+
+def bench_crawl(args):
+    faults = fault_middleware(
+        args.latency / 1000, args.jitter / 1000, args.error_rate, retry_after=args.retry_after or None, seed=args.seed
+    )
+    if args.recorded:
+        app = build_recorded_app(args.recorded, [faults])
+    else:
+        app = build_app(args.pages, args.per_page, middlewares=[faults])
+
+    runs = []
+    with StubServerThread(app) as server:
+        for run in range(args.repeat):
+            with tempfile.TemporaryDirectory() as data_dir:
+                profile_output = None
+                if args.profile:
+                    suffix = "prof" if args.profile == "cprofile" else "folded"
+                    profile_output = os.path.abspath(f"bench_crawl_{run + 1}.{suffix}")
+                code, elapsed, max_rss = run_crawl_process(
+                    server.base_url + args.category, data_dir, args.profile, profile_output
+                )
+                if code != 0:
+                    raise RuntimeError(f"Процесс парсинга завершился с кодом {code}")
+                with open(os.path.join(data_dir, "outputs", "output.jsonl"), "rb") as f:
+                    products = sum(1 for _ in f)
+                requests = read_prometheus_total(os.path.join(data_dir, "metrics.prom"), "metro_http_requests_total")
+                runs.append((elapsed, products, requests, max_rss))
+                if profile_output:
+                    print(f"Профиль: {profile_output}")
+
+    # Медиана по времени сглаживает случайные задержки и ошибки stub-сервера
+    elapsed, products, requests, max_rss = sorted(runs)[len(runs) // 2]
+    results = {
+        "crawl_seconds": elapsed,
+        "crawl_products": products,
+        "crawl_products_per_s": products / elapsed,
+    }
+    if requests is not None:
+        results["crawl_requests_per_s"] = requests / elapsed
+    if max_rss is not None:
+        results["crawl_max_rss_mb"] = max(run[3] for run in runs) / 1024 / 1024
+    return results
+
+
+def bench_parse(args, corpus):
+    products, listings = corpus
+    results = {}
+    if products:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for index, html_content in enumerate(products):
+                extract_product(html_content, f"bench://{index}")
+            timings.append(time.perf_counter() - start)
+        results["parse_products_per_s"] = len(products) / statistics.median(timings)
+    if listings:
+        timings = []
+        for _ in range(args.repeat):
+            start = time.perf_counter()
+            for html_content in listings:
+                extract_listing(html_content, "https://online.metro-cc.ru" + args.category)
+            timings.append(time.perf_counter() - start)
+        results["parse_listings_per_s"] = len(listings) / statistics.median(timings)
+    return results
+
+
+def bench_memory(args, corpus, crawl_results):
+    products, _ = corpus
+    results = {}
+    if products:
+        tracemalloc.start()
+        for index, html_content in enumerate(products[:50]):
+            extract_product(html_content, f"bench://{index}")
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        results["parse_peak_kb"] = peak / 1024
+    if "crawl_max_rss_mb" not in crawl_results:
+        crawl_results.update(bench_crawl(args))
+    if "crawl_max_rss_mb" in crawl_results:
+        results["crawl_max_rss_mb"] = crawl_results["crawl_max_rss_mb"]
+    return results
+
+
+def compare(results, baseline):
+    """
+    Печатает результаты и изменение относительно базовых (в процентах, "+" — улучшение).
+    """
+    for name, value in results.items():
+        line = f"{name:<24} {value:12.2f}"
+        if name in baseline and baseline[name] and name not in INFORMATIONAL:
+            change = (value - baseline[name]) / baseline[name] * 100
+            if name not in HIGHER_IS_BETTER:
+                change = -change
+            line += f"   база {baseline[name]:12.2f}  {change:+6.1f}%"
+        print(line)
+
+
+def main(args):
+    corpus = recorded_corpus(args.recorded) if args.recorded else synthetic_corpus(args.pages, args.per_page)
+    results = {}
+    crawl_results = {}
+    for scenario in args.scenarios or SCENARIOS:
+        if scenario == "crawl":
+            crawl_results.update(bench_crawl(args))
+            results.update(crawl_results)
+        elif scenario == "parse":
+            results.update(bench_parse(args, corpus))
+        elif scenario == "memory":
+            results.update(bench_memory(args, corpus, crawl_results))
+
+    baseline = {}
+    if args.baseline:
+        with open(args.baseline, "r", encoding="utf-8") as f:
+            baseline = json.load(f)["results"]
+    compare(results, baseline)
+
+    if args.output:
+        with open(args.output, "w", encoding="utf-8") as f:
+            json.dump({"params": vars(args), "results": results}, f, ensure_ascii=False, indent=4)
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("scenarios", nargs="*", help=f"Сценарии: {', '.join(SCENARIOS)} (по умолчанию все)")
+    arg_parser.add_argument("--recorded", help="Папка с записанными ответами сайта (иначе синтетические страницы)")
+    arg_parser.add_argument("--category", default=CATEGORY_PATH, help="Путь категории на stub-сервере")
+    arg_parser.add_argument("--pages", type=int, default=5, help="Страниц в синтетической категории")
+    arg_parser.add_argument("--per-page", type=int, default=30, help="Товаров на синтетической странице")
+    arg_parser.add_argument("--latency", type=float, default=20, help="Задержка ответа stub-сервера (в мс)")
+    arg_parser.add_argument("--jitter", type=float, default=10, help="Случайная добавка к задержке (в мс)")
+    arg_parser.add_argument("--error-rate", type=float, default=0, help="Доля ответов 503 (0..1)")
+    arg_parser.add_argument(
+        "--retry-after", type=int, default=1, help="Retry-After ответов с ошибкой (в секундах, 0 — без заголовка)"
+    )
+    arg_parser.add_argument("--seed", type=int, default=42)
+    arg_parser.add_argument("--repeat", type=int, default=3, help="Повторов каждого замера (берётся медиана)")
+    arg_parser.add_argument("--profile", choices=("cprofile", "sampling"), help="Профилировать процесс парсинга")
+    arg_parser.add_argument("--output", help="Сохранить результаты в JSON")
+    arg_parser.add_argument("--baseline", help="Сравнить с результатами, сохранёнными через --output")
+    parsed_args = arg_parser.parse_args()
+    unknown = set(parsed_args.scenarios) - set(SCENARIOS)
+    if unknown:
+        arg_parser.error(f"неизвестные сценарии: {', '.join(sorted(unknown))}")
+    main(parsed_args)
@@ -0,0 +1,143 @@
+"""
+Бенчмарк и проверка общей очереди распределённого парсинга (SQLiteWorkQueue и RedisWorkQueue).
+
+Несколько потоков-воркеров, каждый со своим подключением к очереди, берут ссылки в аренду и сохраняют
+результаты. Один воркер «зависает» дольше аренды, после чего пытается сохранить результат: очередь
+должна его отклонить, а ссылки — достаться другим воркерам. Отдельный поток всё время вызывает
+finished() (для Redis — и recover()), как координатор: ни одна ссылка не должна считаться потерянной.
+В конце проверяется, что у каждой ссылки ровно один результат.
+
+Redis проверяется на fakeredis (pip install fakeredis) или на сервере из --redis.
+
+Запуск из корня репозитория:
+    python -m benchmarks.bench_work_queue --urls 2000 --workers 8
+    python -m benchmarks.bench_work_queue --redis redis://localhost:6379/15
+"""
+import argparse
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+try:
+    import fakeredis
+except ImportError:  # fakeredis — необязательная зависимость (только для проверки без сервера)
+    fakeredis = None
+
+from metro_parser.utils.logger import logger
+from metro_parser.utils.work_queue import DONE, SQLiteWorkQueue, RedisWorkQueue, redis
+
+LEASE_TIMEOUT = 0.5
+
+
+def run_workers(open_queue, urls, workers, batch):
+    """
+    :param open_queue: Функция, открывающая новое подключение к очереди.
+    :return: Кортеж (время, отклонённые результаты зависшего воркера, потерянные ссылки по recover()).
+    """
+    with open_queue() as queue:
+        queue.reset()
+        queue.push(urls)
+        queue.set_discovery_done()
+
+    rejected = []
+    lost = []
+    errors = []
+    stop = threading.Event()
+
+    def worker(index):
+        rng = random.Random(index)
+        name = f"worker-{index}"
+        try:
+            with open_queue() as queue:
+                if index == 0:
+                    # Зависший воркер: аренда истекает, пока он «обрабатывает» ссылки
+                    stale = queue.lease(name, batch)
+                    time.sleep(LEASE_TIMEOUT * 3)
+                    rejected.extend(url for url in stale if not queue.complete(url, name, {"link": url}))
+                while not queue.finished():
+                    leased = queue.lease(name, batch)
+                    if not leased:
+                        time.sleep(0.01)
+                        continue
+                    for url in leased:
+                        time.sleep(rng.uniform(0, 0.001))
+                        queue.complete(url, name, {"link": url, "worker": name})
+        except Exception as e:
+            errors.append(e)
+
+    def coordinator():
+        with open_queue() as queue:
+            while not stop.is_set():
+                if isinstance(queue, RedisWorkQueue):
+                    lost.append(queue.recover())
+                queue.finished()
+
+    threads = [threading.Thread(target=worker, args=(index,)) for index in range(workers)]
+    watcher = threading.Thread(target=coordinator)
+    start = time.perf_counter()
+    watcher.start()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    watcher.join()
+    if errors:
+        raise errors[0]
+
+    with open_queue() as queue:
+        results = [product["link"] for product in queue.results()]
+        stats = queue.stats()
+    if sorted(results) != sorted(urls):
+        raise SystemExit(f"Ожидалось по одному результату на ссылку: {len(results)} результатов на {len(urls)} ссылок")
+    if stats[DONE] != len(urls):
+        raise SystemExit(f"Не все ссылки обработаны: {stats}")
+    return elapsed, len(rejected), sum(lost)
+
+
+def main(count, workers, batch, redis_url):
+    urls = [f"https://online.metro-cc.ru/products/product-{index}" for index in range(count)]
+    backends = {}
+
+    directory = tempfile.mkdtemp()
+    filepath = os.path.join(directory, "work_queue.sqlite3")
+    backends["SQLite"] = lambda: SQLiteWorkQueue(filepath, lease_timeout=LEASE_TIMEOUT)
+
+    if redis_url:
+        if redis is None:
+            raise SystemExit("Для проверки на сервере Redis установите пакет redis: pip install redis")
+        backends["Redis"] = lambda: RedisWorkQueue(redis_url, lease_timeout=LEASE_TIMEOUT, prefix="bench_work_queue")
+    elif fakeredis is not None:
+        server = fakeredis.FakeServer()
+        backends["Redis (fakeredis)"] = lambda: RedisWorkQueue(
+            None, lease_timeout=LEASE_TIMEOUT, client=fakeredis.FakeRedis(server=server, decode_responses=True)
+        )
+    else:
+        print("Redis пропущен: установите fakeredis или укажите --redis")
+
+    for name, open_queue in backends.items():
+        elapsed, rejected, lost = run_workers(open_queue, urls, workers, batch)
+        if lost:
+            raise SystemExit(f"{name}: recover() вернул в очередь {lost} ссылок, которые не терялись")
+        if rejected != min(batch, count):
+            raise SystemExit(f"{name}: сохранены результаты устаревшей аренды")
+        print(
+            f"{name:<18} {count / elapsed:8.0f} ссылок/с ({elapsed:.2f} с), "
+            f"результатов устаревшей аренды отклонено: {rejected}"
+        )
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    arg_parser.add_argument("--urls", type=int, default=2000)
+    arg_parser.add_argument("--workers", type=int, default=8)
+    arg_parser.add_argument("--batch", type=int, default=20, help="Ссылок за один вызов lease()")
+    arg_parser.add_argument("--redis", help="URL сервера Redis (иначе fakeredis)")
+    args = arg_parser.parse_args()
+
+    logger.setLevel(logging.WARNING)
+    main(args.urls, args.workers, args.batch, args.redis)
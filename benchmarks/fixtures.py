@@ -0,0 +1,188 @@
+"""
+Генерация синтетических страниц каталога и товаров для бенчмарков.
+
+Разметка повторяет селекторы, которые использует MetroParser, поэтому страницы
+можно скармливать парсеру вместо настоящего сайта.
+"""
+import json
+import random
+
+CATEGORY_PATH = "/category/myasnye/myaso"
+
+BRANDS = ["МИРАТОРГ", "ЗАРЕЧНОЕ", "КРОЛЪ И К", "ЧЕРКИЗОВО", "ВЕЛИКОЛУКСКИЙ МК", "METRO CHEF"]
+WORDS = ["Говядина", "Стейк", "Окорок", "Филе", "Фарш", "Свинина", "охлажденный", "в маринаде", "Чак ролл"]
+
+# Типичный "шум" страницы: скрипты, рекомендации и подвал занимают большую часть байт
+FILLER_SCRIPT = "<script>window.dataLayer=window.dataLayer||[];" + "var a=1;" * 800 + "</script>"
+FILLER_BLOCK = "".join(
+    f'<div class="recommendation-card"><a href="/products/rec-{i}">Рекомендация {i}</a>'
+    f'<span class="product-price__sum-rubles">{100 + i}</span></div>'
+    for i in range(60)
+)
+
+
+def product_slug(index):
+    """
+    Возвращает slug товара по его порядковому номеру.
+    :param index: Номер товара.
+    :return: Строка slug.
+    """
+    return f"product-{index}"
+
+
+def _price_html(rubles, pennies):
+    """
+    Формирует блок цены в формате сайта (рубли и копейки в отдельных элементах).
+    """
+    penny_html = f'<span class="product-price__sum-penny">.{pennies:02d}</span>' if pennies else ""
+    return (
+        '<span class="product-price__sum">'
+        f'<span class="product-price__sum-rubles">{rubles}</span>{penny_html}'
+        '<span class="product-price__sum-currency">₽</span></span>'
+    )
+
+
+def product_data(index, store=None):
+    """
+    Детерминированно генерирует данные товара по его номеру.
+    :param index: Номер товара.
+    :param store: Магазин: цены в разных магазинах отличаются (до 10% в обе стороны), остальные поля — нет.
+    :return: Словарь с полями товара (цены в рублях и копейках).
+    """
+    rnd = random.Random(index)
+    rubles = rnd.randint(49, 1299)
+    pennies = rnd.choice([0, 0, 1, 50, 99])
+    has_discount = rnd.random() < 0.6
+    old_rubles = rubles + rnd.randint(10, 300) if has_discount else None
+    if store is not None:
+        factor = random.Random(f"{store}:{index}").uniform(0.9, 1.1)
+        rubles = round(rubles * factor)
+        old_rubles = round(old_rubles * factor) if has_discount else None
+    return {
+        "id": str(100000 + index),
+        "name": f"{rnd.choice(WORDS)} {rnd.choice(WORDS)} {index}, ~{rnd.randint(1, 9)}00г",
+        "brand": rnd.choice(BRANDS) if rnd.random() < 0.9 else None,
+        "rubles": rubles,
+        "pennies": pennies,
+        "old_rubles": old_rubles,
+        "discount": f"-{round(100 * (old_rubles - rubles) / old_rubles)}%" if has_discount else None,
+        "offline": rnd.random() < 0.8,
+    }
+
+
+def _format_rubles(rubles):
+    """
+    Форматирует рубли так, как это делает сайт: тысячи отделяются пробелом.
+    """
+    return f"{rubles:,}".replace(",", " ")
+
+
+def product_page(index, store=None):
+    """
+    Генерирует HTML страницы товара.
+    :param index: Номер товара.
+    :param store: Магазин, выбранный в сессии (см. product_data), или None.
+    :return: HTML-строка.
+    """
+    data = product_data(index, store)
+    rubles = _format_rubles(data["rubles"])
+    old_price = ""
+    if data["old_rubles"]:
+        old_price = (
+            '<div class="product-unit-prices__old-wrapper">'
+            f'{_price_html(_format_rubles(data["old_rubles"]), 0)}</div>'
+        )
+    discount = f'<div class="product-discount">{data["discount"]}</div>' if data["discount"] else ""
+    brand = ""
+    if data["brand"]:
+        brand = (
+            '<li class="product-attributes__list-item"><span>Бренд</span>'
+            f'<a href="/brand/{data["brand"].lower()}">{data["brand"]}</a></li>'
+        )
+    offline = ""
+    if data["offline"]:
+        old_line = ""
+        if data["old_rubles"]:
+            old_line = (
+                '<div class="product-prices-lines__item-price-old">'
+                f'{_price_html(_format_rubles(data["old_rubles"]), 0)}</div>'
+            )
+        offline = (
+            '<div class="product-page-prices-and-buttons__offline-bmpl-prices">'
+            '<div class="product-prices-lines__item">'
+            '<div class="product-range-prices__item-price-actual">'
+            f'{_price_html(rubles, data["pennies"])}</div>{old_line}</div></div>'
+        )
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8">'
+        f'<title>{data["name"]}</title>{FILLER_SCRIPT}</head><body>'
+        '<header class="header"><nav>Каталог</nav></header>'
+        '<div class="product-page-content">'
+        f'<h1 class="product-page-content__product-name">\n  {data["name"]}\n</h1>'
+        f'<p class="product-page-content__article">Артикул: {data["id"]}</p>'
+        '<div class="product-page-prices-and-buttons">'
+        '<div class="product-unit-prices__actual-wrapper">'
+        f'{_price_html(rubles, data["pennies"])}</div>{old_price}{discount}{offline}</div>'
+        f'<ul class="product-attributes__list">'
+        '<li class="product-attributes__list-item"><span>Страна</span><span>Россия</span></li>'
+        f'{brand}</ul></div>'
+        f'<section class="recommendations">{FILLER_BLOCK}</section>'
+        f'<footer class="footer">{FILLER_SCRIPT}</footer></body></html>'
+    )
+
+
+def product_state(index):
+    """
+    Запись товара во встроенном состоянии страницы категории (window.__INITIAL_STATE__).
+    :param index: Номер товара.
+    :return: Словарь в формате, который ожидает EMBEDDED_PRODUCT_KEYS.
+    """
+    data = product_data(index)
+    price = data["rubles"] + data["pennies"] / 100
+    old_price = data["old_rubles"]
+    prices = {
+        "price": price,
+        "old_price": old_price,
+        "discount": int(data["discount"][1:-1]) if data["discount"] else None,
+        "offline": [{"price": price, "old_price": old_price}] if data["offline"] else [],
+    }
+    return {
+        "article": int(data["id"]),
+        "name": data["name"],
+        "url": f"/products/{product_slug(index)}",
+        "manufacturer": {"name": data["brand"]} if data["brand"] else None,
+        "stocks": [{"prices": prices}],
+    }
+
+
+def category_page(page, pages, per_page, paginate=True, embedded_state=False):
+    """
+    Генерирует HTML страницы категории с карточками товаров и пагинацией.
+    :param page: Номер страницы (с 1).
+    :param pages: Общее количество страниц категории.
+    :param per_page: Количество товаров на странице.
+    :param paginate: Выводить ли пагинацию (без неё парсер переходит по следующим страницам).
+    :param embedded_state: Добавить состояние страницы с данными товаров (window.__INITIAL_STATE__).
+    :return: HTML-строка.
+    """
+    start = (page - 1) * per_page
+    cards = "".join(
+        '<div class="catalog-2-level-product-card">'
+        f'<a class="product-card-name" href="/products/{product_slug(index)}">Товар {index}</a></div>'
+        for index in range(start, start + per_page)
+    )
+    pagination = "".join(f'<li><a href="?page={number}">{number}</a></li>' for number in range(1, pages + 1))
+    if not paginate:
+        pagination = ""
+    state = ""
+    if embedded_state:
+        products = [product_state(index) for index in range(start, start + per_page)]
+        state_json = json.dumps({"catalog": {"page": page, "products": products}}, ensure_ascii=False)
+        # Как и на сайте, "</" экранируется, чтобы JSON не закрывал тег script
+        state_json = state_json.replace("</", "<\\/")
+        state = f"<script>window.__INITIAL_STATE__ = {state_json};</script>"
+    return (
+        '<!DOCTYPE html><html lang="ru"><head><meta charset="utf-8"><title>Категория</title>'
+        f'{FILLER_SCRIPT}</head><body><div class="catalog">{cards}</div>'
+        f'<ul class="catalog-paginate">{pagination}</ul>{state}</body></html>'
+    )
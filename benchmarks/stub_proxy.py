@@ -0,0 +1,101 @@
+"""
+Локальные прокси-заглушки (SOCKS5 и HTTP CONNECT) для проверки пула прокси без настоящих прокси.
+
+Каждый прокси может подключаться к целевому серверу со своего адреса 127.0.0.N (в Linux весь
+диапазон 127.0.0.0/8 ведёт на loopback), поэтому stub-сервер видит разные IP и может ограничивать
+скорость для каждого прокси отдельно, как настоящий сайт. Режим broken имитирует неработающий прокси.
+"""
+import asyncio
+import ipaddress
+import socket
+import struct
+
+
+async def _pipe(reader, writer):
+    try:
+        while data := await reader.read(65536):
+            writer.write(data)
+            await writer.drain()
+    except (ConnectionError, asyncio.CancelledError):
+        pass
+    finally:
+        writer.close()
+
+
+class StubProxy:
+    def __init__(self, kind="socks5", source_ip=None, broken=False):
+        """
+        :param kind: "socks5" или "http" (HTTP CONNECT).
+        :param source_ip: Адрес, с которого прокси подключается к цели (None — по умолчанию).
+        :param broken: Разрывать соединение вместо проксирования.
+        """
+        self.kind = kind
+        self.source_ip = source_ip
+        self.broken = broken
+        self.connections = 0
+        self.server = None
+        self.url = None
+
+    async def start(self, host="127.0.0.1"):
+        self.server = await asyncio.start_server(self._handle, host, 0)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f"{self.kind}://{host}:{port}"
+        return self
+
+    async def close(self):
+        self.server.close()
+        await self.server.wait_closed()
+
+    async def _handle(self, reader, writer):
+        self.connections += 1
+        if self.broken:
+            writer.close()
+            return
+        try:
+            if self.kind == "socks5":
+                host, port = await self._socks5_handshake(reader, writer)
+            else:
+                host, port = await self._connect_handshake(reader)
+            local_addr = (self.source_ip, 0) if self.source_ip else None
+            target_reader, target_writer = await asyncio.open_connection(host, port, local_addr=local_addr)
+        except (ConnectionError, OSError, asyncio.IncompleteReadError, ValueError):
+            writer.close()
+            return
+
+        if self.kind == "socks5":
+            writer.write(b"\x05\x00\x00\x01" + socket.inet_aton("0.0.0.0") + struct.pack("!H", 0))
+        else:
+            writer.write(b"HTTP/1.1 200 Connection established\r\n\r\n")
+        await writer.drain()
+        await asyncio.gather(_pipe(reader, target_writer), _pipe(target_reader, writer))
+
+    @staticmethod
+    async def _socks5_handshake(reader, writer):
+        version, methods = await reader.readexactly(2)
+        await reader.readexactly(methods)
+        if version != 5:
+            raise ValueError("Not SOCKS5")
+        writer.write(b"\x05\x00")
+        _, command, _, address_type = await reader.readexactly(4)
+        if address_type == 1:
+            host = str(ipaddress.IPv4Address(await reader.readexactly(4)))
+        elif address_type == 3:
+            host = (await reader.readexactly((await reader.readexactly(1))[0])).decode()
+        elif address_type == 4:
+            host = str(ipaddress.IPv6Address(await reader.readexactly(16)))
+        else:
+            raise ValueError("Unknown address type")
+        port = struct.unpack("!H", await reader.readexactly(2))[0]
+        if command != 1:
+            raise ValueError("Only CONNECT is supported")
+        return host, port
+
+    @staticmethod
+    async def _connect_handshake(reader):
+        request_line = (await reader.readline()).decode("latin-1").split()
+        while (await reader.readline()) not in (b"\r\n", b"\n", b""):
+            pass
+        if len(request_line) < 2 or request_line[0] != "CONNECT":
+            raise ValueError("Only CONNECT is supported")
+        host, port = request_line[1].rsplit(":", 1)
+        return host, int(port)
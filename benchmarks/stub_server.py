@@ -0,0 +1,305 @@
+"""
+Локальный stub-сервер, отдающий синтетические страницы категории и товаров
+или страницы, записанные парсером при SAVE_HTML_RESPONSES = True.
+Используется бенчмарками вместо настоящего сайта.
+
+Запуск отдельно (например, чтобы направить на него python main.py):
+    python -m benchmarks.stub_server --port 8080
+    python -m benchmarks.stub_server --recorded data/responses --latency 50 --error-rate 0.05
+    python -m benchmarks.stub_server --port 8080 --bandwidth 256 --compress
+"""
+import argparse
+import asyncio
+import gzip
+import hashlib
+import os
+import random
+import re
+import time
+
+from aiohttp import web
+
+try:
+    import brotli
+except ImportError:  # Brotli — необязательная зависимость
+    brotli = None
+
+try:
+    import zstandard
+except ImportError:  # zstandard — необязательная зависимость
+    zstandard = None
+
+from benchmarks.fixtures import category_page, product_page
+from metro_parser.config import BASE_URL, STORE_COOKIE
+
+# Метка времени, которую HTTPClient._get_response_id добавляет к имени файла
+RESPONSE_TIMESTAMP_RE = re.compile(r"_\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}$")
+RESPONSE_ORIGIN_RE = re.compile(r"^https?_[^_]+")
+
+
+def response_key(path_qs):
+    """
+    Ключ страницы в том же виде, что и в именах файлов HTTPClient._get_response_id.
+    :param path_qs: Путь со строкой запроса, например "/category/myasnye/myaso?page=2".
+    :return: Ключ, например "_category_myasnye_myaso_page=2".
+    """
+    return path_qs.replace("/", "_").replace("?", "_")
+
+
+def load_recorded_pages(directory):
+    """
+    Индексирует HTML-ответы, сохранённые FileHandler.save_response.
+    Если страница сохранена несколько раз, берётся последняя версия.
+    :param directory: Папка с ответами (RESPONSES_DIR).
+    :return: Словарь ключ страницы -> путь к файлу.
+    """
+    pages = {}
+    for file_name in sorted(os.listdir(directory)):
+        name, extension = os.path.splitext(file_name)
+        if extension != ".html" or not RESPONSE_TIMESTAMP_RE.search(name):
+            # Файлы без URL в имени (например, category_page_1.html) сопоставить нельзя
+            continue
+        key = RESPONSE_ORIGIN_RE.sub("", RESPONSE_TIMESTAMP_RE.sub("", name))
+        pages[key] = os.path.join(directory, file_name)
+    return pages
+
+
+def fault_middleware(latency=0, jitter=0, error_rate=0, error_status=503, retry_after=1, seed=None):
+    """
+    Middleware, имитирующее медленный и нестабильный сайт.
+    :param latency: Задержка каждого ответа (в секундах).
+    :param jitter: Случайная добавка к задержке от 0 до jitter (в секундах).
+    :param error_rate: Доля запросов, завершающихся ошибкой (от 0 до 1).
+    :param error_status: Код ответа при ошибке.
+    :param retry_after: Значение заголовка Retry-After при ошибке (None — без заголовка).
+    :param seed: Начальное значение генератора случайных чисел (для воспроизводимости).
+    :return: aiohttp middleware.
+    """
+    rng = random.Random(seed)
+
+    @web.middleware
+    async def middleware(request, handler):
+        delay = latency + (rng.uniform(0, jitter) if jitter else 0)
+        if delay:
+            await asyncio.sleep(delay)
+        if error_rate and rng.random() < error_rate:
+            headers = {"Retry-After": str(retry_after)} if retry_after is not None else None
+            return web.Response(status=error_status, headers=headers)
+        return await handler(request)
+
+    return middleware
+
+
+def bandwidth_middleware(bytes_per_second, chunk_size=4096):
+    """
+    Middleware, отдающее тело ответа частями с ограничением скорости, как медленная сеть:
+    клиент получает начало страницы раньше конца.
+    :param bytes_per_second: Скорость отдачи одного ответа (байт в секунду).
+    :param chunk_size: Размер отправляемой части (в байтах).
+    :return: aiohttp middleware.
+    """
+
+    @web.middleware
+    async def middleware(request, handler):
+        response = await handler(request)
+        if not isinstance(response, web.Response) or not response.body:
+            return response
+        body = response.body
+        stream = web.StreamResponse(status=response.status, headers=response.headers)
+        stream.content_length = len(body)
+        await stream.prepare(request)
+        try:
+            for start in range(0, len(body), chunk_size):
+                await stream.write(body[start : start + chunk_size])
+                await asyncio.sleep(chunk_size / bytes_per_second)
+        except ConnectionResetError:
+            # Клиент закрыл соединение, не дочитав ответ
+            return stream
+        await stream.write_eof()
+        return stream
+
+    return middleware
+
+
+def compression_middleware(codings=("zstd", "br", "gzip"), stats=None):
+    """
+    Middleware, сжимающее ответ первым из codings, которое клиент указал в Accept-Encoding, как CDN сайта.
+    Сжатия, для которых не установлен пакет, пропускаются.
+    :param codings: Сжатия в порядке предпочтения сервера.
+    :param stats: Словарь, в котором считаются отправленные байты тела ("bytes_sent"), или None.
+    :return: aiohttp middleware.
+    """
+    compressors = {"gzip": gzip.compress}
+    if brotli is not None:
+        # Уровень как у типичного CDN: максимальный (11) слишком медленный для сжатия на лету
+        compressors["br"] = lambda body: brotli.compress(body, quality=5)
+    if zstandard is not None:
+        compressors["zstd"] = zstandard.ZstdCompressor().compress
+
+    @web.middleware
+    async def middleware(request, handler):
+        response = await handler(request)
+        if not isinstance(response, web.Response) or not response.body:
+            return response
+        accepted = {part.split(";")[0].strip() for part in request.headers.get("Accept-Encoding", "").split(",")}
+        for coding in codings:
+            if coding in accepted and coding in compressors:
+                response.body = compressors[coding](response.body)
+                response.headers["Content-Encoding"] = coding
+                break
+        if stats is not None:
+            stats["bytes_sent"] = stats.get("bytes_sent", 0) + len(response.body)
+        return response
+
+    return middleware
+
+
+def rate_limit_middleware(rate):
+    """
+    Middleware, ограничивающее скорость запросов с одного IP, как настоящий сайт: сверх лимита — 429.
+    :param rate: Запросов в секунду с одного IP.
+    :return: aiohttp middleware.
+    """
+    # IP -> (доступные запросы, время последнего пополнения)
+    buckets = {}
+
+    @web.middleware
+    async def middleware(request, handler):
+        now = time.monotonic()
+        tokens, updated = buckets.get(request.remote, (rate, now))
+        tokens = min(rate, tokens + (now - updated) * rate)
+        if tokens < 1:
+            buckets[request.remote] = (tokens, now)
+            return web.Response(status=429, headers={"Retry-After": "1"})
+        buckets[request.remote] = (tokens - 1, now)
+        return await handler(request)
+
+    return middleware
+
+
+def html_response(request, content, charset="utf-8"):
+    """
+    :param content: HTML-строка или байты.
+    :param charset: Кодировка для заголовка Content-Type (None — не указывать).
+    """
+    body = content.encode("utf-8") if isinstance(content, str) else content
+    # ETag позволяет проверять условные запросы (If-None-Match -> 304)
+    etag = '"' + hashlib.sha1(body).hexdigest() + '"'
+    if request.headers.get("If-None-Match") == etag:
+        return web.Response(status=304, headers={"ETag": etag})
+    return web.Response(body=body, content_type="text/html", charset=charset, headers={"ETag": etag})
+
+
+def build_app(pages=5, per_page=30, paginate=True, embedded_state=False, middlewares=()):
+    """
+    Создаёт aiohttp-приложение stub-сервера.
+    :param pages: Количество страниц в категории.
+    :param per_page: Количество товаров на странице категории.
+    :param paginate: Выводить ли пагинацию на страницах категории.
+    :param embedded_state: Встраивать ли данные товаров в страницы категории.
+    :param middlewares: Middleware приложения, например fault_middleware().
+    :return: web.Application.
+    """
+
+    async def category(request):
+        page = int(request.query.get("page", 1))
+        if page > pages:
+            raise web.HTTPNotFound()
+        return html_response(request, category_page(page, pages, per_page, paginate, embedded_state))
+
+    async def product(request):
+        index = int(request.match_info["slug"].rsplit("-", 1)[-1])
+        # Цены зависят от магазина, выбранного в сессии, как на сайте
+        return html_response(request, product_page(index, request.cookies.get(STORE_COOKIE)))
+
+    app = web.Application(middlewares=list(middlewares))
+    app.router.add_get("/category/{path:.*}", category)
+    app.router.add_get("/products/{slug}", product)
+    return app
+
+
+def build_recorded_app(directory, middlewares=()):
+    """
+    Создаёт stub-сервер, отдающий записанные страницы сайта. Абсолютные ссылки на BASE_URL
+    заменяются относительными, чтобы парсер не уходил с stub-сервера на настоящий сайт.
+    :param directory: Папка с сохранёнными ответами.
+    :param middlewares: Middleware приложения, например fault_middleware().
+    :return: web.Application.
+    """
+    pages = load_recorded_pages(directory)
+    if not pages:
+        raise ValueError(f"В папке {directory} нет сохранённых ответов с URL в имени файла")
+    origin = BASE_URL.encode("utf-8")
+    cache = {}
+
+    async def recorded(request):
+        key = response_key(request.path_qs)
+        if key not in pages:
+            raise web.HTTPNotFound()
+        if key not in cache:
+            with open(pages[key], "rb") as f:
+                cache[key] = f.read().replace(origin, b"")
+        # Кодировку записанной страницы парсер определяет сам, как для ответа без charset
+        return html_response(request, cache[key], charset=None)
+
+    app = web.Application(middlewares=list(middlewares))
+    app["pages"] = pages
+    app.router.add_get("/{path:.*}", recorded)
+    return app
+
+
+async def start_stub_server(app, host="127.0.0.1", port=0):
+    """
+    Запускает stub-сервер на свободном порту.
+    :param app: web.Application.
+    :param host: Адрес для прослушивания.
+    :param port: Порт (0 для выбора свободного).
+    :return: Кортеж (runner, base_url). runner нужно остановить через runner.cleanup().
+    """
+    runner = web.AppRunner(app, access_log=None)
+    await runner.setup()
+    site = web.TCPSite(runner, host, port)
+    await site.start()
+    bound_port = site._server.sockets[0].getsockname()[1]
+    return runner, f"http://{host}:{bound_port}"
+
+
+async def serve(app, host, port):
+    runner, base_url = await start_stub_server(app, host, port)
+    print(f"Stub-сервер запущен: {base_url}")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await runner.cleanup()
+
+
+if __name__ == "__main__":
+    arg_parser = argparse.ArgumentParser(description=__doc__)
+    arg_parser.add_argument("--host", default="127.0.0.1")
+    arg_parser.add_argument("--port", type=int, default=8080)
+    arg_parser.add_argument("--recorded", help="Папка с сохранёнными ответами (иначе синтетические страницы)")
+    arg_parser.add_argument("--pages", type=int, default=5)
+    arg_parser.add_argument("--per-page", type=int, default=30)
+    arg_parser.add_argument("--latency", type=float, default=0, help="Задержка ответа (в мс)")
+    arg_parser.add_argument("--jitter", type=float, default=0, help="Случайная добавка к задержке (в мс)")
+    arg_parser.add_argument("--error-rate", type=float, default=0, help="Доля ответов с ошибкой (0..1)")
+    arg_parser.add_argument("--error-status", type=int, default=503)
+    arg_parser.add_argument("--bandwidth", type=float, default=0, help="Скорость отдачи ответа (КБ/с, 0 — без ограничения)")
+    arg_parser.add_argument("--compress", action="store_true", help="Сжимать ответы (zstd, br или gzip по Accept-Encoding)")
+    arg_parser.add_argument("--seed", type=int)
+    args = arg_parser.parse_args()
+
+    faults = fault_middleware(args.latency / 1000, args.jitter / 1000, args.error_rate, args.error_status, seed=args.seed)
+    middlewares = [faults]
+    if args.bandwidth:
+        middlewares.append(bandwidth_middleware(args.bandwidth * 1024))
+    if args.compress:
+        middlewares.append(compression_middleware())
+    if args.recorded:
+        stub_app = build_recorded_app(args.recorded, middlewares)
+    else:
+        stub_app = build_app(args.pages, args.per_page, middlewares=middlewares)
+    try:
+        asyncio.run(serve(stub_app, args.host, args.port))
+    except KeyboardInterrupt:
+        pass
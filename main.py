@@ -1,9 +1,26 @@
+import argparse
 import asyncio
 import os
 from metro_parser.utils.logger import logger
 from metro_parser.utils.file_handler import FileHandler
 from metro_parser.parser import MetroParser
-from metro_parser.config import BASE_URL, SAVE_HTML_RESPONSES, DATA_DIR, RESPONSES_DIR, LOGS_DIR, OUTPUT_DIR
+from metro_parser.orchestrator import CategoryOrchestrator, CATEGORY_OUTPUT_MODES, category_url, read_categories
+from metro_parser.distributed import Coordinator, Worker, ROLES
+from metro_parser.utils.profiling import RunProfiler, PROFILE_MODES
+from metro_parser.utils.price_history import PriceHistory
+from metro_parser.config import (
+    CATEGORIES,
+    CATEGORIES_FILE,
+    CATEGORY_OUTPUT,
+    SAVE_HTML_RESPONSES,
+    RESUME_CRAWL,
+    INCREMENTAL_CRAWL,
+    DATA_DIR,
+    RESPONSES_DIR,
+    LOGS_DIR,
+    OUTPUT_DIR,
+    WORK_QUEUE,
+)
 
 
 def ensure_directories():
@@ -16,17 +33,96 @@ def ensure_directories():
     os.makedirs(OUTPUT_DIR, exist_ok=True)
 
 
-async def main():
+def parse_args():
+    """
+    Разбирает аргументы командной строки. Значения по умолчанию берутся из config.py.
+    """
+    parser = argparse.ArgumentParser(description="Асинхронный парсер товаров Metro.")
+    parser.add_argument("categories", nargs="*", help="Пути (/category/...) или URL категорий.")
+    parser.add_argument("-f", "--file", help="Файл со списком категорий (по одной на строку).")
+    parser.add_argument(
+        "-o",
+        "--output",
+        choices=CATEGORY_OUTPUT_MODES,
+        default=CATEGORY_OUTPUT,
+        help="Общий файл результатов или отдельный файл на каждую категорию.",
+    )
+    parser.add_argument("--resume", action="store_true", default=RESUME_CRAWL, help="Продолжить прерванный парсинг.")
+    parser.add_argument(
+        "--incremental", action="store_true", default=INCREMENTAL_CRAWL, help="Разбирать только изменившиеся товары."
+    )
+    parser.add_argument(
+        "--profile",
+        choices=PROFILE_MODES,
+        help="Профилировать запуск: cprofile (подробно, с замедлением) или sampling (семплирование стеков).",
+    )
+    parser.add_argument("--profile-output", help="Файл профиля (по умолчанию data/profiles/profile_<дата>.*).")
+    parser.add_argument(
+        "--role",
+        choices=ROLES,
+        help="Распределённый парсинг: coordinator ставит ссылки на товары в общую очередь, worker обрабатывает их.",
+    )
+    parser.add_argument("--queue", default=WORK_QUEUE, help="Очередь: путь к файлу SQLite или redis://host:port/db.")
+    parser.add_argument(
+        "--workers", type=int, default=0, help="Сколько воркеров координатор запускает на этой машине."
+    )
+    parser.add_argument("--worker-id", help="Идентификатор воркера (по умолчанию — имя машины и PID).")
+    parser.add_argument(
+        "--import-archives",
+        action="store_true",
+        help="Добавить архивы результатов (output.json.<дата>.bak) в историю цен и завершить работу.",
+    )
+    return parser.parse_args()
+
+
+def load_categories(args):
+    """
+    Список категорий: из командной строки, из файла или из config.py.
+    """
+    categories = list(args.categories)
+    if args.file:
+        categories += read_categories(args.file)
+    if not categories and os.path.exists(CATEGORIES_FILE):
+        categories = read_categories(CATEGORIES_FILE)
+    return categories or CATEGORIES
+
+
+def import_archives():
+    """
+    Добавляет архивы прошлых результатов в историю цен.
+    """
+    with PriceHistory() as history:
+        imported = history.import_archives()
+    added = sum(imported.values())
+    logger.info(f"Архивов в истории цен: {len(imported)}, добавлено товаров: {added}")
+
+
+async def main(args):
     try:
-        # Указываем категорию для парсинга
-        category_url = f"{BASE_URL}/category/myasnye/myaso"
-        logger.info(f"Запускаем парсер для категории: {category_url}")
+        if args.role == "worker":
+            await Worker(args.queue, worker_id=args.worker_id).run()
+            return
 
-        # Создаем экземпляр парсера
-        parser = MetroParser(category_url)
+        categories = load_categories(args)
 
-        # Запускаем процесс парсинга
-        await parser.run()
+        if args.role == "coordinator":
+            logger.info(f"Запускаем координатор для категорий: {len(categories)}")
+            if args.incremental:
+                logger.warning("Инкрементальный режим не поддерживается в распределённом парсинге и не будет использован.")
+            await Coordinator(categories, queue=args.queue, workers=args.workers).run(resume=args.resume)
+        elif len(categories) == 1 and args.output == "merged":
+            # Одна категория: обычный парсер (поддерживает инкрементальный режим)
+            url = category_url(categories[0])
+            logger.info(f"Запускаем парсер для категории: {url}")
+            parser = MetroParser(url)
+            await parser.run(resume=args.resume, incremental=args.incremental)
+        else:
+            # Несколько категорий: общий пул соединений и конвейер товаров
+            logger.info(f"Запускаем парсер для категорий: {len(categories)}")
+            if args.incremental:
+                logger.warning("Инкрементальный режим поддерживается только для одной категории и не будет использован.")
+            orchestrator = CategoryOrchestrator(categories, output=args.output)
+            await orchestrator.run(resume=args.resume)
 
     except Exception as e:
         logger.error(f"Ошибка в процессе выполнения парсера: {e}")
@@ -38,9 +134,19 @@ async def main():
 
 
 if __name__ == "__main__":
+    args = parse_args()
+
     # Создаем необходимые папки перед запуском
     ensure_directories()
 
+    if args.import_archives:
+        import_archives()
+        raise SystemExit
+
     logger.info("Инициализация процесса парсинга.")
-    asyncio.run(main())
+    if args.profile:
+        with RunProfiler(args.profile, args.profile_output):
+            asyncio.run(main(args))
+    else:
+        asyncio.run(main(args))
     logger.info("Процесс парсинга завершён.")
@@ -0,0 +1,260 @@
+import codecs
+import re
+
+from bs4 import BeautifulSoup, NavigableString, CData, Tag
+from lxml import etree, html as lxml_html
+
+try:
+    from selectolax.lexbor import LexborHTMLParser
+except ImportError:  # selectolax — необязательная зависимость
+    LexborHTMLParser = None
+
+from metro_parser.plan import Compound
+from metro_parser.config import PARSER_BACKEND
+
+_CHARSET_RE = re.compile(rb"""<meta[^>]+charset\s*=\s*["']?([\w-]+)""", re.IGNORECASE)
+_lxml_parsers = {}
+
+
+def sniff_encoding(html_content, default="utf-8"):
+    """
+    Определяет кодировку HTML по тегу <meta charset> в начале документа.
+    :param html_content: HTML в байтах.
+    :param default: Кодировка по умолчанию.
+    :return: Название кодировки.
+    """
+    match = _CHARSET_RE.search(html_content, 0, 4096)
+    return match.group(1).decode("ascii").lower() if match else default
+
+
+def _decode(html_content):
+    if isinstance(html_content, str):
+        return html_content
+    return html_content.decode(sniff_encoding(html_content), errors="replace")
+
+
+def walk_soup(node, run):
+    """
+    Обходит дерево BeautifulSoup, передавая события в PlanRun.
+    Учитываются только те строки, которые попадают в get_text().
+    """
+    for child in node.contents:
+        if isinstance(child, Tag):
+            run.start(child.name, child.attrs)
+            walk_soup(child, run)
+            run.end(child.name)
+        elif type(child) in (NavigableString, CData):
+            run.data(child)
+
+
+def walk_lxml(element, run):
+    """
+    Обходит дерево lxml, передавая события в PlanRun.
+    Комментарии и инструкции пропускаются, но текст после них (tail) учитывается.
+    """
+    run.start(element.tag, element.attrib)
+    if element.text:
+        run.data(element.text)
+    for child in element:
+        if isinstance(child.tag, str):
+            walk_lxml(child, run)
+        if child.tail:
+            run.data(child.tail)
+    run.end(element.tag)
+
+
+def walk_lexbor(node, run):
+    """
+    Обходит дерево selectolax (lexbor), передавая события в PlanRun.
+    """
+    child = node.child
+    while child is not None:
+        tag = child.tag
+        if tag == "-text":
+            run.data(child.text_content)
+        elif not tag.startswith("-"):
+            run.start(tag, child.attributes)
+            walk_lexbor(child, run)
+            run.end(tag)
+        child = child.next
+
+
+def _run_bs4(html_content, run):
+    # Кодировка задаётся явно: иначе BeautifulSoup перебирает кодировки и угадывает её по содержимому
+    from_encoding = sniff_encoding(html_content) if isinstance(html_content, bytes) else None
+    walk_soup(BeautifulSoup(html_content, "html.parser", from_encoding=from_encoding), run)
+
+
+def _run_lxml(html_content, run):
+    if isinstance(html_content, bytes):
+        encoding = sniff_encoding(html_content)
+        parser = _lxml_parsers.get(encoding)
+        if parser is None:
+            parser = _lxml_parsers[encoding] = lxml_html.HTMLParser(encoding=encoding)
+    else:
+        parser = None
+    try:
+        root = lxml_html.document_fromstring(html_content, parser=parser)
+    except (etree.ParserError, ValueError):
+        # Пустой документ: извлекать нечего
+        return
+    walk_lxml(root, run)
+
+
+def _run_selectolax(html_content, run):
+    if LexborHTMLParser is None:
+        raise ImportError("Для PARSER_BACKEND = 'selectolax' установите пакет selectolax")
+    walk_lexbor(LexborHTMLParser(_decode(html_content)).root.parent, run)
+
+
+class _StreamTarget:
+    """
+    Цель (target) парсера lxml: события разбора передаются в StreamingPlanParser.
+    """
+
+    __slots__ = ("start", "data", "end", "comment", "pi")
+
+    def __init__(self, owner):
+        self.start = owner._start
+        self.data = owner._data
+        self.end = owner._end
+        # Комментарии и инструкции пропускаются, но разделяют текстовые узлы (как в walk_lxml)
+        self.comment = self.pi = lambda *args: owner._flush()
+
+    def close(self):
+        return None
+
+
+class StreamingPlanParser:
+    def __init__(self, plan, stop_selector=None):
+        """
+        Выполняет план извлечения по мере поступления HTML частями (инкрементальный парсер lxml),
+        не дожидаясь загрузки всего документа и не строя дерево.
+
+        Разбор считается законченным (feed возвращает True), когда план нашёл всё, что мог
+        (PlanRun.complete), или закрылся первый элемент stop_selector — граница области, в которой лежат
+        все поля. События после этого в план не передаются: результат не зависит от того,
+        какими частями пришёл документ.
+
+        :param plan: ExtractionPlan.
+        :param stop_selector: Простой CSS-селектор границы (без комбинаторов) или None.
+        """
+        self.run = plan.start()
+        self.stop = Compound(stop_selector) if stop_selector else None
+        self.done = False
+        self.bytes_read = 0
+        self._parser = None
+        self._head = b""
+        self._depth = 0
+        self._stop_depth = None
+        self._decoder = None
+        self._pending = ""
+        self._text = []
+
+    def feed(self, chunk):
+        """
+        Передаёт парсеру очередную часть документа.
+        :param chunk: Байты HTML.
+        :return: True, если дальше документ читать не нужно.
+        """
+        self.bytes_read += len(chunk)
+        if self.done:
+            return True
+        if self._parser is None:
+            # Кодировка берётся из <meta charset>, как при разборе целого документа (см. _run_lxml)
+            self._head += chunk
+            if len(self._head) < 4096:
+                return False
+            chunk, self._head = self._head, b""
+            self._start_parser(chunk)
+        self._feed_text(self._decoder.decode(chunk))
+        return self.done
+
+    def close(self):
+        """
+        Завершает разбор (в том числе досрочно).
+        :return: Словарь с результатом плана.
+        """
+        if self._parser is None:
+            if not self._head:
+                return self.run.result
+            self._start_parser(self._head)
+            self._feed_text(self._decoder.decode(self._head))
+        try:
+            self._feed_text(self._decoder.decode(b"", True), final=True)
+            self._parser.close()
+        except etree.XMLSyntaxError:
+            # Оборванный документ: всё, что успело разобраться, уже в результате
+            pass
+        return self.run.result
+
+    def _start_parser(self, head):
+        # Байты декодируются здесь, а не в lxml: граница части может прийтись на середину символа
+        self._decoder = codecs.getincrementaldecoder(sniff_encoding(head))(errors="replace")
+        self._parser = etree.HTMLParser(target=_StreamTarget(self))
+
+    def _feed_text(self, text, final=False):
+        text = self._pending + text
+        # Незаконченный тег откладывается до следующей части: push-парсер libxml2 теряет остаток документа,
+        # если граница части приходится внутрь "</script>"
+        cut = text.rfind("<")
+        if not final and cut > text.rfind(">"):
+            text, self._pending = text[:cut], text[cut:]
+        else:
+            self._pending = ""
+        if text:
+            self._parser.feed(text)
+
+    def _flush(self):
+        # lxml сообщает текст кусками (по границам частей и сущностей), а план ждёт текстовый узел целиком
+        if self._text:
+            self.run.data("".join(self._text))
+            self._text.clear()
+
+    def _start(self, tag, attrs):
+        if self.done:
+            return
+        self._flush()
+        self._depth += 1
+        if self._stop_depth is None and self.stop is not None:
+            class_attr = attrs.get("class")
+            if self.stop.matches(tag, set(class_attr.split()) if class_attr else set(), attrs):
+                self._stop_depth = self._depth
+        self.run.start(tag, attrs)
+        if self.run.complete:
+            self.done = True
+
+    def _data(self, text):
+        if not self.done:
+            self._text.append(text)
+
+    def _end(self, tag):
+        if self.done:
+            return
+        self._flush()
+        self.run.end(tag)
+        if self._depth == self._stop_depth or self.run.complete:
+            self.done = True
+        self._depth -= 1
+
+
+PARSER_BACKENDS = {
+    "bs4": _run_bs4,
+    "lxml": _run_lxml,
+    "selectolax": _run_selectolax,
+}
+
+
+def run_plan(plan, html_content, backend=PARSER_BACKEND):
+    """
+    Строит дерево документа выбранным бэкендом и выполняет план извлечения за один проход.
+    :param plan: ExtractionPlan.
+    :param html_content: HTML (bytes или str).
+    :param backend: "bs4", "lxml" или "selectolax".
+    :return: Словарь с результатом плана.
+    """
+    if backend not in PARSER_BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд парсинга: {backend}. Допустимые: {', '.join(PARSER_BACKENDS)}")
+    run = plan.start()
+    PARSER_BACKENDS[backend](html_content, run)
+    return run.result
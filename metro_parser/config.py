@@ -13,15 +13,19 @@ HEADERS = {
         "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/91.0.4472.124 Safari/537.36"
     ),
     "Accept-Language": "ru-RU,ru;q=0.9",
-    "Accept-Encoding": "gzip, deflate, br",
 }
 
+# Сжатия ответов в порядке предпочтения (заголовок Accept-Encoding). Сжатие без установленного декодера
+# не объявляется: "br" нужен пакет Brotli, "zstd" — zstandard
+ACCEPT_ENCODINGS = ("zstd", "br", "gzip", "deflate")
+
 
 # Базовая директория проекта
 BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 
-# Папка для данных
-DATA_DIR = os.path.join(BASE_DIR, "data")
+# Папка для данных (переменная окружения METRO_PARSER_DATA_DIR позволяет запустить парсер
+# с отдельной папкой данных, например в бенчмарках)
+DATA_DIR = os.environ.get("METRO_PARSER_DATA_DIR") or os.path.join(BASE_DIR, "data")
 
 # Папка для логов
 OUTPUT_DIR = os.path.join(DATA_DIR, "outputs")
@@ -29,14 +33,56 @@ OUTPUT_DIR = os.path.join(DATA_DIR, "outputs")
 # Путь для сохранения итогового JSON
 OUTPUT_FILE = os.path.join(OUTPUT_DIR, "output.json")
 
+# Путь для потоковой записи товаров (JSON Lines, по строке на товар)
+OUTPUT_JSONL_FILE = os.path.join(OUTPUT_DIR, "output.jsonl")
+
+# Путь для изменений относительно прошлого запуска (инкрементальный режим)
+DELTA_FILE = os.path.join(OUTPUT_DIR, "delta.jsonl")
+
+# Файл состояния парсинга (для продолжения прерванного парсинга)
+STATE_FILE = os.path.join(DATA_DIR, "crawl_state.sqlite3")
+
+# Интервал фиксации состояния парсинга на диске (в секундах)
+STATE_CHECKPOINT_INTERVAL = 5
+
+# Продолжать прерванный парсинг вместо запуска с нуля
+RESUME_CRAWL = False
+
+# Инкрементальный режим: разбирать только изменившиеся товары и писать изменения в DELTA_FILE
+INCREMENTAL_CRAWL = False
+
+# Категории для парсинга (путь или полный URL), если они не переданы в командной строке
+CATEGORIES = ["/category/myasnye/myaso"]
+
+# Файл со списком категорий (по одной на строку, строки с # пропускаются); используется, если существует
+CATEGORIES_FILE = os.path.join(BASE_DIR, "categories.txt")
+
+# Результат парсинга нескольких категорий: "merged" — общий файл, "per_category" — файл на каждую категорию
+CATEGORY_OUTPUT = "merged"
+
+# Папка для результатов по категориям
+CATEGORY_OUTPUT_DIR = os.path.join(OUTPUT_DIR, "categories")
+
+# Снимок товаров с прошлого запуска (для инкрементального режима)
+SNAPSHOT_FILE = os.path.join(DATA_DIR, "snapshot.sqlite3")
+
+# Значимый фрагмент страницы товара, по хешу которого определяется, изменился ли товар
+INCREMENTAL_FRAGMENT_START = b"product-page-content"  # None — с начала документа
+INCREMENTAL_FRAGMENT_END = None  # None — до конца документа
+
 # Папка для HTML-ответов
 RESPONSES_DIR = os.path.join(DATA_DIR, "responses")
 
 # Папка для логов
 LOGS_DIR = os.path.join(DATA_DIR, "logs")
 
-# Путь для файла логов
-LOG_FILE = os.path.join(LOGS_DIR, "parser.log")
+# Путь для файла логов (переменная окружения METRO_PARSER_LOG_FILE задаёт отдельный файл,
+# например для воркеров распределённого парсинга на одной машине)
+LOG_FILE = os.environ.get("METRO_PARSER_LOG_FILE") or os.path.join(LOGS_DIR, "parser.log")
+
+# Папка для профилей (python main.py --profile cprofile|sampling)
+PROFILE_DIR = os.path.join(DATA_DIR, "profiles")
+PROFILE_SAMPLE_INTERVAL = 0.005  # Интервал снятия стеков семплирующим профилировщиком (в секундах)
 
 
 # Уровень логирования
@@ -45,15 +91,160 @@ LOG_LEVEL = "INFO"  # DEBUG, INFO, WARNING, ERROR, CRITICAL
 # Формат логирования
 LOG_FORMAT = "%(asctime)s - %(levelname)s - %(message)s"
 
+# Запись логов в фоновом потоке (QueueHandler/QueueListener): вызов логгера не ждёт консоли и диска
+LOG_ASYNC = True
+
+# Формат лог-файла: "text" (LOG_FORMAT) или "json" (JSON Lines для систем сбора логов); консоль всегда текстовая
+LOG_FILE_FORMAT = os.environ.get("METRO_PARSER_LOG_FORMAT", "text")
+
+# Ротация лог-файла по размеру
+LOG_MAX_BYTES = 20 * 1024 * 1024  # Размер файла, после которого начинается новый (в байтах)
+LOG_BACKUP_COUNT = 5  # Сколько предыдущих файлов хранить (parser.log.1 ... parser.log.5)
+
+# Интервал сводки по загруженным страницам (в секундах): количество и время ответа p50/p95
+# вместо строки лога на каждый запрос (отдельные запросы — на уровне DEBUG)
+LOG_PROGRESS_INTERVAL = 30
+
 
 # Сохранять ли HTML-ответы
 SAVE_HTML_RESPONSES = False
 
+# Фоновая запись файлов (HTML-ответы, результат) вне цикла событий
+ASYNC_FILE_IO = True
+FILE_WRITE_QUEUE_SIZE = 1000  # Максимум заданий записи в очереди (дальше корутины ждут)
+FILE_WRITE_BATCH_SIZE = 100  # Максимум заданий (или товаров), записываемых за один раз
+FILE_WRITE_WORKERS = 4  # Количество потоков записи HTML-ответов
+
+# Кэш HTTP-ответов с условными запросами (ETag/Last-Modified)
+USE_RESPONSE_CACHE = False
+CACHE_DIR = os.path.join(DATA_DIR, "cache")
+CACHE_TTL = 0  # Сколько секунд ответ отдаётся из кэша без запроса (0 — всегда перепроверять на сайте)
+CACHE_MAX_SIZE = 500 * 1024 * 1024  # Максимальный размер кэша (в байтах), старые записи удаляются (LRU)
+CACHE_EVICT_TARGET = 0.9  # При превышении CACHE_MAX_SIZE кэш уменьшается до этой доли от него, чтобы не чистить его при каждой записи
+CACHE_ACCESS_FLUSH_INTERVAL = 10  # Как часто (в секундах) время доступа к записям кэша сохраняется в индекс одной транзакцией
+
+# Дедупликация товаров. Ссылки на товары приводятся к каноническому виду (без параметров запроса,
+# фрагмента и завершающего "/"), поэтому варианты одной ссылки загружаются один раз; товары с одинаковым
+# артикулом записываются один раз. Индекс на диске хранит товары, загруженные за последние DEDUP_WINDOW
+# секунд: такие товары не загружаются повторно ни в других категориях, ни в следующих запусках,
+# а берутся из индекса.
+CANONICAL_QUERY_PARAMS = ()  # Параметры запроса, которые остаются в ссылке на товар (например, ("variant",))
+DEDUP_INDEX_FILE = os.path.join(DATA_DIR, "dedup_index.sqlite3")
+DEDUP_WINDOW = 0  # Окно дедупликации между запусками (в секундах, 0 — только в пределах запуска)
+DEDUP_BLOOM_CAPACITY = 1000000  # Ожидаемое количество товаров в индексе (размер фильтра Блума в памяти)
+DEDUP_BLOOM_ERROR_RATE = 0.01  # Доля ложных срабатываний фильтра Блума (они стоят одного запроса к индексу)
+
 # Максимальное количество страниц для парсинга
 MAX_PAGES = 100  # None для бесконечного парсинга, пока есть страницы
 
-# Задержка между запросами (в секундах)
-REQUEST_DELAY = 10  # None для отсутствия задержек
+# Повторные попытки запросов. Повторяются только временные ошибки (5xx, 429, тайм-ауты, разрывы соединения),
+# 404 и другие ошибки 4xx — нет
+RETRY_ATTEMPTS = 6  # Максимум попыток загрузить один URL
+RETRY_BACKOFF_BASE = 1  # Верхняя граница задержки перед первым повтором (в секундах), дальше растёт экспоненциально
+RETRY_BACKOFF_MULTIPLIER = 2  # Во сколько раз растёт граница задержки с каждой попыткой
+RETRY_BACKOFF_MAX = 60  # Максимальная задержка перед повтором (в секундах)
+RETRY_BUDGET_RATIO = 0.2  # Повторов за запуск — не больше этой доли от всех запросов...
+RETRY_BUDGET_MIN = 20  # ...плюс постоянный запас повторов
+
+# Автоматический выключатель (circuit breaker): пауза запросов к хосту при всплеске ошибок
+CIRCUIT_WINDOW = 20  # Количество последних запросов для расчёта доли ошибок
+CIRCUIT_ERROR_THRESHOLD = 0.5  # Доля временных ошибок, при которой запросы приостанавливаются
+CIRCUIT_MIN_REQUESTS = 10  # Минимум запросов в окне для срабатывания
+CIRCUIT_OPEN_TIME = 30  # Начальная пауза (в секундах), удваивается при неудачном пробном запросе
+CIRCUIT_MAX_OPEN_TIME = 300  # Максимальная пауза (в секундах)
+
+# Настройки пула соединений (одна сессия на весь процесс парсинга)
+POOL_LIMIT = 100  # Общее количество соединений в пуле (0 для отсутствия ограничения)
+POOL_LIMIT_PER_HOST = 20  # Количество соединений на один хост (0 для отсутствия ограничения)
+KEEPALIVE_TIMEOUT = 30  # Время жизни простаивающего соединения (в секундах)
+DNS_CACHE_TTL = 300  # Время кэширования DNS-ответов (в секундах, None для бессрочного кэша)
+
+# Планировщик запросов
+MAX_CONCURRENCY = 50  # Общее количество одновременных запросов
+MAX_CONCURRENCY_PER_HOST = 10  # Максимум одновременных запросов к одному хосту
+RATE_LIMIT = 5  # Начальная скорость запросов к одному хосту (запросов в секунду)
+RATE_LIMIT_MIN = 0.5  # Минимальная скорость запросов к одному хосту
+RATE_LIMIT_MAX = 50  # Максимальная скорость запросов к одному хосту
+LATENCY_TARGET = 5  # Время ответа (в секундах), выше которого темп снижается
+AIMD_INCREASE = 1  # Прирост скорости (запросов в секунду) за каждую секунду успешной работы
+AIMD_DECREASE = 0.5  # Множитель скорости при ответах 429/5xx и медленных ответах
+
+# Брать данные товаров из состояния, встроенного в страницы категории (window.__INITIAL_STATE__ и т.п.).
+# Страница товара загружается, только если в состоянии не хватает какого-либо поля.
+# Пути EMBEDDED_PRODUCT_KEYS нужно сверить со страницами сайта перед включением.
+USE_EMBEDDED_STATE = False
+
+# Начало скрипта с состоянием страницы; после маркера (и знака "=") должен идти JSON
+EMBEDDED_STATE_MARKERS = (b"window.__INITIAL_STATE__", b"window.__NUXT__", b'id="__NEXT_DATA__"')
+
+# Где искать поля товара в записи состояния: пути через точку (числа — индексы списков), первый найденный путь
+EMBEDDED_PRODUCT_KEYS = {
+    "id": ("article", "id"),
+    "name": ("name",),
+    "brand": ("manufacturer.name", "brand"),
+    "current_price": ("stocks.0.prices.price", "prices.price", "price"),
+    "old_price": ("stocks.0.prices.old_price", "prices.old_price", "old_price"),
+    "discount": ("stocks.0.prices.discount", "prices.discount", "discount"),
+    "offline_prices": ("stocks.0.prices.offline", "prices.offline", "offline_prices"),
+    "link": ("url", "link"),
+}
+
+# Цены в нескольких магазинах. Цены на сайте зависят от магазина, выбранного в сессии (cookie STORE_COOKIE):
+# для каждого магазина открывается своя сессия на общем пуле соединений, страница товара загружается во всех
+# магазинах одновременно, название, артикул и бренд разбираются один раз, а цены — для каждого магазина
+# (поле "store_prices": магазин -> цены; основные поля цен — по первому магазину, пустые, если его страница
+# не загрузилась). Пустой список — только магазин сессии по умолчанию. Не работает с INCREMENTAL_CRAWL,
+# STREAMING_PRODUCT_FETCH и пулом прокси, а данные товаров со страниц категории (USE_EMBEDDED_STATE)
+# при этом не используются.
+STORE_IDS = ()  # Например, ("10", "12", "16")
+STORE_COOKIE = "metroStoreId"
+
+# Количество воркеров, загружающих страницы товаров
+WORKERS = 20
+
+# Бэкенд построения HTML-дерева: "bs4" (BeautifulSoup + html.parser), "lxml" или "selectolax" (нужен пакет selectolax)
+PARSER_BACKEND = "lxml"
+
+# Потоковая загрузка страниц товаров: страница разбирается инкрементальным парсером lxml по мере загрузки,
+# и загрузка прекращается, как только найдены все поля товара (не работает с INCREMENTAL_CRAWL)
+STREAMING_PRODUCT_FETCH = False
+STREAM_STOP_SELECTOR = ".product-page-content"  # Элемент, после закрытия которого полей товара нет (None — до конца)
+STREAM_CHUNK_SIZE = 16 * 1024  # Размер части тела ответа, передаваемой парсеру (в байтах)
+STREAM_DRAIN_LIMIT = 16 * 1024  # Остаток ответа до этого размера дочитывается, чтобы соединение вернулось в пул (больший — соединение закрывается)
+
+# Где выполнять парсинг HTML: "inline" (в цикле событий), "thread" (пул потоков), "process" (пул процессов)
+PARSE_EXECUTOR = "inline"
+
+# Количество воркеров, разбирающих страницы (и размер пула потоков/процессов)
+PARSE_WORKERS = os.cpu_count() or 1
+
+# Максимальный размер очередей конвейера (ссылки, страницы, товары)
+QUEUE_SIZE = 100
+
+# Итоговые форматы результата, собираются из OUTPUT_JSONL_FILE после парсинга (файлы output.<формат>):
+# "json" (массив с отступами), "jsonl.gz", "jsonl.zst" (нужен zstandard), "parquet" (нужен pyarrow)
+OUTPUT_FORMATS = ("json",)
+
+# Количество строк в одной группе строк Parquet
+PARQUET_ROW_GROUP_SIZE = 10000
+
+# Сжатие архивов предыдущих результатов (*.bak): None, "gzip" или "zstd" (нужен zstandard)
+ARCHIVE_COMPRESSION = "gzip"
+
+# Сколько архивов каждого файла хранить (None — хранить все)
+ARCHIVE_RETENTION = 10
+
+# История цен (SQLite): после каждого запуска товары из OUTPUT_JSONL_FILE добавляются в базу,
+# где цены товара по запускам доступны по артикулу, бренду и дате без чтения архивов *.bak
+PRICE_HISTORY_ENABLED = False
+PRICE_HISTORY_FILE = os.path.join(DATA_DIR, "price_history.sqlite3")
+PRICE_HISTORY_BATCH_SIZE = 5000  # Количество строк в одной пачке вставки
+
+# Метрики: гистограммы времени запросов и разбора, коды ответов, размеры очередей
+METRICS_ENABLED = True
+METRICS_FILE = os.path.join(DATA_DIR, "metrics.prom")  # Файл в формате Prometheus (None — не писать)
+METRICS_PORT = None  # Порт HTTP-эндпоинта /metrics (None — не запускать)
+METRICS_INTERVAL = 30  # Интервал сводки в логе и обновления файла (в секундах)
 
 # Настройка прокси
 USE_PROXY = False
@@ -63,3 +254,24 @@ PROXY_PORT = 31539
 PROXY_USER = ""
 PROXY_PASSWORD = ""
 
+
+# Пул прокси: каждый прокси получает свой пул соединений, лимит запросов и оценку здоровья.
+# Файл — по прокси на строку: socks5://user:password@ip:port или http://ip:port (строки с # пропускаются).
+# Если пул включён, USE_PROXY не используется.
+USE_PROXY_POOL = False
+PROXY_FILE = os.path.join(BASE_DIR, "proxies.txt")
+PROXY_RATE_LIMIT = 5  # Максимум запросов в секунду через один прокси (None — без ограничения)
+PROXY_CONCURRENCY = 10  # Максимум одновременных запросов через один прокси
+PROXY_HEALTH_WINDOW = 20  # Количество последних запросов для оценки доли ошибок прокси
+PROXY_MAX_FAILURE_RATE = 0.5  # Доля ошибок, при которой прокси исключается из пула
+PROXY_RECHECK_INTERVAL = 300  # Через сколько секунд исключённый прокси проверяется снова
+PROXY_CHECK_URL = BASE_URL  # Страница для проверки исключённого прокси
+
+# Распределённый парсинг (python main.py --role coordinator|worker): координатор загружает страницы
+# категорий и ставит ссылки на товары в общую очередь, воркеры берут ссылки в аренду, загружают и разбирают товары.
+# Очередь — файл SQLite (процессы на одной машине) или redis://host:port/db (несколько машин, нужен пакет redis).
+WORK_QUEUE = os.path.join(DATA_DIR, "work_queue.sqlite3")
+WORK_LEASE_TIMEOUT = 120  # Через сколько секунд без продления аренды ссылка возвращается в очередь (воркер упал)
+WORK_MAX_ATTEMPTS = 3  # Сколько раз ссылка выдаётся воркерам, прежде чем считается неудачной
+WORK_CONCURRENCY = 20  # Количество ссылок, которые воркер обрабатывает одновременно
+WORK_POLL_INTERVAL = 1  # Интервал опроса очереди, когда она пуста (в секундах)
@@ -0,0 +1,344 @@
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+
+from contextlib import AsyncExitStack, ExitStack
+
+from metro_parser.extract import extract_product, extract_store_product, product_stream_reader, product_from_fields
+from metro_parser.parser import MetroParser
+from metro_parser.orchestrator import category_url
+from metro_parser.utils.writers import JsonLinesWriter, export_outputs
+from metro_parser.utils.price_history import record_run
+from metro_parser.utils.logger import logger
+from metro_parser.utils.crawl_session import crawl_session
+from metro_parser.utils.crawl_state import CrawlState
+from metro_parser.utils.metrics import MetricsReporter, PRODUCTS
+from metro_parser.utils.dedup_index import DedupIndex
+from metro_parser.utils.retry_policy import is_permanent
+from metro_parser.utils.work_queue import open_work_queue, FAILED
+from metro_parser.config import (
+    BASE_DIR,
+    LOGS_DIR,
+    METRICS_FILE,
+    OUTPUT_JSONL_FILE,
+    DEDUP_WINDOW,
+    STREAMING_PRODUCT_FETCH,
+    WORK_QUEUE,
+    WORK_LEASE_TIMEOUT,
+    WORK_CONCURRENCY,
+    WORK_POLL_INTERVAL,
+    PRICE_HISTORY_ENABLED,
+)
+
+ROLES = ("coordinator", "worker")
+
+# Интервал сводки координатора о состоянии очереди (в секундах)
+PROGRESS_INTERVAL = 30
+
+# Сколько секунд координатор ждёт завершения своих воркеров, прежде чем остановить их
+WORKER_STOP_TIMEOUT = 10
+
+
+class QueueLinks:
+    def __init__(self, queue, category_url, memberships, dedup=None, reused=None):
+        """
+        Передаёт ссылки категории в общую очередь вместо ProductPipeline в MetroParser.collect_product_links
+        и запоминает, в каких категориях встречен товар.
+
+        :param queue: Очередь (см. open_work_queue).
+        :param category_url: URL категории.
+        :param memberships: Словарь ссылка -> список URL категорий.
+        :param dedup: DedupIndex: товары, загруженные в пределах его окна, сразу сохраняются как результат.
+        :param reused: Множество ссылок, взятых из индекса (общее для всех категорий).
+        """
+        self.queue = queue
+        self.category_url = category_url
+        self.memberships = memberships
+        self.dedup = dedup
+        self.reused = reused if reused is not None else set()
+        self.pushed = 0
+
+    def _add_membership(self, link):
+        categories = self.memberships.setdefault(link, [])
+        if self.category_url not in categories:
+            categories.append(self.category_url)
+
+    async def put(self, link):
+        self._add_membership(link)
+        if link in self.reused:
+            return
+        if self.dedup is not None:
+            product = self.dedup.recent(link)
+            if product is not None:
+                self.reused.add(link)
+                self.queue.add_result(link, product)
+                return
+        self.pushed += self.queue.push([link])
+
+    async def put_product(self, product):
+        # Данные товара уже есть на странице категории: в очередь ставить нечего
+        self._add_membership(product["link"])
+        self.queue.add_result(product["link"], product)
+
+
+class Coordinator:
+    def __init__(self, categories, queue=WORK_QUEUE, workers=0, client=None, executor=None):
+        """
+        Координатор распределённого парсинга: загружает страницы категорий, ставит ссылки на товары
+        в общую очередь, ждёт, пока воркеры их обработают, и собирает результаты в OUTPUT_JSONL_FILE.
+
+        :param categories: Пути или URL категорий.
+        :param queue: Путь к файлу SQLite или URL Redis (см. open_work_queue).
+        :param workers: Сколько воркеров запустить на этой машине отдельными процессами
+                        (0 — воркеры запускаются отдельно: python main.py --role worker).
+        :param client: Открытый HTTPClient. Если не передан, run() создаёт собственный.
+        :param executor: Открытый ParseExecutor. Если не передан, run() создаёт собственный.
+        """
+        self.category_urls = list(dict.fromkeys(category_url(category) for category in categories))
+        self.queue_location = queue
+        self.workers = workers
+        self.client = client
+        self.executor = executor
+        self.memberships = {}
+        self.reused = set()
+        self.products_count = 0
+        self.listing_complete = False
+        self.processes = []
+
+    async def run(self, resume=False):
+        """
+        Запускает распределённый парсинг.
+        :param resume: Продолжить прерванный парсинг: очередь не очищается, уже обработанные
+                       ссылки повторно не загружаются (страницы категорий загружаются заново).
+        """
+        start_time = time.time()
+        async with AsyncExitStack() as stack:
+            self.client, self.executor = await stack.enter_async_context(crawl_session(self.client, self.executor))
+            self.queue = stack.enter_context(open_work_queue(self.queue_location))
+            self.dedup = stack.enter_context(DedupIndex()) if DEDUP_WINDOW else None
+            if not resume:
+                self.queue.reset()
+            self.queue.set_discovery_done(False)
+            stack.callback(self.stop_workers)
+            self.start_workers()
+
+            pushed = await self.discover()
+            self.queue.set_discovery_done()
+            logger.info(f"Все категории загружены, новых ссылок в очереди: {pushed}")
+            if self.reused:
+                logger.info(f"Товаров из индекса дедупликации (без загрузки): {len(self.reused)}")
+
+            await self.wait_finished()
+            self.write_outputs()
+            stats = self.queue.stats()
+
+        logger.info("Распределённый парсинг завершён.")
+        logger.info(f"Общее количество товаров: {self.products_count}")
+        logger.info(f"Неудачных ссылок: {stats[FAILED]}")
+        logger.info(f"Общее время выполнения: {time.time() - start_time:.2f} секунд.")
+
+    async def discover(self):
+        """
+        Загружает страницы всех категорий и ставит найденные ссылки в очередь.
+        :return: Количество новых ссылок.
+        """
+        parsers = [MetroParser(url, self.client, self.executor) for url in self.category_urls]
+        sinks = [
+            QueueLinks(self.queue, parser.category_url, self.memberships, self.dedup, self.reused)
+            for parser in parsers
+        ]
+        with CrawlState(self.category_urls[0]) as state:
+            for parser in parsers:
+                parser.state = state.for_category(parser.category_url)
+                parser.state.reset()
+            results = await asyncio.gather(
+                *(parser.collect_product_links(sink) for parser, sink in zip(parsers, sinks)),
+                return_exceptions=True,
+            )
+        for parser, result in zip(parsers, results):
+            if isinstance(result, Exception):
+                logger.error(f"Ошибка при парсинге категории {parser.category_url}: {result}")
+        self.listing_complete = all(
+            not isinstance(result, Exception) and parser.listing_complete for parser, result in zip(parsers, results)
+        )
+        return sum(sink.pushed for sink in sinks)
+
+    async def wait_finished(self):
+        """
+        Ждёт, пока воркеры обработают все ссылки, и периодически пишет в лог состояние очереди.
+        """
+        last_report = time.monotonic()
+        while not self.queue.finished():
+            if self.processes and all(process.poll() is not None for process in self.processes):
+                raise RuntimeError("Все воркеры завершились, а очередь не обработана")
+            if time.monotonic() - last_report >= PROGRESS_INTERVAL:
+                last_report = time.monotonic()
+                logger.info("Очередь: " + ", ".join(f"{status} {count}" for status, count in self.queue.stats().items()))
+            await asyncio.sleep(WORK_POLL_INTERVAL)
+
+    def start_workers(self):
+        """
+        Запускает self.workers воркеров на этой машине. У каждого свой файл логов.
+        """
+        location = self.queue_location if "://" in self.queue_location else os.path.abspath(self.queue_location)
+        command = [sys.executable, os.path.join(BASE_DIR, "main.py"), "--role", "worker", "--queue", location]
+        for index in range(self.workers):
+            env = dict(os.environ, METRO_PARSER_LOG_FILE=os.path.join(LOGS_DIR, f"worker_{index + 1}.log"))
+            self.processes.append(subprocess.Popen(command, cwd=BASE_DIR, env=env))
+        if self.processes:
+            logger.info(f"Запущено воркеров: {len(self.processes)}")
+
+    def stop_workers(self):
+        """
+        Ждёт завершения запущенных воркеров (после обработки очереди они завершаются сами),
+        а не завершившиеся за WORKER_STOP_TIMEOUT секунд останавливает.
+        """
+        for process in self.processes:
+            try:
+                process.wait(timeout=WORKER_STOP_TIMEOUT)
+            except subprocess.TimeoutExpired:
+                process.terminate()
+                process.wait()
+        self.processes = []
+
+    def write_outputs(self):
+        """
+        Записывает результаты из очереди в OUTPUT_JSONL_FILE (со списками категорий) и собирает итоговые файлы.
+        """
+        with ExitStack() as files:
+            sink = files.enter_context(JsonLinesWriter(OUTPUT_JSONL_FILE, lazy=True))
+            for product in self.queue.results():
+                if self.dedup is not None and product["link"] not in self.reused:
+                    self.dedup.add(product)
+                product["categories"] = self.memberships.get(product["link"], product.get("categories", []))
+                sink.write(product)
+            self.products_count = sink.count
+        if not sink.count:
+            logger.warning("Товары не собраны, прежние результаты оставлены без изменений.")
+            return
+        export_outputs(OUTPUT_JSONL_FILE)
+        if PRICE_HISTORY_ENABLED:
+            record_run(OUTPUT_JSONL_FILE, complete=self.listing_complete)
+
+        for url, error in self.queue.failures():
+            logger.warning(f"Не удалось обработать {url}: {error}")
+
+
+class Worker:
+    def __init__(
+        self,
+        queue=WORK_QUEUE,
+        worker_id=None,
+        concurrency=WORK_CONCURRENCY,
+        poll_interval=WORK_POLL_INTERVAL,
+        client=None,
+        executor=None,
+    ):
+        """
+        Воркер распределённого парсинга: берёт ссылки на товары из общей очереди в аренду, загружает
+        и разбирает страницы и сохраняет товары в очередь. Пока ссылка обрабатывается, аренда продлевается;
+        если воркер упадёт, ссылки вернутся в очередь через WORK_LEASE_TIMEOUT секунд.
+        Завершается, когда координатор поставил в очередь все ссылки и все они обработаны.
+
+        :param queue: Путь к файлу SQLite или URL Redis (см. open_work_queue).
+        :param worker_id: Идентификатор воркера (по умолчанию — имя машины и PID).
+        :param concurrency: Количество ссылок, обрабатываемых одновременно.
+        :param poll_interval: Интервал опроса пустой очереди (в секундах).
+        :param client: Открытый HTTPClient. Если не передан, run() создаёт собственный.
+        :param executor: Открытый ParseExecutor. Если не передан, run() создаёт собственный.
+        """
+        self.queue_location = queue
+        self.worker_id = worker_id or f"{socket.gethostname()}-{os.getpid()}"
+        self.concurrency = concurrency
+        self.poll_interval = poll_interval
+        self.client = client
+        self.executor = executor
+        self.active = {}
+        self.completed = 0
+        self.failed = 0
+
+    async def run(self):
+        start_time = time.time()
+        async with AsyncExitStack() as stack:
+            # Файл метрик у каждого воркера свой
+            filepath = f"{os.path.splitext(METRICS_FILE)[0]}_{self.worker_id}.prom" if METRICS_FILE else None
+            self.client, self.executor = await stack.enter_async_context(
+                crawl_session(self.client, self.executor, MetricsReporter(filepath=filepath, port=None))
+            )
+            self.queue = stack.enter_context(open_work_queue(self.queue_location))
+            # При остановке воркера его ссылки сразу возвращаются в очередь
+            stack.callback(lambda: self.queue.release(self.worker_id))
+
+            logger.info(f"Воркер {self.worker_id} подключён к очереди {self.queue_location}")
+            heartbeat = asyncio.create_task(self._extend_leases())
+            try:
+                await self._work()
+            finally:
+                heartbeat.cancel()
+                for task in self.active:
+                    task.cancel()
+                await asyncio.gather(heartbeat, *self.active, return_exceptions=True)
+
+        logger.info(
+            f"Воркер {self.worker_id} завершён: товаров {self.completed}, ошибок {self.failed}, "
+            f"время {time.time() - start_time:.2f} секунд."
+        )
+
+    async def _work(self):
+        while True:
+            free = self.concurrency - len(self.active)
+            # Запросы к очереди (блокировка SQLite ждёт до 30 секунд, Redis — сеть) не занимают цикл событий
+            urls = await asyncio.to_thread(self.queue.lease, self.worker_id, free) if free else []
+            for url in urls:
+                self.active[asyncio.create_task(self.process(url))] = url
+
+            if not self.active:
+                if await asyncio.to_thread(self.queue.finished):
+                    return
+                await asyncio.sleep(self.poll_interval)
+                continue
+
+            # Пока есть свободные места, очередь опрашивается не реже poll_interval
+            timeout = self.poll_interval if len(self.active) < self.concurrency else None
+            done, _ = await asyncio.wait(self.active, timeout=timeout, return_when=asyncio.FIRST_COMPLETED)
+            for task in done:
+                self.active.pop(task)
+
+    async def process(self, url):
+        """
+        Загружает и разбирает страницу товара и сообщает результат очереди.
+        :param url: Ссылка на товар.
+        """
+        try:
+            if self.client.stores:
+                pages = await self.client.fetch_stores(url)
+                product = await self.executor.run(extract_store_product, pages, url, self.client.stores)
+            elif STREAMING_PRODUCT_FETCH:
+                product = product_from_fields(await self.client.fetch(url, reader=product_stream_reader), url)
+            else:
+                html_content = await self.client.fetch(url, raw=True)
+                product = await self.executor.run(extract_product, html_content, url)
+        except Exception as e:
+            # Постоянная ошибка (404, 410 и другие 4xx) не исправится повтором: ссылка сразу неудачная
+            retry = not is_permanent(e)
+            logger.error(f"Ошибка обработки товара {url}: {e}" + ("" if retry else " (без повтора)"))
+            self.failed += 1
+            await asyncio.to_thread(self.queue.fail, url, self.worker_id, e, retry)
+            return
+
+        if "current_price" not in product:
+            logger.warning(f"Цены не найдены на странице {url}")
+        if not await asyncio.to_thread(self.queue.complete, url, self.worker_id, product):
+            logger.warning(f"Аренда ссылки {url} истекла или перешла к другому воркеру, товар не сохранён")
+            return
+        self.completed += 1
+        PRODUCTS.inc()
+
+    async def _extend_leases(self):
+        while True:
+            await asyncio.sleep(WORK_LEASE_TIMEOUT / 3)
+            if self.active:
+                await asyncio.to_thread(self.queue.extend, self.worker_id, list(self.active.values()))
@@ -0,0 +1,476 @@
+import hashlib
+import json
+import re
+from urllib.parse import urljoin, urlsplit, urlunsplit, parse_qsl, urlencode
+
+from metro_parser.backends import run_plan, walk_soup, sniff_encoding, StreamingPlanParser
+from metro_parser.plan import ExtractionPlan, PlanNode
+from metro_parser.product import kopecks_from_parts, to_kopecks, from_kopecks
+from metro_parser.utils.logger import logger
+from metro_parser.config import (
+    PARSER_BACKEND,
+    INCREMENTAL_FRAGMENT_START,
+    INCREMENTAL_FRAGMENT_END,
+    EMBEDDED_STATE_MARKERS,
+    EMBEDDED_PRODUCT_KEYS,
+    CANONICAL_QUERY_PARAMS,
+    STREAM_STOP_SELECTOR,
+    STREAM_CHUNK_SIZE,
+    STORE_IDS,
+)
+
+# Функции этого модуля не зависят от состояния парсера и принимают только HTML (bytes или str),
+# поэтому их можно выполнять в пуле потоков или процессов (см. utils/parse_executor.py).
+
+# Рубли и копейки внутри любого блока цены
+PRICE_NODES = (
+    PlanNode("rubles", ".product-price__sum-rubles", capture="text"),
+    PlanNode("pennies", ".product-price__sum-penny", capture="text"),
+)
+
+# Цены на странице товара
+PRICES_NODES = (
+    PlanNode("current_price", ".product-unit-prices__actual-wrapper", children=PRICE_NODES),
+    PlanNode("old_price", ".product-unit-prices__old-wrapper", children=PRICE_NODES),
+    PlanNode("discount", ".product-discount", capture="text"),
+    PlanNode(
+        "offline_prices",
+        ".product-page-prices-and-buttons__offline-bmpl-prices",
+        children=(
+            PlanNode(
+                "items",
+                ".product-prices-lines__item",
+                first=False,
+                children=(
+                    PlanNode("actual_price", ".product-range-prices__item-price-actual", children=PRICE_NODES),
+                    PlanNode("old_price", ".product-prices-lines__item-price-old", children=PRICE_NODES),
+                ),
+            ),
+        ),
+    ),
+)
+
+# Все поля страницы товара, компилируются один раз при импорте
+PRODUCT_PLAN = ExtractionPlan(
+    PlanNode("name", ".product-page-content__product-name", capture="text"),
+    PlanNode("id", ".product-page-content__article", capture="text"),
+    PlanNode("brand", ".product-attributes__list-item a[href*='/brand/']", capture="text"),
+    *PRICES_NODES,
+)
+
+PRICES_PLAN = ExtractionPlan(*PRICES_NODES)
+
+# Поля товара, которые зависят от магазина (результат build_prices)
+PRICE_KEYS = ("current_price", "old_price", "discount", "offline_prices")
+
+# Страница категории: карточки товаров, пагинация и ссылка на следующую страницу
+CATEGORY_PLAN = ExtractionPlan(
+    PlanNode("links", ".catalog-2-level-product-card a.product-card-name", first=False, capture="attr:href"),
+    PlanNode("pages", "ul.catalog-paginate li a", first=False, capture="raw_text"),
+    PlanNode("next", "[rel='next']", capture="attr:href"),
+)
+
+
+def canonical_url(url, keep_params=CANONICAL_QUERY_PARAMS):
+    """
+    Приводит ссылку на товар к каноническому виду, чтобы варианты одной ссылки считались одним товаром:
+    схема и хост в нижнем регистре, без фрагмента, завершающего "/" и параметров запроса, кроме keep_params
+    (оставшиеся параметры сортируются).
+    :param url: Абсолютный URL.
+    :param keep_params: Параметры запроса, которые определяют товар.
+    :return: Канонический URL.
+    """
+    parts = urlsplit(url)
+    query = urlencode(sorted((key, value) for key, value in parse_qsl(parts.query) if key in keep_params))
+    return urlunsplit((parts.scheme.lower(), parts.netloc.lower(), parts.path.rstrip("/") or "/", query, ""))
+
+
+def extract_last_page(html_content, backend=PARSER_BACKEND):
+    """
+    Извлекает номер последней страницы из пагинации категории.
+    :param html_content: HTML содержимое страницы.
+    :param backend: Бэкенд парсинга ("bs4", "lxml" или "selectolax").
+    :return: Номер последней страницы или None, если пагинации нет.
+    """
+    result = run_plan(CATEGORY_PLAN, html_content, backend)
+    pages = [int(text) for text in result.get("pages", []) if text.isdigit()]
+    return max(pages) if pages else None
+
+
+def extract_product_links(html_content, base_url, backend=PARSER_BACKEND):
+    """
+    Извлекает ссылки на страницы товаров со страницы категории.
+    :param html_content: HTML содержимое страницы.
+    :param base_url: URL страницы категории, относительно которого разрешаются ссылки.
+    :param backend: Бэкенд парсинга ("bs4", "lxml" или "selectolax").
+    :return: Список канонических ссылок на товары (см. canonical_url).
+    """
+    result = run_plan(CATEGORY_PLAN, html_content, backend)
+    return [canonical_url(urljoin(base_url, href)) for href in result.get("links", []) if href is not None]
+
+
+def extract_listing(html_content, base_url, backend=PARSER_BACKEND):
+    """
+    Извлекает всё нужное со страницы категории за один проход по дереву.
+    :param html_content: HTML содержимое страницы.
+    :param base_url: URL страницы категории, относительно которого разрешаются ссылки.
+    :param backend: Бэкенд парсинга ("bs4", "lxml" или "selectolax").
+    :return: Кортеж (канонические ссылки на товары, номер последней страницы или None,
+             URL следующей страницы из rel="next" или None).
+    """
+    result = run_plan(CATEGORY_PLAN, html_content, backend)
+    links = [canonical_url(urljoin(base_url, href)) for href in result.get("links", []) if href is not None]
+    pages = [int(text) for text in result.get("pages", []) if text.isdigit()]
+    next_href = result.get("next")
+    return links, max(pages) if pages else None, urljoin(base_url, next_href) if next_href else None
+
+
+def extract_product(html_content, url, backend=PARSER_BACKEND):
+    """
+    Извлекает данные о товаре из HTML его страницы за один проход по дереву.
+    :param html_content: HTML содержимое страницы товара.
+    :param url: URL страницы товара.
+    :param backend: Бэкенд парсинга ("bs4", "lxml" или "selectolax").
+    :return: Словарь с данными о товаре. Если цены не найдены, ключей с ценами в нём нет.
+    """
+    return product_from_fields(run_plan(PRODUCT_PLAN, html_content, backend), url)
+
+
+def product_from_fields(fields, url):
+    """
+    Собирает товар из результата PRODUCT_PLAN.
+    :param fields: Словарь с результатом плана.
+    :param url: URL страницы товара.
+    :return: Словарь с данными о товаре. Если цены не найдены, ключей с ценами в нём нет.
+    """
+    product_id = fields.get("id")
+
+    return {
+        "id": product_id.replace("Артикул: ", "") if product_id is not None else None,
+        "name": fields.get("name"),
+        "brand": fields.get("brand"),
+        **build_prices(fields),
+        "link": url,
+    }
+
+
+def extract_store_product(pages, url, stores=STORE_IDS, backend=PARSER_BACKEND):
+    """
+    Извлекает товар из его страниц в нескольких магазинах: название, артикул и бренд от магазина
+    не зависят и разбираются один раз, с остальных страниц разбираются только цены.
+    Основные цены товара — цены первого магазина из stores. Если его страницу загрузить не удалось,
+    основные цены остаются пустыми (None): цены другого магазина за них не выдаются.
+    :param pages: Словарь магазин -> HTML страницы товара (см. HTTPClient.fetch_stores).
+    :param url: URL страницы товара.
+    :param stores: Магазины в порядке настройки (HTTPClient.stores); пусто — первый магазин из pages.
+    :param backend: Бэкенд парсинга ("bs4", "lxml" или "selectolax").
+    :return: Словарь с данными о товаре: цены первого магазина и поле "store_prices" (магазин -> цены).
+    """
+    main_store = stores[0] if stores else next(iter(pages))
+    # Общие поля разбираются по странице основного магазина, а без неё — по первой загруженной
+    fields_store = main_store if main_store in pages else next(iter(pages))
+    product = extract_product(pages[fields_store], url, backend)
+    store_prices = {}
+    for store, html_content in pages.items():
+        if store == fields_store:
+            store_prices[store] = {key: product[key] for key in PRICE_KEYS if key in product}
+        else:
+            store_prices[store] = extract_prices(html_content, backend=backend)
+    if fields_store != main_store:
+        logger.warning(f"Страница {url} в магазине {main_store} не загружена, основные цены товара не заполнены")
+        product.update(dict.fromkeys(PRICE_KEYS))
+    product["store_prices"] = store_prices
+    return product
+
+
+def extract_prices(html_content, stop_selector=STREAM_STOP_SELECTOR, chunk_size=STREAM_CHUNK_SIZE, backend="lxml"):
+    """
+    Извлекает только цены со страницы товара. С бэкендом lxml страница передаётся потоковому парсеру
+    частями, и разбор прекращается на границе stop_selector: скрипты, рекомендации и подвал не разбираются.
+    Другие бэкенды потокового разбора не умеют и разбирают страницу целиком.
+    :param html_content: HTML содержимое страницы товара.
+    :param stop_selector: Элемент, после закрытия которого цен нет, или None.
+    :param chunk_size: Размер части документа (в байтах).
+    :param backend: Бэкенд парсинга ("bs4", "lxml" или "selectolax").
+    :return: Словарь с ценами (как build_prices).
+    """
+    if backend != "lxml":
+        return build_prices(run_plan(PRICES_PLAN, html_content, backend))
+    if isinstance(html_content, str):
+        html_content = html_content.encode("utf-8")
+    parser = StreamingPlanParser(PRICES_PLAN, stop_selector)
+    for start in range(0, len(html_content), chunk_size):
+        if parser.feed(html_content[start : start + chunk_size]):
+            break
+    return build_prices(parser.close())
+
+
+def product_stream_reader(stop_selector=STREAM_STOP_SELECTOR):
+    """
+    Потоковый читатель страницы товара для HTTPClient.fetch(reader=...).
+    Результат загрузки передаётся в product_from_fields.
+    :param stop_selector: Элемент, после закрытия которого полей товара нет, или None.
+    :return: StreamingPlanParser с планом PRODUCT_PLAN.
+    """
+    return StreamingPlanParser(PRODUCT_PLAN, stop_selector)
+
+
+def find_embedded_state(html_content, markers=EMBEDDED_STATE_MARKERS):
+    """
+    Находит JSON-состояние, встроенное в страницу скриптом (например, window.__INITIAL_STATE__ = {...}).
+    :param html_content: HTML содержимое страницы.
+    :param markers: Маркеры начала состояния (bytes), проверяются по порядку.
+    :return: Разобранное состояние или None, если его нет или это не JSON.
+    """
+    if isinstance(html_content, str):
+        html_content = html_content.encode("utf-8")
+    encoding = sniff_encoding(html_content)
+    decoder = json.JSONDecoder()
+
+    for marker in markers:
+        position = html_content.find(marker)
+        if position == -1:
+            continue
+        # JSON начинается с первой скобки после маркера ("= {", '">{' и т.п.)
+        start = min(
+            (index for index in (html_content.find(b"{", position), html_content.find(b"[", position)) if index != -1),
+            default=-1,
+        )
+        if start == -1 or start - position > len(marker) + 64:
+            continue
+        end = html_content.find(b"</script>", start)
+        text = html_content[start : end if end != -1 else len(html_content)].decode(encoding, errors="replace")
+        try:
+            state, _ = decoder.raw_decode(text)
+            return state
+        except ValueError:
+            continue
+    return None
+
+
+def _resolve(record, path):
+    """
+    Достаёт значение из записи по пути через точку ("stocks.0.prices.price").
+    :return: Кортеж (найдено ли значение, значение). Значение null по пути считается найденным.
+    """
+    value = record
+    for key in path.split("."):
+        if value is None:
+            return True, None
+        if isinstance(value, list) and key.isdigit():
+            if int(key) >= len(value):
+                return False, None
+            value = value[int(key)]
+        elif isinstance(value, dict) and key in value:
+            value = value[key]
+        else:
+            return False, None
+    return True, value
+
+
+def _lookup(record, paths):
+    for path in paths:
+        found, value = _resolve(record, path)
+        if found:
+            return True, value
+    return False, None
+
+
+def _to_price(value):
+    return from_kopecks(to_kopecks(value))
+
+
+def product_from_state(record, base_url, keys=EMBEDDED_PRODUCT_KEYS):
+    """
+    Собирает товар в формате extract_product из записи встроенного состояния.
+    :param record: Словарь товара из состояния.
+    :param base_url: URL страницы, относительно которого разрешается ссылка на товар.
+    :param keys: Пути к полям (см. EMBEDDED_PRODUCT_KEYS).
+    :return: Словарь товара или None, если в записи нет какого-либо поля.
+    """
+    fields = {}
+    for name, paths in keys.items():
+        found, value = _lookup(record, paths)
+        if not found:
+            return None
+        fields[name] = value
+    if not fields["link"]:
+        return None
+
+    discount = fields["discount"]
+    if isinstance(discount, (int, float)) and not isinstance(discount, bool):
+        discount = f"-{abs(round(discount))}%" if discount else None
+
+    old_price = _to_price(fields["old_price"])
+    offline_prices = []
+    for line in fields["offline_prices"] or []:
+        actual = line.get("actual_price", line.get("price"))
+        # Как и в build_prices: старая цена товара берётся из последней строки офлайн-цен
+        old_price = _to_price(line.get("old_price"))
+        offline_prices.append({"actual_price": _to_price(actual), "old_price": old_price})
+
+    return {
+        "id": str(fields["id"]) if fields["id"] is not None else None,
+        "name": fields["name"].strip() if isinstance(fields["name"], str) else fields["name"],
+        "brand": fields["brand"] or None,
+        "current_price": _to_price(fields["current_price"]),
+        "old_price": old_price,
+        "discount": discount,
+        "offline_prices": offline_prices,
+        "link": canonical_url(urljoin(base_url, fields["link"])),
+    }
+
+
+def _iter_records(state):
+    """
+    Обходит состояние и возвращает все словари (кандидаты в записи товаров).
+    """
+    stack = [state]
+    while stack:
+        value = stack.pop()
+        if isinstance(value, dict):
+            yield value
+            stack.extend(value.values())
+        elif isinstance(value, list):
+            stack.extend(value)
+
+
+def extract_embedded_products(html_content, base_url, links):
+    """
+    Извлекает товары страницы категории из встроенного в неё состояния,
+    чтобы не загружать страницу каждого товара.
+    :param html_content: HTML содержимое страницы категории.
+    :param base_url: URL страницы категории.
+    :param links: Ссылки на товары из карточек страницы; товары из состояния, которых нет
+                  среди карточек (рекомендации и т.п.), пропускаются.
+    :return: Словарь ссылка -> товар. Товары с неполными данными в него не входят.
+    """
+    state = find_embedded_state(html_content)
+    if state is None:
+        return {}
+
+    wanted = set(links)
+    products = {}
+    for record in _iter_records(state):
+        found, link = _lookup(record, EMBEDDED_PRODUCT_KEYS["link"])
+        if not found or not isinstance(link, str) or canonical_url(urljoin(base_url, link)) not in wanted:
+            continue
+        product = product_from_state(record, base_url)
+        if product and product["link"] not in products:
+            products[product["link"]] = product
+    return products
+
+
+# Скрипты, стили и комментарии меняются от запроса к запросу и не влияют на данные товара
+_VOLATILE_RE = re.compile(rb"<script\b.*?</script>|<style\b.*?</style>|<!--.*?-->", re.IGNORECASE | re.DOTALL)
+
+
+def fragment_hash(html_content, start=INCREMENTAL_FRAGMENT_START, end=INCREMENTAL_FRAGMENT_END):
+    """
+    Считает хеш значимого фрагмента страницы товара без построения дерева.
+    Фрагмент начинается с первого вхождения start и заканчивается перед первым вхождением end
+    (или в конце документа); скрипты, стили и комментарии в хеш не входят.
+    :param html_content: HTML содержимое страницы товара.
+    :param start: Маркер начала фрагмента (bytes) или None.
+    :param end: Маркер конца фрагмента (bytes) или None.
+    :return: Хеш (str).
+    """
+    if isinstance(html_content, str):
+        html_content = html_content.encode("utf-8")
+    begin = html_content.find(start) if start else 0
+    begin = max(begin, 0)
+    finish = html_content.find(end, begin) if end else -1
+    fragment = html_content[begin:finish] if finish != -1 else html_content[begin:]
+    return hashlib.blake2b(_VOLATILE_RE.sub(b"", fragment), digest_size=16).hexdigest()
+
+
+def state_hash(product):
+    """
+    Хеш товара, взятого из встроенного состояния страницы (аналог fragment_hash для страницы товара).
+    :param product: Словарь товара.
+    :return: Хеш (str).
+    """
+    data = json.dumps(product, ensure_ascii=False, sort_keys=True).encode("utf-8")
+    return hashlib.blake2b(b"state:" + data, digest_size=16).hexdigest()
+
+
+def extract_product_incremental(html_content, url, known_hash=None, backend=PARSER_BACKEND):
+    """
+    Извлекает товар, только если значимый фрагмент страницы изменился с прошлого запуска.
+    :param html_content: HTML содержимое страницы товара.
+    :param url: URL страницы товара.
+    :param known_hash: Хеш фрагмента с прошлого запуска.
+    :param backend: Бэкенд парсинга.
+    :return: Кортеж (хеш фрагмента, товар). Товар равен None, если фрагмент не изменился.
+    """
+    content_hash = fragment_hash(html_content)
+    if content_hash == known_hash:
+        return content_hash, None
+    return content_hash, extract_product(html_content, url, backend)
+
+
+def parse_prices(soup):
+    """
+    Извлекает цены с возможной скидкой.
+    :param soup: Объект BeautifulSoup страницы товара.
+    :return: Словарь с ценами.
+    """
+    run = PRICES_PLAN.start()
+    walk_soup(soup, run)
+    return build_prices(run.result)
+
+
+def clean_price(price_text):
+    """
+    Очищает текст цены и преобразует в float (с точностью до копейки).
+    :param price_text: Строка с ценой.
+    :return: float
+    """
+    if not price_text:
+        return None
+    return from_kopecks(to_kopecks(price_text.replace("..", ".").strip()))
+
+
+def price_from_block(block):
+    """
+    Собирает цену из найденного блока цены. Рубли и копейки складываются в целых копейках,
+    поэтому ни разделители разрядов ("1 234"), ни точка перед копейками (".50") не мешают разбору.
+    :param block: Результат плана для блока ({"rubles": ..., "pennies": ...}) или None.
+    :return: float или None.
+    """
+    if block is None:
+        return None
+    kopecks = kopecks_from_parts(block.get("rubles", "0"), block.get("pennies"))
+    return from_kopecks(kopecks)
+
+
+def build_prices(fields):
+    """
+    Формирует словарь цен из результата плана извлечения.
+    :param fields: Результат PRODUCT_PLAN или PRICES_PLAN.
+    :return: Словарь с ценами.
+    """
+    try:
+        # Актуальная и старая цена
+        current_price = price_from_block(fields.get("current_price"))
+        old_price = price_from_block(fields.get("old_price"))
+
+        # Цены в торговом центре
+        offline_prices = []
+        offline_block = fields.get("offline_prices")
+        if offline_block:
+            for item in offline_block.get("items", []):
+                actual_price = price_from_block(item.get("actual_price"))
+                # Историческое поведение: старая цена товара берётся из последней строки офлайн-цен
+                old_price = price_from_block(item.get("old_price"))
+                offline_prices.append({"actual_price": actual_price, "old_price": old_price})
+
+        return {
+            "current_price": current_price,
+            "old_price": old_price,
+            "discount": fields.get("discount"),
+            "offline_prices": offline_prices,
+        }
+    except Exception as e:
+        logger.error(f"Ошибка при извлечении цен: {e}")
+        return {}
@@ -0,0 +1,327 @@
+import asyncio
+import os
+import time
+
+from contextlib import ExitStack
+from urllib.parse import urljoin, urlparse
+
+from metro_parser.extract import extract_product
+from metro_parser.parser import MetroParser, parse_store_pages
+from metro_parser.pipeline import ProductPipeline
+from metro_parser.utils.file_handler import FileHandler
+from metro_parser.utils.writers import JsonLinesWriter, export_outputs
+from metro_parser.utils.price_history import record_run
+from metro_parser.utils.logger import logger
+from metro_parser.utils.crawl_session import crawl_session, log_crawl_summary
+from metro_parser.utils.crawl_state import CrawlState, DONE, PENDING
+from metro_parser.utils.dedup_index import DedupIndex
+from metro_parser.config import (
+    BASE_URL,
+    CATEGORIES_FILE,
+    CATEGORY_OUTPUT,
+    CATEGORY_OUTPUT_DIR,
+    OUTPUT_JSONL_FILE,
+    DEDUP_WINDOW,
+    STREAMING_PRODUCT_FETCH,
+    PRICE_HISTORY_ENABLED,
+)
+
+CATEGORY_OUTPUT_MODES = ("merged", "per_category")
+
+
+def category_url(category):
+    """
+    :param category: Путь категории ("/category/...") или полный URL.
+    :return: Полный URL категории.
+    """
+    return urljoin(BASE_URL, category.strip())
+
+
+def category_slug(url):
+    """
+    :param url: URL категории.
+    :return: Имя для файлов категории, например "myasnye_myaso".
+    """
+    path = urlparse(url).path.strip("/")
+    if path.startswith("category/"):
+        path = path[len("category/"):]
+    return path.replace("/", "_") or "category"
+
+
+def read_categories(filepath=CATEGORIES_FILE):
+    """
+    Читает список категорий из файла: по одной на строку, пустые строки и строки с # пропускаются.
+    :param filepath: Путь к файлу.
+    :return: Список категорий.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+class CategoryLinks:
+    def __init__(self, pipeline, category_url, memberships):
+        """
+        Передаёт ссылки категории в общий конвейер и запоминает, в каких категориях встречен товар.
+        Используется вместо ProductPipeline в MetroParser.collect_product_links.
+
+        :param pipeline: Общий ProductPipeline.
+        :param category_url: URL категории.
+        :param memberships: Словарь ссылка -> список URL категорий.
+        """
+        self.pipeline = pipeline
+        self.category_url = category_url
+        self.memberships = memberships
+
+    def _add_membership(self, link):
+        categories = self.memberships.setdefault(link, [])
+        if self.category_url not in categories:
+            categories.append(self.category_url)
+        return categories
+
+    async def put(self, link):
+        self._add_membership(link)
+        return await self.pipeline.put(link)
+
+    async def put_product(self, product):
+        product["categories"] = list(self._add_membership(product["link"]))
+        return await self.pipeline.put_product(product)
+
+
+class CategoryOrchestrator:
+    def __init__(self, categories, output=CATEGORY_OUTPUT, client=None, executor=None):
+        """
+        Парсинг нескольких категорий одним процессом.
+
+        Страницы всех категорий загружаются одновременно через общий HTTPClient (один пул соединений
+        и общий RequestScheduler), а товары проходят через один ProductPipeline: товар из нескольких
+        категорий загружается и разбирается один раз и получает поле "categories" со списком категорий.
+
+        :param categories: Пути или URL категорий.
+        :param output: "merged" — все товары в OUTPUT_JSONL_FILE, "per_category" — дополнительно
+                       отдельный файл на каждую категорию в CATEGORY_OUTPUT_DIR.
+        :param client: Открытый HTTPClient. Если не передан, run() создаёт собственный.
+        :param executor: Открытый ParseExecutor. Если не передан, run() создаёт собственный.
+        """
+        if output not in CATEGORY_OUTPUT_MODES:
+            raise ValueError(f"Неизвестный режим вывода: {output}. Допустимые: {', '.join(CATEGORY_OUTPUT_MODES)}")
+        self.category_urls = list(dict.fromkeys(category_url(category) for category in categories))
+        self.output = output
+        self.client = client
+        self.executor = executor
+        self.memberships = {}
+        # Ссылка записанного товара -> ссылки пропущенных товаров с тем же артикулом
+        self.duplicate_links = {}
+        self.products_count = 0
+        self.listing_complete = False
+
+    async def run(self, resume=False):
+        """
+        Запускает парсинг всех категорий.
+        :param resume: Продолжить прерванный парсинг (состояние каждой категории хранится в STATE_FILE).
+        """
+        self.resume = resume
+        client, executor = self.client, self.executor
+        try:
+            async with crawl_session(client, executor) as (self.client, self.executor):
+                return await self._crawl()
+        finally:
+            # Созданные здесь клиент и пул закрыты и не должны использоваться повторно
+            self.client, self.executor = client, executor
+
+    async def parse_product(self, html_content, url):
+        """
+        Парсит данные о товаре и добавляет список его категорий.
+        :param html_content: HTML содержимое страницы товара.
+        :param url: URL страницы товара.
+        :return: Словарь с данными о товаре.
+        """
+        try:
+            product = await self.executor.run(extract_product, html_content, url)
+        except Exception as e:
+            logger.error(f"Ошибка парсинга товара на странице {url}: {e}")
+            return None
+        return self.check_product(product, url)
+
+    async def parse_store_product(self, pages, url):
+        """
+        Парсит товар по его страницам в нескольких магазинах и добавляет список его категорий.
+        :param pages: Словарь магазин -> HTML страницы товара.
+        :param url: URL страницы товара.
+        :return: Словарь с данными о товаре и ценами по магазинам.
+        """
+        product = await parse_store_pages(self.executor, pages, url, self.client.stores)
+        return None if product is None else self.check_product(product, url)
+
+    def check_product(self, product, url):
+        """
+        Проверяет извлечённый товар и добавляет список его категорий
+        (стадия парсинга конвейера при потоковой загрузке).
+        :param product: Словарь с данными о товаре.
+        :param url: URL страницы товара.
+        :return: Тот же товар.
+        """
+        MetroParser.check_product(product, url)
+        product["categories"] = list(self.memberships.get(url, ()))
+        return product
+
+    def product_done(self, product):
+        """
+        Отмечает товар разобранным во всех категориях, где он встречен.
+        :param product: Записанный товар.
+        """
+        for url in self.memberships.get(product["link"], ()):
+            self.states[url].product_done(product["link"])
+
+    def merge_duplicate(self, product, link):
+        """
+        Запоминает ссылку товара, пропущенного как дубликат по артикулу: его категории
+        добавляются к категориям записанного товара.
+        :param product: Пропущенный товар.
+        :param link: Ссылка записанного товара с тем же артикулом.
+        """
+        self.duplicate_links.setdefault(link, []).append(product["link"])
+
+    def product_categories(self, link, default=()):
+        """
+        :param link: Ссылка записанного товара.
+        :param default: Категории, если ссылка не встречалась в этом запуске.
+        :return: Список URL категорий товара, включая категории его дубликатов по артикулу.
+        """
+        categories = list(self.memberships.get(link, default))
+        for duplicate in self.duplicate_links.get(link, ()):
+            for url in self.memberships.get(duplicate, ()):
+                if url not in categories:
+                    categories.append(url)
+        return categories
+
+    async def _crawl(self):
+        logger.info(f"Начинаем парсинг категорий: {len(self.category_urls)}")
+        start_time = time.time()
+        total_requests = 0
+        self.products_count = 0
+        self.memberships = {}
+        self.duplicate_links = {}
+        parsers = [MetroParser(url, self.client, self.executor) for url in self.category_urls]
+        pipeline = None
+
+        try:
+            with ExitStack() as files:
+                state = files.enter_context(CrawlState(self.category_urls[0]))
+                self.states = {url: state.for_category(url) for url in self.category_urls}
+                sink = files.enter_context(JsonLinesWriter(OUTPUT_JSONL_FILE, append=self.resume, lazy=True))
+                dedup = files.enter_context(DedupIndex()) if DEDUP_WINDOW else None
+
+                if self.client.stores:
+                    fetch, parse = parsers[0].fetch_store_pages, self.parse_store_product
+                elif STREAMING_PRODUCT_FETCH:
+                    fetch, parse = parsers[0].fetch_product, self.check_product
+                else:
+                    fetch, parse = parsers[0].fetch_page, self.parse_product
+                async with ProductPipeline(
+                    fetch,
+                    parse,
+                    sink,
+                    on_written=self.product_done,
+                    dedup=dedup,
+                    on_duplicate=self.merge_duplicate,
+                ) as pipeline:
+                    if self.resume:
+                        await self.restore_state(pipeline)
+                    for parser in parsers:
+                        parser.resume = self.resume
+                        parser.state = self.states[parser.category_url]
+                        if not self.resume:
+                            parser.state.reset()
+
+                    results = await asyncio.gather(
+                        *(
+                            parser.collect_product_links(CategoryLinks(pipeline, parser.category_url, self.memberships))
+                            for parser in parsers
+                        ),
+                        return_exceptions=True,
+                    )
+                    for parser, result in zip(parsers, results):
+                        if isinstance(result, Exception):
+                            logger.error(f"Ошибка при парсинге категории {parser.category_url}: {result}")
+                        else:
+                            total_requests += result
+                    self.listing_complete = all(
+                        not isinstance(result, Exception) and parser.listing_complete
+                        for parser, result in zip(parsers, results)
+                    )
+
+            shared = sum(1 for categories in self.memberships.values() if len(categories) > 1)
+            logger.info(f"Товаров, найденных в нескольких категориях: {shared}")
+            if not sink.count and not (self.resume and os.path.exists(OUTPUT_JSONL_FILE)):
+                logger.warning("Товары не собраны, прежние результаты оставлены без изменений.")
+                return
+            self.write_outputs()
+
+        finally:
+            if pipeline:
+                total_requests += pipeline.fetched
+                self.products_count = pipeline.written
+            log_crawl_summary("Парсинг категорий завершён.", start_time, total_requests, self.products_count, pipeline)
+
+    async def restore_state(self, pipeline):
+        """
+        Восстанавливает прерванный парсинг всех категорий.
+        :param pipeline: ProductPipeline.
+        """
+        for product in FileHandler.read_jsonl(OUTPUT_JSONL_FILE):
+            if product.get("id"):
+                pipeline.articles[product["id"]] = product["link"]
+            for url in product.get("categories", ()):
+                if url in self.states:
+                    self.states[url].product_done(product["link"])
+
+        pending_links = set()
+        for url, state in self.states.items():
+            state.checkpoint()
+            for status in (DONE, PENDING):
+                for link in state.links(status):
+                    categories = self.memberships.setdefault(link, [])
+                    if url not in categories:
+                        categories.append(url)
+            pipeline.seen.update(state.links(DONE))
+            pending_links.update(state.links(PENDING))
+
+        pending_links -= pipeline.seen
+        logger.info(f"Продолжаем парсинг: готово товаров {len(pipeline.seen)}, осталось {len(pending_links)}")
+        for link in pending_links:
+            await pipeline.put(link)
+
+    def write_outputs(self):
+        """
+        Проставляет товарам окончательные списки категорий (товар мог быть найден в ещё одной
+        категории уже после записи) и собирает итоговые файлы.
+        """
+        temp_path = f"{OUTPUT_JSONL_FILE}.tmp"
+        with ExitStack() as files:
+            merged = files.enter_context(JsonLinesWriter(temp_path, archive=False))
+            per_category = {}
+            if self.output == "per_category":
+                os.makedirs(CATEGORY_OUTPUT_DIR, exist_ok=True)
+                per_category = {
+                    url: files.enter_context(
+                        JsonLinesWriter(os.path.join(CATEGORY_OUTPUT_DIR, f"{category_slug(url)}.jsonl"))
+                    )
+                    for url in self.category_urls
+                }
+
+            for product in FileHandler.read_jsonl(OUTPUT_JSONL_FILE):
+                product["categories"] = self.product_categories(product["link"], product.get("categories", []))
+                merged.write(product)
+                for url in product["categories"]:
+                    if url in per_category:
+                        per_category[url].write(product)
+        os.replace(temp_path, OUTPUT_JSONL_FILE)
+
+        export_outputs(OUTPUT_JSONL_FILE)
+        for writer in per_category.values():
+            export_outputs(writer.filepath)
+        if PRICE_HISTORY_ENABLED:
+            record_run(OUTPUT_JSONL_FILE, complete=self.listing_complete)
+
+        for url, writer in per_category.items():
+            logger.info(f"Категория {url}: товаров {writer.count}")
@@ -1,49 +1,138 @@
 import asyncio
+import os
 import time
 
-from bs4 import BeautifulSoup
-from metro_parser.utils.http_client import HTTPClient
+from contextlib import ExitStack
+
+from metro_parser.extract import (
+    extract_last_page,
+    extract_listing,
+    extract_embedded_products,
+    state_hash,
+    extract_product_links,
+    extract_product,
+    extract_product_incremental,
+    extract_store_product,
+    product_stream_reader,
+    product_from_fields,
+    parse_prices,
+)
+from metro_parser.pipeline import ProductPipeline
 from metro_parser.utils.file_handler import FileHandler
+from metro_parser.utils.writers import JsonLinesWriter, export_outputs
+from metro_parser.utils.price_history import record_run
 from metro_parser.utils.logger import logger
-from metro_parser.config import BASE_URL, MAX_PAGES
+from metro_parser.utils.crawl_session import crawl_session, log_crawl_summary
+from metro_parser.utils.crawl_state import CrawlState, DONE, PENDING
+from metro_parser.utils.dedup_index import DedupIndex
+from metro_parser.utils.retry_policy import is_not_found
+from metro_parser.utils.snapshot import ProductSnapshot, diff_products
+from metro_parser.config import (
+    BASE_URL,
+    CATEGORIES,
+    MAX_PAGES,
+    OUTPUT_JSONL_FILE,
+    DELTA_FILE,
+    DEDUP_WINDOW,
+    USE_EMBEDDED_STATE,
+    STREAMING_PRODUCT_FETCH,
+    PRICE_HISTORY_ENABLED,
+)
+
+
+async def parse_store_pages(executor, pages, url, stores):
+    """
+    Разбирает страницы товара в нескольких магазинах в ParseExecutor (одной задачей).
+    :param executor: Открытый ParseExecutor.
+    :param pages: Словарь магазин -> HTML страницы товара.
+    :param url: URL страницы товара.
+    :param stores: Магазины в порядке настройки (HTTPClient.stores), первый — основной.
+    :return: Словарь с данными о товаре и ценами по магазинам или None, если страницы не разобраны.
+    """
+    try:
+        return await executor.run(extract_store_product, pages, url, stores)
+    except Exception as e:
+        logger.error(f"Ошибка парсинга товара на странице {url}: {e}")
+        return None
 
 
 class MetroParser:
-    def __init__(self, category_url):
+    def __init__(self, category_url, client=None, executor=None):
         """
         Инициализация парсера.
         :param category_url: URL категории товаров.
+        :param client: Открытый HTTPClient. Если не передан, run() создаёт собственный
+                       клиент на всё время парсинга.
+        :param executor: Открытый ParseExecutor. Если не передан, run() создаёт собственный
+                         в режиме PARSE_EXECUTOR.
         """
         self.category_url = category_url
-        self.products = []
+        self.client = client
+        self.executor = executor
+        self.products_count = 0
+        self.last_page = None
+        self.resume = False
+        self.incremental = False
 
     async def fetch_page(self, url):
         """
         Загружает HTML страницы по указанному URL.
         :param url: URL страницы.
-        :return: HTML содержимое страницы.
+        :return: HTML содержимое страницы (исходные байты ответа).
         """
-        logger.info(f"Загружаем страницу: {url}")
-        async with HTTPClient() as client:
-            try:
-                html_content = await client.fetch(url)
-                return html_content
-            except Exception as e:
-                logger.error(f"Ошибка загрузки страницы {url}: {e}")
-                return None
+        logger.debug("Загружаем страницу: %s", url)
+        try:
+            html_content = await self.client.fetch(url, raw=True)
+            return html_content
+        except Exception as e:
+            logger.error(f"Ошибка загрузки страницы {url}: {e}")
+            return None
+
+    async def fetch_product(self, url):
+        """
+        Потоковая загрузка страницы товара: страница разбирается по мере загрузки,
+        и загрузка прекращается, как только найдены все поля (STREAMING_PRODUCT_FETCH).
+        :param url: URL страницы товара.
+        :return: Словарь с данными о товаре или None.
+        """
+        logger.debug("Загружаем страницу: %s", url)
+        try:
+            fields = await self.client.fetch(url, reader=product_stream_reader)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки страницы {url}: {e}")
+            return None
+        return product_from_fields(fields, url)
+
+    async def fetch_store_pages(self, url):
+        """
+        Загружает страницу товара одновременно во всех магазинах (STORE_IDS).
+        :param url: URL страницы товара.
+        :return: Словарь магазин -> исходные байты ответа или None.
+        """
+        logger.debug("Загружаем страницу в магазинах: %s", url)
+        try:
+            return await self.client.fetch_stores(url)
+        except Exception as e:
+            logger.error(f"Ошибка загрузки страницы {url}: {e}")
+            return None
 
     def parse_last_page(self, html_content):
         """
         Извлекает номер последней страницы.
         :param html_content: HTML содержимое страницы.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
-        pagination = soup.select("ul.catalog-paginate li a")  # Селектор для пагинации
-        if pagination:
-            self.last_page = max(int(link.text) for link in pagination if link.text.isdigit())
+        self.set_last_page(extract_last_page(html_content))
+
+    def set_last_page(self, last_page):
+        """
+        Запоминает номер последней страницы с учётом ограничения MAX_PAGES.
+        :param last_page: Номер последней страницы из пагинации или None.
+        """
+        if last_page:
+            self.last_page = last_page
             logger.info(f"Найдено страниц: {self.last_page}")
 
-        if MAX_PAGES and self.last_page > MAX_PAGES:
+        if MAX_PAGES and self.last_page and self.last_page > MAX_PAGES:
             self.last_page = MAX_PAGES
             logger.info(f"Ограничиваем количество страниц до: {self.last_page}")
 
@@ -53,15 +142,13 @@ class MetroParser:
         :param html_content: HTML содержимое страницы.
         :return: Список ссылок на товары.
         """
-        soup = BeautifulSoup(html_content, "html.parser")
-        product_cards = soup.select(".catalog-2-level-product-card a.product-card-name")
-        links = [BASE_URL + card["href"] for card in product_cards if "href" in card.attrs]
-        logger.info(f"Найдено товаров: {len(links)}")
+        links = extract_product_links(html_content, self.category_url)
+        logger.debug("Найдено товаров: %d", len(links))
         return links
 
     async def parse_product_page(self, url):
         """
-        Парсит данные о товаре с его страницы.
+        Загружает страницу товара и парсит данные о нём.
         :param url: URL страницы товара.
         :return: Словарь с данными о товаре.
         """
@@ -70,189 +157,395 @@ class MetroParser:
             logger.warning(f"Не удалось загрузить страницу товара: {url}")
             return None
 
-        try:
-            soup = BeautifulSoup(html_content, "html.parser")
-
-            # Название товара
-            name_block = soup.select_one(".product-page-content__product-name")
-            name = name_block.get_text(strip=True) if name_block else None
-
-            # Артикул
-            product_id_block = soup.select_one(".product-page-content__article")
-            product_id = product_id_block.get_text(strip=True).replace("Артикул: ", "") if product_id_block else None
-
-            # Бренд
-            brand_block = soup.select_one(".product-attributes__list-item a[href*='/brand/']")
-            brand = brand_block.get_text(strip=True) if brand_block else None
+        return await self.parse_product(html_content, url)
 
-            # Цены
-            prices = self.parse_prices(soup)
-
-            if not prices:
-                logger.warning(f"Цены не найдены на странице {url}")
+    async def parse_product(self, html_content, url):
+        """
+        Парсит данные о товаре из HTML его страницы в ParseExecutor.
+        :param html_content: HTML содержимое страницы товара.
+        :param url: URL страницы товара.
+        :return: Словарь с данными о товаре.
+        """
+        if self.incremental:
+            return await self.parse_product_incremental(html_content, url)
 
-            return {
-                "id": product_id,
-                "name": name,
-                "brand": brand,
-                **prices,
-                "link": url,
-            }
+        try:
+            product = await self.executor.run(extract_product, html_content, url)
         except Exception as e:
             logger.error(f"Ошибка парсинга товара на странице {url}: {e}")
             return None
+        return self.check_product(product, url)
+
+    async def parse_store_product(self, pages, url):
+        """
+        Парсит товар по его страницам в нескольких магазинах в ParseExecutor (одной задачей).
+        :param pages: Словарь магазин -> HTML страницы товара.
+        :param url: URL страницы товара.
+        :return: Словарь с данными о товаре и ценами по магазинам.
+        """
+        product = await parse_store_pages(self.executor, pages, url, self.client.stores)
+        return None if product is None else self.check_product(product, url)
 
     @staticmethod
-    def parse_prices(soup):
-        """
-        Извлекает цены с возможной скидкой.
-        :param soup: Объект BeautifulSoup страницы товара.
-        :return: Словарь с ценами.
-        """
-
-        def clean_price(price_text):
-            """
-            Очищает текст цены и преобразует в float.
-            :param price_text: Строка с ценой.
-            :return: float
-            """
-            if not price_text:
-                return None
-            price_text = price_text.replace("..", ".").strip()
-            try:
-                return float(price_text)
-            except ValueError:
-                return None
+    def check_product(product, url):
+        """
+        Проверяет извлечённый товар (стадия парсинга конвейера при потоковой загрузке).
+        :param product: Словарь с данными о товаре.
+        :param url: URL страницы товара.
+        :return: Тот же товар.
+        """
+        if "current_price" not in product:
+            logger.warning(f"Цены не найдены на странице {url}")
+        return product
 
+    async def parse_product_incremental(self, html_content, url):
+        """
+        Инкрементальный парсинг: если значимый фрагмент страницы не изменился с прошлого
+        запуска, товар берётся из снимка без парсинга. Изменения пишутся в DELTA_FILE.
+        :param html_content: HTML содержимое страницы товара.
+        :param url: URL страницы товара.
+        :return: Словарь с данными о товаре.
+        """
+        known_hash, known_product = self.snapshot.get(url) or (None, None)
         try:
-            # Актуальную цена
-            current_price_block = soup.select_one(".product-unit-prices__actual-wrapper")
-            current_price = None
-            if current_price_block:
-                rubles = current_price_block.select_one(".product-price__sum-rubles")
-                pennies = current_price_block.select_one(".product-price__sum-penny")
-                rubles = rubles.get_text(strip=True) if rubles else "0"
-                pennies = pennies.get_text(strip=True) if pennies else "00"
-                current_price = clean_price(f"{rubles}.{pennies}")
-
-            # Старую цена
-            old_price_block = soup.select_one(".product-unit-prices__old-wrapper")
-            old_price = None
-            if old_price_block:
-                rubles = old_price_block.select_one(".product-price__sum-rubles")
-                pennies = old_price_block.select_one(".product-price__sum-penny")
-                rubles = rubles.get_text(strip=True) if rubles else "0"
-                pennies = pennies.get_text(strip=True) if pennies else "00"
-                old_price = clean_price(f"{rubles}.{pennies}")
-
-            # Скидка
-            discount_block = soup.select_one(".product-discount")
-            discount = discount_block.get_text(strip=True) if discount_block else None
-
-            # Цены в торговом центре
-            offline_prices_block = soup.select_one(".product-page-prices-and-buttons__offline-bmpl-prices")
-            offline_prices = []
-            if offline_prices_block:
-                for item in offline_prices_block.select(".product-prices-lines__item"):
-                    actual_price_block = item.select_one(".product-range-prices__item-price-actual")
-                    old_price_block = item.select_one(".product-prices-lines__item-price-old")
-                    actual_price = None
-                    old_price = None
-                    if actual_price_block:
-                        rubles = actual_price_block.select_one(".product-price__sum-rubles")
-                        pennies = actual_price_block.select_one(".product-price__sum-penny")
-                        rubles = rubles.get_text(strip=True) if rubles else "0"
-                        pennies = pennies.get_text(strip=True) if pennies else "00"
-                        actual_price = clean_price(f"{rubles}.{pennies}")
-                    if old_price_block:
-                        rubles = old_price_block.select_one(".product-price__sum-rubles")
-                        pennies = old_price_block.select_one(".product-price__sum-penny")
-                        rubles = rubles.get_text(strip=True) if rubles else "0"
-                        pennies = pennies.get_text(strip=True) if pennies else "00"
-                        old_price = clean_price(f"{rubles}.{pennies}")
-                    offline_prices.append({"actual_price": actual_price, "old_price": old_price})
-
-            return {
-                "current_price": current_price,
-                "old_price": old_price,
-                "discount": discount,
-                "offline_prices": offline_prices,
-            }
+            content_hash, product = await self.executor.run(extract_product_incremental, html_content, url, known_hash)
         except Exception as e:
-            print(f"Ошибка при извлечении цен: {e}")
-            return {}
+            logger.error(f"Ошибка парсинга товара на странице {url}: {e}")
+            return None
+
+        if product is None:
+            self.unchanged_count += 1
+            return known_product
+
+        self.track_change(url, content_hash, product)
+        return product
+
+    def track_change(self, url, content_hash, product):
+        """
+        Сравнивает товар со снимком, записывает изменение в DELTA_FILE и обновляет снимок.
+        :param url: URL товара.
+        :param content_hash: Хеш исходных данных товара.
+        :param product: Словарь товара.
+        """
+        known = self.snapshot.get(url)
+        if known and known[0] == content_hash:
+            self.unchanged_count += 1
+            return
 
-    async def run(self):
+        change = diff_products(known[1] if known else None, product)
+        if change:
+            self.delta.write(change)
+        self.snapshot.put(url, content_hash, product)
+
+    def write_removed(self, seen_links):
+        """
+        Записывает в DELTA_FILE товары из снимка, которых больше нет в категории.
+        :param seen_links: Все ссылки на товары, найденные в этом запуске.
+        """
+        if not self.listing_complete:
+            logger.warning("Не все страницы категории загружены, удалённые товары не определяются.")
+            return
+
+        removed = [(link, product) for link, product in self.snapshot.items() if link not in seen_links]
+        for link, product in removed:
+            self.delta.write({"change": "removed", "id": product.get("id"), "link": link, "product": product})
+        self.snapshot.remove([link for link, _ in removed])
+        logger.info(f"Удалено из категории товаров: {len(removed)}")
+
+    # Оставлено для обратной совместимости: разбор цен теперь живёт в metro_parser.extract
+    parse_prices = staticmethod(parse_prices)
+
+    async def run(self, resume=False, incremental=False):
         """
         Запускает парсинг всех страниц категории и товаров.
+        Все запросы идут через один HTTPClient, а парсинг — через один ParseExecutor:
+        переданные в конструктор или созданные здесь на время парсинга.
+
+        :param resume: Продолжить прерванный парсинг: пропустить уже загруженные страницы
+                       категории и уже записанные товары (состояние хранится в STATE_FILE).
+        :param incremental: Разбирать только изменившиеся с прошлого запуска товары
+                            и записывать добавленные, изменённые и удалённые товары в DELTA_FILE.
+        """
+        self.resume = resume
+        self.incremental = incremental
+        client, executor = self.client, self.executor
+        try:
+            async with crawl_session(client, executor) as (self.client, self.executor):
+                return await self._crawl()
+        finally:
+            # Созданные здесь клиент и пул закрыты и не должны использоваться повторно
+            self.client, self.executor = client, executor
+
+    async def _crawl(self):
+        """
+        Парсинг страниц категории и товаров через открытый HTTPClient.
+        Ссылки на товары сразу уходят в конвейер, а готовые товары записываются
+        в OUTPUT_JSONL_FILE по мере разбора.
         """
         logger.info(f"Начинаем парсинг категории: {self.category_url}")
+        if self.client.stores:
+            logger.info(f"Цены магазинов: {', '.join(self.client.stores)}")
+            if self.incremental:
+                logger.warning("Инкрементальный режим не поддерживается для цен нескольких магазинов и не будет использован.")
+                self.incremental = False
         start_time = time.time()
         total_requests = 0
+        self.products_count = 0
+        pipeline = None
 
         try:
+            with ExitStack() as files:
+                self.state = files.enter_context(CrawlState(self.category_url))
+                # Прежние результаты архивируются только при записи первого товара: если первая страница
+                # не загрузилась, они остаются на месте
+                sink = files.enter_context(JsonLinesWriter(OUTPUT_JSONL_FILE, append=self.resume, lazy=True))
+                dedup = files.enter_context(DedupIndex()) if DEDUP_WINDOW else None
+                if self.incremental:
+                    self.snapshot = files.enter_context(ProductSnapshot(self.category_url))
+                    self.delta = files.enter_context(JsonLinesWriter(DELTA_FILE, append=self.resume))
+                    self.unchanged_count = 0
+
+                if self.client.stores:
+                    fetch, parse = self.fetch_store_pages, self.parse_store_product
+                elif STREAMING_PRODUCT_FETCH and not self.incremental:
+                    # Инкрементальному режиму нужна страница целиком (хеш фрагмента)
+                    fetch, parse = self.fetch_product, self.check_product
+                else:
+                    fetch, parse = self.fetch_page, self.parse_product
+                async with ProductPipeline(
+                    fetch,
+                    parse,
+                    sink,
+                    on_written=lambda product: self.state.product_done(product["link"]),
+                    dedup=dedup,
+                ) as pipeline:
+                    if self.resume:
+                        await self.restore_state(pipeline)
+                    else:
+                        self.state.reset()
+                    total_requests += await self.collect_product_links(pipeline)
+
+                if self.incremental:
+                    self.write_removed(pipeline.seen)
+                    logger.info(f"Товаров без изменений (без парсинга): {self.unchanged_count}")
+
+            if not sink.count and not (self.resume and os.path.exists(OUTPUT_JSONL_FILE)):
+                logger.warning("Товары не собраны, прежние результаты оставлены без изменений.")
+                return
+            # Собираем итоговые файлы (OUTPUT_FORMATS) из потокового файла
+            export_outputs(OUTPUT_JSONL_FILE)
+            if PRICE_HISTORY_ENABLED:
+                record_run(OUTPUT_JSONL_FILE, complete=self.listing_complete)
+
+        finally:
+            # Завершение процесса
+            if pipeline:
+                total_requests += pipeline.fetched
+                self.products_count = pipeline.written
+            log_crawl_summary("Парсинг завершён успешно.", start_time, total_requests, self.products_count, pipeline)
+
+    async def restore_state(self, pipeline):
+        """
+        Восстанавливает прерванный парсинг: уже записанные товары пропускаются,
+        а найденные, но не разобранные товары снова ставятся в конвейер.
+        :param pipeline: ProductPipeline.
+        """
+        # Товары, записанные после последней фиксации состояния, тоже считаются готовыми
+        for product in FileHandler.read_jsonl(OUTPUT_JSONL_FILE):
+            self.state.product_done(product["link"])
+            if product.get("id"):
+                pipeline.articles[product["id"]] = product["link"]
+        self.state.checkpoint()
+
+        done_links = self.state.links(DONE)
+        pending_links = self.state.links(PENDING)
+        pipeline.seen.update(done_links)
+        logger.info(
+            f"Продолжаем парсинг: готово товаров {len(done_links)}, осталось {len(pending_links)}, "
+            f"загружено страниц категории {len(self.state.completed_pages())}"
+        )
+        for link in pending_links:
+            await pipeline.put(link)
+
+    async def find_product_links(self, html_content):
+        """
+        Парсит ссылки на товары со страницы категории в ParseExecutor.
+        :param html_content: HTML содержимое страницы категории.
+        :return: Список ссылок на товары.
+        """
+        links = await self.executor.run(extract_product_links, html_content, self.category_url)
+        logger.debug("Найдено товаров: %d", len(links))
+        return links
+
+    async def find_listing(self, html_content, page_url):
+        """
+        Разбирает страницу категории в ParseExecutor.
+        :param html_content: HTML содержимое страницы категории.
+        :param page_url: URL страницы категории.
+        :return: Кортеж (ссылки на товары, номер последней страницы или None, URL следующей страницы или None).
+        """
+        return await self.executor.run(extract_listing, html_content, page_url)
+
+    async def process_listing_page(self, pipeline, page, page_url, html_content):
+        """
+        Сохраняет страницу категории и сразу передаёт найденные на ней товары в конвейер.
+        :param pipeline: ProductPipeline.
+        :param page: Номер страницы.
+        :param page_url: URL страницы.
+        :param html_content: HTML содержимое страницы.
+        :return: Результат find_listing.
+        """
+        await self.client.save_response(html_content, response_id=f"category_page_{page}")
+        product_links, last_page, next_url = await self.find_listing(html_content, page_url)
+        logger.info("Найдено %d товаров на странице %s.", len(product_links), page)
+        self.state.add_page(page, product_links)
+
+        embedded = {}
+        # Состояние страницы категории содержит цены только магазина сессии по умолчанию
+        if USE_EMBEDDED_STATE and not self.client.stores:
+            embedded = await self.executor.run(extract_embedded_products, html_content, page_url, product_links)
+            if embedded:
+                logger.info(f"Данные {len(embedded)} из {len(product_links)} товаров взяты со страницы {page}.")
+
+        for link in product_links:
+            product = embedded.get(link)
+            if product is None:
+                await pipeline.put(link)
+                continue
+            if self.incremental:
+                self.track_change(link, state_hash(product), product)
+            await pipeline.put_product(product)
+        return product_links, last_page, next_url
+
+    async def collect_product_links(self, pipeline):
+        """
+        Загружает страницы категории и передаёт найденные ссылки на товары в конвейер.
+        Если пагинация найдена, остальные страницы загружаются одновременно и обрабатываются
+        в порядке готовности; если нет — парсер переходит по следующим страницам, пока они есть.
+        :param pipeline: ProductPipeline.
+        :return: Количество запросов к страницам категории.
+        """
+        total_requests = 0
+        completed_pages = self.state.completed_pages() if self.resume else set()
+        self.listing_complete = False
+        self.last_page = None
+        next_url = None
+        first_links = []
+
+        # Без пагинации следующие страницы неизвестны заранее: первая страница загружается снова
+        stored_last_page = self.state.get_last_page(paginated_only=True) if 1 in completed_pages else None
+        if stored_last_page:
+            # Первая страница уже обработана в прошлый раз
+            self.set_last_page(stored_last_page)
+        else:
             # Загружаем первую страницу категории
             first_page_content = await self.fetch_page(self.category_url)
             total_requests += 1
             if not first_page_content:
                 logger.error("Не удалось загрузить первую страницу.")
-                return
-
-            # Определяем количество страниц
-            self.parse_last_page(first_page_content)
-
-            # Сохраняем товары с первой страницы
-            FileHandler.save_response(first_page_content, response_id="category_page_1")
-            all_product_links = self.parse_product_links(first_page_content)
+                return total_requests
+
+            # Сохраняем товары с первой страницы и определяем количество страниц
+            first_links, last_page, next_url = await self.process_listing_page(
+                pipeline, 1, self.category_url, first_page_content
+            )
+            self.set_last_page(last_page)
+            self.state.set_last_page(self.last_page)
+
+        if self.last_page:
+            pages = [page for page in range(2, self.last_page + 1) if page not in completed_pages]
+            requests, failed_pages = await self.collect_pages(pipeline, pages)
+        else:
+            logger.info("Пагинация не найдена, переходим по следующим страницам.")
+            requests, failed_pages = await self.follow_next_pages(pipeline, first_links, next_url)
+
+        self.listing_complete = failed_pages == 0
+        return total_requests + requests
+
+    async def collect_pages(self, pipeline, pages):
+        """
+        Загружает страницы категории одновременно и обрабатывает их в порядке готовности,
+        чтобы медленная страница не задерживала товары с остальных.
+        :param pipeline: ProductPipeline.
+        :param pages: Номера страниц.
+        :return: Кортеж (количество запросов, количество неудачных страниц).
+        """
 
-            # Создаем задачи для загрузки остальных страниц
-            tasks = {
-                page: asyncio.create_task(self.fetch_page(f"{self.category_url}?page={page}"))
-                for page in range(2, self.last_page + 1)
-            }
+        async def fetch_listing_page(page):
+            return page, await self.fetch_page(f"{self.category_url}?page={page}")
 
-            # Асинхронно обрабатываем остальные страницы
-            for page, task in tasks.items():
+        tasks = [asyncio.create_task(fetch_listing_page(page)) for page in pages]
+        total_requests = 0
+        failed_pages = 0
+        try:
+            for next_page in asyncio.as_completed(tasks):
+                page = None
                 try:
-                    page_content = await task
+                    page, page_content = await next_page
                     total_requests += 1
                     if not page_content:
                         logger.warning(f"Не удалось загрузить страницу {page}. Пропускаем.")
+                        failed_pages += 1
                         continue
 
-                    # Сохраняем ответ и парсим товары со страницы
-                    FileHandler.save_response(page_content, response_id=f"category_page_{page}")
-                    product_links = self.parse_product_links(page_content)
-                    logger.info(f"Найдено {len(product_links)} товаров на странице {page}.")
-                    all_product_links.extend(product_links)
+                    await self.process_listing_page(pipeline, page, f"{self.category_url}?page={page}", page_content)
                 except Exception as e:
                     logger.error(f"Ошибка при обработке страницы {page}: {e}")
+                    failed_pages += 1
+        finally:
+            # При прерывании парсинга не оставляем висящих загрузок
+            for task in tasks:
+                task.cancel()
 
-            # Убираем дубликаты ссылок (если это актуально)
-            all_product_links = list(set(all_product_links))
-
-            # Парсим все найденные товары
-            product_tasks = [self.parse_product_page(link) for link in all_product_links]
-            results = await asyncio.gather(*product_tasks, return_exceptions=True)
-
-            # Фильтруем успешные результаты
-            self.products = [result for result in results if isinstance(result, dict)]
-            total_requests += len(all_product_links)
+        return total_requests, failed_pages
 
-            # Сохраняем результаты
-            FileHandler.save_json(self.products)
+    async def follow_next_pages(self, pipeline, first_links, next_url):
+        """
+        Переходит по страницам категории без пагинации: по ссылке rel="next", а если её нет —
+        на страницу с номером на единицу больше, пока страницы приносят новые товары.
+        :param pipeline: ProductPipeline.
+        :param first_links: Товары с первой страницы.
+        :param next_url: URL следующей страницы из первой страницы или None.
+        :return: Кортеж (количество запросов, количество неудачных страниц).
+        """
+        known_links = set(first_links)
+        if next_url is None and first_links:
+            next_url = f"{self.category_url}?page=2"
 
-        finally:
-            # Завершение процесса
-            end_time = time.time()
-            elapsed_time = end_time - start_time
-            logger.info(f"Парсинг завершён успешно.")
-            logger.info(f"Общее количество запросов: {total_requests}")
-            logger.info(f"Общее количество товаров: {len(self.products)}")
-            logger.info(f"Общее время выполнения: {elapsed_time:.2f} секунд.")
+        total_requests = 0
+        failed_pages = 0
+        page = last_loaded = 1
+        while next_url and not (MAX_PAGES and page >= MAX_PAGES):
+            page += 1
+            page_url = next_url
+            logger.debug("Загружаем страницу: %s", page_url)
+            total_requests += 1
+            try:
+                page_content = await self.client.fetch(page_url, raw=True)
+            except Exception as e:
+                if is_not_found(e):
+                    # Страницы за последней отвечают 404
+                    logger.info(f"Страница {page} не найдена, считаем её концом категории.")
+                else:
+                    # Следующая страница неизвестна: категория загружена не полностью
+                    logger.error(f"Не удалось загрузить страницу {page}: {e}")
+                    failed_pages += 1
+                break
+
+            product_links, _, next_url = await self.process_listing_page(pipeline, page, page_url, page_content)
+            last_loaded = page
+            new_links = set(product_links) - known_links
+            known_links.update(new_links)
+            if next_url is None and new_links:
+                next_url = f"{self.category_url}?page={page + 1}"
+
+        if not failed_pages:
+            # Страница, на которой переход оборвался из-за ошибки, не считается последней
+            self.state.set_last_page(last_loaded, paginated=False)
+        return total_requests, failed_pages
 
 
 if __name__ == "__main__":
-    category_url = f"{BASE_URL}/category/bezalkogolnye-napitki/soki-morsy-nektary"
+    category_url = f"{BASE_URL}{CATEGORIES[0]}"
     parser = MetroParser(category_url)
     asyncio.run(parser.run())
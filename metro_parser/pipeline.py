@@ -0,0 +1,242 @@
+import asyncio
+
+from metro_parser.utils.logger import logger
+from metro_parser.utils.metrics import QUEUE_DEPTH, PRODUCTS
+from metro_parser.config import WORKERS, PARSE_WORKERS, QUEUE_SIZE, ASYNC_FILE_IO, FILE_WRITE_BATCH_SIZE
+
+
+class ProductPipeline:
+    def __init__(
+        self,
+        fetch,
+        parse,
+        sink,
+        fetch_workers=WORKERS,
+        parse_workers=PARSE_WORKERS,
+        queue_size=QUEUE_SIZE,
+        on_written=None,
+        async_sink=ASYNC_FILE_IO,
+        sink_batch_size=FILE_WRITE_BATCH_SIZE,
+        dedup=None,
+        on_duplicate=None,
+    ):
+        """
+        Потоковый конвейер обработки товаров:
+        ссылки -> воркеры загрузки -> воркеры парсинга -> запись результата.
+
+        Очереди между стадиями ограничены queue_size, поэтому потребление памяти
+        не зависит от размера категории, а каждый товар записывается сразу после разбора.
+
+        :param fetch: Корутина fetch(url), возвращающая HTML страницы или None.
+        :param parse: Функция или корутина parse(html, url), возвращающая словарь товара или None.
+        :param sink: Объект с методом write(product), куда записываются готовые товары.
+        :param fetch_workers: Количество воркеров загрузки.
+        :param parse_workers: Количество воркеров парсинга.
+        :param queue_size: Максимальный размер каждой очереди.
+        :param on_written: Необязательная функция on_written(product), вызываемая после записи товара,
+                           а также для товара, пропущенного как дубликат по артикулу (его ссылка тоже обработана).
+        :param async_sink: Записывать товары в отдельном потоке, не блокируя цикл событий.
+        :param sink_batch_size: Максимальное количество товаров, записываемых за один раз.
+        :param dedup: DedupIndex. Товары, загруженные в пределах его окна, берутся из индекса без загрузки,
+                      а записанные товары добавляются в индекс.
+        :param on_duplicate: Необязательная функция on_duplicate(product, link) для товара, пропущенного
+                             как дубликат по артикулу: link — ссылка записанного товара с тем же артикулом.
+        """
+        self.fetch = fetch
+        self.parse = parse
+        self.sink = sink
+        self.on_written = on_written
+        self.on_duplicate = on_duplicate
+        self.async_sink = async_sink
+        self.sink_batch_size = sink_batch_size
+        self.fetch_workers = fetch_workers
+        self.parse_workers = parse_workers
+        self.links = asyncio.Queue(queue_size)
+        self.pages = asyncio.Queue(queue_size)
+        self.products = asyncio.Queue(queue_size)
+        self.dedup = dedup
+        self.seen = set()
+        # Артикул -> ссылка записанного товара
+        self.articles = {}
+        self._reused = set()
+        self.fetched = 0
+        self.embedded = 0
+        self.reused = 0
+        self.duplicates = 0
+        self.written = 0
+        self._tasks = []
+
+    async def __aenter__(self):
+        """
+        Запускает воркеры всех стадий конвейера.
+        """
+        self._fetch_tasks = [asyncio.create_task(self._fetch_worker()) for _ in range(self.fetch_workers)]
+        self._parse_tasks = [asyncio.create_task(self._parse_worker()) for _ in range(self.parse_workers)]
+        self._sink_task = asyncio.create_task(self._sink_worker())
+        self._tasks = [*self._fetch_tasks, *self._parse_tasks, self._sink_task]
+        QUEUE_DEPTH.set_function(self.links.qsize, queue="links")
+        QUEUE_DEPTH.set_function(self.pages.qsize, queue="pages")
+        QUEUE_DEPTH.set_function(self.products.qsize, queue="products")
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        """
+        Дожидается обработки всех поставленных ссылок. При ошибке останавливает воркеры.
+        """
+        if exc_type is not None:
+            for task in self._tasks:
+                task.cancel()
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+            return
+
+        # Каждая стадия завершается, получив None, и передаёт None следующей
+        for _ in self._fetch_tasks:
+            await self.links.put(None)
+        await asyncio.gather(*self._fetch_tasks)
+        for _ in self._parse_tasks:
+            await self.pages.put(None)
+        await asyncio.gather(*self._parse_tasks)
+        await self.products.put(None)
+        await self._sink_task
+
+    async def put(self, link):
+        """
+        Ставит ссылку на товар в очередь загрузки, пропуская уже встречавшиеся.
+        Товар, загруженный в пределах окна индекса дедупликации, сразу передаётся на запись.
+        Ждёт, если очередь заполнена.
+        :param link: Каноническая ссылка на товар (см. extract.canonical_url).
+        :return: True, если ссылка новая и поставлена в очередь.
+        """
+        if link in self.seen:
+            return False
+        self.seen.add(link)
+        if self.dedup is not None:
+            product = self.dedup.recent(link)
+            if product is not None:
+                self.reused += 1
+                self._reused.add(link)
+                await self.products.put(product)
+                return True
+        await self.links.put(link)
+        return True
+
+    async def put_product(self, product):
+        """
+        Передаёт уже готовый товар (например, из состояния страницы категории) сразу на запись,
+        минуя загрузку и парсинг. Дубликаты по ссылке пропускаются.
+        :param product: Словарь товара с ключом "link".
+        :return: True, если товар новый и поставлен на запись.
+        """
+        if product["link"] in self.seen:
+            return False
+        self.seen.add(product["link"])
+        self.embedded += 1
+        await self.products.put(product)
+        return True
+
+    async def _fetch_worker(self):
+        while (link := await self.links.get()) is not None:
+            try:
+                html_content = await self.fetch(link)
+                self.fetched += 1
+                if not html_content:
+                    logger.warning(f"Не удалось загрузить страницу товара: {link}")
+                    continue
+                await self.pages.put((link, html_content))
+            except Exception as e:
+                logger.error(f"Ошибка при загрузке товара {link}: {e}")
+
+    async def _parse_worker(self):
+        while (item := await self.pages.get()) is not None:
+            link, html_content = item
+            try:
+                product = self.parse(html_content, link)
+                if asyncio.iscoroutine(product):
+                    product = await product
+                if product:
+                    await self.products.put(product)
+            except Exception as e:
+                logger.error(f"Ошибка при парсинге товара {link}: {e}")
+
+    async def _sink_worker(self):
+        # Товары записываются пачками: всё, что накопилось в очереди, за один вызов
+        stopping = False
+        while not stopping:
+            batch = [await self.products.get()]
+            while len(batch) < self.sink_batch_size and not self.products.empty():
+                batch.append(self.products.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [product for product in batch if product is not None]
+            # Артикул считается записанным только после успешной записи: если запись не удалась,
+            # следующая копия товара с тем же артикулом (в этой же пачке или позже) записывается вместо неё
+            while batch:
+                fresh, held = self._split_duplicates(batch)
+                if not fresh:
+                    break
+                if self.async_sink:
+                    written = await asyncio.to_thread(self._write_batch, fresh)
+                else:
+                    written = self._write_batch(fresh)
+
+                # on_written вызывается в цикле событий (например, SQLite-соединение состояния не потокобезопасно)
+                for product in written:
+                    self.written += 1
+                    PRODUCTS.inc()
+                    if product.get("id"):
+                        self.articles[product["id"]] = product["link"]
+                    if self.dedup is not None and product["link"] not in self._reused:
+                        self.dedup.add(product)
+                    self._notify_written(product)
+                batch = held
+
+    def _notify_written(self, product):
+        if self.on_written:
+            try:
+                self.on_written(product)
+            except Exception as e:
+                logger.error(f"Ошибка при записи товара {product.get('link')}: {e}")
+
+    def _split_duplicates(self, batch):
+        """
+        Товар с уже записанным артикулом (та же позиция под другой ссылкой) не записывается повторно:
+        его ссылка отмечается обработанной. Из нескольких товаров пачки с одним артикулом записывается первый.
+        :param batch: Пачка товаров.
+        :return: Кортеж (товары для записи, отложенные товары с тем же артикулом, что у одного из них).
+        """
+        fresh = []
+        held = []
+        batch_articles = set()
+        for product in batch:
+            article = product.get("id")
+            if article and article in self.articles:
+                self.duplicates += 1
+                logger.debug("Товар с артикулом %s уже записан, пропускаем дубликат: %s", article, product.get("link"))
+                if self.on_duplicate:
+                    try:
+                        self.on_duplicate(product, self.articles[article])
+                    except Exception as e:
+                        logger.error(f"Ошибка при обработке дубликата {product.get('link')}: {e}")
+                # Ссылка дубликата тоже обработана: иначе при продолжении парсинга она загружалась бы снова
+                self._notify_written(product)
+            elif article and article in batch_articles:
+                held.append(product)
+            else:
+                if article:
+                    batch_articles.add(article)
+                fresh.append(product)
+        return fresh, held
+
+    def _write_batch(self, batch):
+        """
+        Записывает пачку товаров в sink.
+        :return: Список успешно записанных товаров.
+        """
+        written = []
+        for product in batch:
+            try:
+                self.sink.write(product)
+                written.append(product)
+            except Exception as e:
+                logger.error(f"Ошибка при записи товара {product.get('link')}: {e}")
+        return written
@@ -0,0 +1,234 @@
+import re
+
+# Текст внутри этих тегов не входит в get_text() BeautifulSoup, поэтому не попадает и в план
+IGNORED_TEXT_TAGS = frozenset({"script", "style", "template", "rt", "rp"})
+
+_COMPOUND_RE = re.compile(
+    r"(?P<tag>[a-zA-Z][\w-]*)?"
+    r"(?P<classes>(?:\.[\w-]+)*)"
+    r"(?P<attrs>(?:\[[\w-]+(?:[*^$]?=['\"]?[^'\"\]]*['\"]?)?\])*)$"
+)
+_ATTR_RE = re.compile(r"\[(?P<name>[\w-]+)(?:(?P<op>[*^$]?=)['\"]?(?P<value>[^'\"\]]*)['\"]?)?\]")
+
+
+class Compound:
+    __slots__ = ("tag", "classes", "attrs")
+
+    def __init__(self, text):
+        """
+        Простой CSS-селектор без комбинаторов: tag.class1.class2[attr*='value'].
+        :param text: Текст селектора.
+        """
+        match = _COMPOUND_RE.match(text)
+        if not match or not text:
+            raise ValueError(f"Неподдерживаемый селектор: {text}")
+        self.tag = match.group("tag").lower() if match.group("tag") else None
+        self.classes = frozenset(filter(None, match.group("classes").split(".")))
+        self.attrs = tuple(
+            (attr.group("name"), attr.group("op"), attr.group("value")) for attr in _ATTR_RE.finditer(match.group("attrs"))
+        )
+
+    def matches(self, tag, classes, attrs):
+        if self.tag and self.tag != tag:
+            return False
+        if self.classes and not self.classes <= classes:
+            return False
+        for name, op, value in self.attrs:
+            actual = attrs.get(name)
+            if actual is None:
+                return False
+            if isinstance(actual, list):
+                actual = " ".join(actual)
+            if op == "*=" and value not in actual:
+                return False
+            if op == "^=" and not actual.startswith(value):
+                return False
+            if op == "$=" and not actual.endswith(value):
+                return False
+            if op == "=" and actual != value:
+                return False
+        return True
+
+
+def compile_selector(selector):
+    """
+    Компилирует селектор с комбинатором потомка (пробел) в цепочку Compound.
+    :param selector: CSS-селектор, например ".product-attributes__list-item a[href*='/brand/']".
+    :return: Кортеж Compound.
+    """
+    return tuple(Compound(part) for part in selector.split())
+
+
+class PlanNode:
+    def __init__(self, name, selector, first=True, capture=None, children=()):
+        """
+        Узел плана извлечения.
+
+        Узел ищет элементы по селектору среди потомков элемента, найденного родительским
+        узлом (или во всём документе для корневых узлов), как select_one (first=True)
+        или select (first=False) в BeautifulSoup.
+
+        :param name: Ключ результата.
+        :param selector: CSS-селектор (поддерживаются тег, классы, атрибуты и комбинатор потомка).
+        :param first: Брать только первый найденный элемент.
+        :param capture: Что извлечь из элемента: "text" (как get_text(strip=True)),
+                        "raw_text" (как get_text()) или "attr:<имя>".
+        :param children: Вложенные узлы, которые ищутся внутри найденного элемента.
+        """
+        self.name = name
+        self.chain = compile_selector(selector)
+        self.first = first
+        self.capture = capture
+        self.children = tuple(children)
+
+
+class ExtractionPlan:
+    def __init__(self, *nodes):
+        """
+        План извлечения: набор узлов, которые вычисляются за один проход по дереву.
+        :param nodes: Корневые узлы плана.
+        """
+        self.nodes = nodes
+
+    def start(self):
+        """
+        Создаёт состояние для обхода одного документа.
+        :return: PlanRun.
+        """
+        return PlanRun(self)
+
+
+class _Watcher:
+    __slots__ = ("node", "target", "progress")
+
+    def __init__(self, node, target):
+        self.node = node
+        self.target = target
+        # Сколько звеньев цепочки селектора уже совпало на пути к текущему элементу
+        self.progress = [0]
+
+
+class _Capture:
+    __slots__ = ("container", "key", "strip", "parts")
+
+    def __init__(self, container, key, strip):
+        self.container = container
+        self.key = key
+        self.strip = strip
+        self.parts = []
+
+
+class PlanRun:
+    def __init__(self, plan):
+        """
+        Состояние одного прохода плана по документу.
+
+        Обходчик дерева (см. backends.py) сообщает о событиях start/data/end в порядке
+        документа; результат накапливается в self.result.
+
+        :param plan: ExtractionPlan.
+        """
+        self.result = {}
+        self._watchers = [_Watcher(node, self.result) for node in plan.nodes]
+        self._captures = []
+        self._frames = []
+        self._ignored_depth = 0
+
+    @property
+    def complete(self):
+        """
+        True, если все узлы "первого совпадения" уже найдены и дальнейший обход ничего не изменит.
+        """
+        return not self._watchers and not self._captures
+
+    def start(self, tag, attrs):
+        """
+        Открытие элемента.
+        :param tag: Имя тега.
+        :param attrs: Словарь атрибутов (значение class — строка или список).
+        """
+        frame = []
+        if tag in IGNORED_TEXT_TAGS:
+            self._ignored_depth += 1
+        class_attr = attrs.get("class")
+        if class_attr:
+            classes = set(class_attr.split() if isinstance(class_attr, str) else class_attr)
+        else:
+            classes = set()
+
+        for watcher in list(self._watchers):
+            chain = watcher.node.chain
+            step = watcher.progress[-1]
+            if chain[step].matches(tag, classes, attrs):
+                if step == len(chain) - 1:
+                    self._match(watcher, attrs, frame)
+                else:
+                    step += 1
+            watcher.progress.append(step)
+        self._frames.append(frame)
+
+    def data(self, text):
+        """
+        Текстовый узел.
+        :param text: Текст.
+        """
+        if self._ignored_depth or not self._captures:
+            return
+        stripped = text.strip()
+        for capture in self._captures:
+            if not capture.strip:
+                capture.parts.append(text)
+            elif stripped:
+                capture.parts.append(stripped)
+
+    def end(self, tag):
+        """
+        Закрытие элемента.
+        :param tag: Имя тега.
+        """
+        if tag in IGNORED_TEXT_TAGS and self._ignored_depth:
+            self._ignored_depth -= 1
+        for action, item in self._frames.pop():
+            if action == "capture":
+                self._captures.remove(item)
+                item.container[item.key] = "".join(item.parts)
+            elif item in self._watchers:
+                # Узлы "первого совпадения" могли уже завершиться раньше
+                self._watchers.remove(item)
+        for watcher in self._watchers:
+            watcher.progress.pop()
+
+    def _match(self, watcher, attrs, frame):
+        node = watcher.node
+        if node.first:
+            self._watchers.remove(watcher)
+
+        if node.children:
+            instance = {}
+            self._store(watcher.target, node, instance)
+            for child in node.children:
+                child_watcher = _Watcher(child, instance)
+                self._watchers.append(child_watcher)
+                frame.append(("watcher", child_watcher))
+        elif node.capture in ("text", "raw_text"):
+            # Место под значение резервируется сразу, чтобы сохранить порядок документа
+            container, key = self._store(watcher.target, node, None)
+            capture = _Capture(container, key, node.capture == "text")
+            self._captures.append(capture)
+            frame.append(("capture", capture))
+        elif node.capture and node.capture.startswith("attr:"):
+            value = attrs.get(node.capture[5:])
+            self._store(watcher.target, node, " ".join(value) if isinstance(value, list) else value)
+
+    @staticmethod
+    def _store(target, node, value):
+        """
+        Сохраняет значение узла в результат.
+        :return: Контейнер и ключ (или индекс), по которому лежит значение.
+        """
+        if node.first:
+            target[node.name] = value
+            return target, node.name
+        values = target.setdefault(node.name, [])
+        values.append(value)
+        return values, len(values) - 1
@@ -0,0 +1,221 @@
+import re
+
+from decimal import Decimal, InvalidOperation, ROUND_HALF_UP
+
+# Скидка в формате сайта: "-15%"
+_DISCOUNT_RE = re.compile(r"^\s*[-−–]?\s*(\d+)\s*%\s*$")
+_NOT_DIGITS_RE = re.compile(r"[^0-9]")
+# Текст рублей ("1 234", в том числе с неразрывными пробелами) и копеек (".50", ",5")
+_RUBLES_RE = re.compile(r"^[\d\s]*$")
+_PENNIES_RE = re.compile(r"^\s*[.,]?\s*\d*\s*$")
+
+
+def kopecks_from_parts(rubles, pennies):
+    """
+    Собирает цену в копейках из текста рублей и копеек, как они показаны на сайте
+    ("1 234" и ".50"). Пробелы между разрядами пропускаются.
+    :param rubles: Текст рублей или None.
+    :param pennies: Текст копеек или None.
+    :return: Цена в копейках (int) или None, если цифр нет или текст не похож на цену.
+    """
+    if not _RUBLES_RE.match(rubles or "") or not _PENNIES_RE.match(pennies or ""):
+        return None
+    rubles = _NOT_DIGITS_RE.sub("", rubles or "")
+    pennies = _NOT_DIGITS_RE.sub("", pennies or "")[:2]
+    if not rubles and not pennies:
+        return None
+    # ".5" на сайте означает 50 копеек
+    return int(rubles or 0) * 100 + int(pennies.ljust(2, "0") if pennies else 0)
+
+
+def to_kopecks(value):
+    """
+    Переводит цену в рублях (число или строку "1 234,50") в копейки с округлением до копейки.
+    :param value: Цена.
+    :return: int или None, если цена не задана или не разбирается.
+    """
+    if value is None or value == "" or isinstance(value, bool):
+        return None
+    if isinstance(value, int):
+        return value * 100
+    if isinstance(value, float):
+        # Цены с сайта имеют не больше двух знаков после точки: округление убирает ошибку представления
+        return round(value * 100)
+    text = str(value).replace(" ", "").replace("\xa0", "").replace(",", ".")
+    try:
+        return int((Decimal(text) * 100).to_integral_value(ROUND_HALF_UP))
+    except InvalidOperation:
+        return None
+
+
+def from_kopecks(kopecks):
+    """
+    :param kopecks: Цена в копейках или None.
+    :return: Цена в рублях (float, как в результатах парсинга) или None.
+    """
+    return None if kopecks is None else kopecks / 100
+
+
+def parse_discount(text):
+    """
+    :param text: Скидка в формате сайта ("-15%").
+    :return: Размер скидки в процентах (int) или None.
+    """
+    if not isinstance(text, str):
+        return None
+    match = _DISCOUNT_RE.match(text)
+    return int(match.group(1)) if match else None
+
+
+def format_discount(percent):
+    """
+    :param percent: Размер скидки в процентах.
+    :return: Скидка в формате сайта ("-15%") или None.
+    """
+    return None if percent is None else f"-{percent}%"
+
+
+def prices_from_dict(item):
+    """
+    Цены из словаря товара (или из цен одного магазина в поле "store_prices").
+    :param item: Словарь с ключами current_price, old_price, discount, offline_prices.
+    :return: Кортеж (цена, старая цена, скидка в процентах, исходный текст скидки, офлайн-цены) в копейках.
+             Текст скидки — None, если она в формате "-15%"; офлайн-цены — None, если цен в словаре нет.
+    """
+    discount_text = item.get("discount")
+    discount = parse_discount(discount_text)
+    if format_discount(discount) == discount_text:
+        discount_text = None
+    offline_prices = (
+        tuple(
+            (to_kopecks(line.get("actual_price")), to_kopecks(line.get("old_price")))
+            for line in item.get("offline_prices") or ()
+        )
+        if "current_price" in item
+        else None
+    )
+    return to_kopecks(item.get("current_price")), to_kopecks(item.get("old_price")), discount, discount_text, offline_prices
+
+
+def prices_to_dict(prices):
+    """
+    :param prices: Кортеж цен (см. prices_from_dict).
+    :return: Словарь цен в формате результатов парсинга (пустой, если цены не извлечены).
+    """
+    current_price, old_price, discount, discount_text, offline_prices = prices
+    if offline_prices is None:
+        return {}
+    return {
+        "current_price": from_kopecks(current_price),
+        "old_price": from_kopecks(old_price),
+        "discount": discount_text if discount_text is not None else format_discount(discount),
+        "offline_prices": [
+            {"actual_price": from_kopecks(actual), "old_price": from_kopecks(old)} for actual, old in offline_prices
+        ],
+    }
+
+
+class Product:
+    __slots__ = (
+        "id",
+        "name",
+        "brand",
+        "current_price",
+        "old_price",
+        "discount",
+        "offline_prices",
+        "link",
+        "categories",
+        "discount_text",
+        "store_prices",
+    )
+
+    def __init__(
+        self,
+        product_id,
+        name,
+        brand,
+        link,
+        current_price=None,
+        old_price=None,
+        discount=None,
+        offline_prices=(),
+        categories=None,
+        discount_text=None,
+        store_prices=None,
+    ):
+        """
+        Компактная запись товара: без словаря атрибутов, цены — целые копейки, скидка — число.
+        Сериализуется (to_dict) ровно в словарь, который возвращает extract_product. История цен
+        переводит в неё строки результатов перед записью; парсинг, дедупликация и снимки работают
+        со словарями по одному товару и каталог целиком в памяти не держат.
+
+        :param product_id: Артикул.
+        :param name: Название.
+        :param brand: Бренд или None.
+        :param link: URL страницы товара.
+        :param current_price: Цена в копейках или None.
+        :param old_price: Старая цена в копейках или None.
+        :param discount: Скидка в процентах или None.
+        :param offline_prices: Кортеж пар (цена, старая цена) в копейках. None — цены не извлечены
+                               (в словаре товара нет ключей цен).
+        :param categories: Кортеж URL категорий (поле "categories") или None, если поля нет.
+        :param discount_text: Исходный текст скидки, если он не в формате "-15%" (иначе None).
+        :param store_prices: Кортеж пар (магазин, кортеж цен — см. prices_from_dict) или None, если поля
+                             "store_prices" нет.
+        """
+        self.id = product_id
+        self.name = name
+        self.brand = brand
+        self.link = link
+        self.current_price = current_price
+        self.old_price = old_price
+        self.discount = discount
+        self.offline_prices = offline_prices
+        self.categories = categories
+        self.discount_text = discount_text
+        self.store_prices = store_prices
+
+    @property
+    def has_prices(self):
+        return self.offline_prices is not None
+
+    @classmethod
+    def from_dict(cls, item):
+        """
+        :param item: Словарь товара (результат extract_product или строка output.jsonl).
+        :return: Product.
+        """
+        current_price, old_price, discount, discount_text, offline_prices = prices_from_dict(item)
+        categories = item.get("categories")
+        store_prices = item.get("store_prices")
+        return cls(
+            item.get("id"),
+            item.get("name"),
+            item.get("brand"),
+            item.get("link"),
+            current_price,
+            old_price,
+            discount,
+            offline_prices,
+            tuple(categories) if categories is not None else None,
+            discount_text,
+            tuple((store, prices_from_dict(prices)) for store, prices in store_prices.items())
+            if store_prices is not None
+            else None,
+        )
+
+    def to_dict(self):
+        """
+        :return: Словарь товара в формате результатов парсинга (порядок ключей как у extract_product).
+        """
+        item = {"id": self.id, "name": self.name, "brand": self.brand}
+        item.update(
+            prices_to_dict((self.current_price, self.old_price, self.discount, self.discount_text, self.offline_prices))
+        )
+        item["link"] = self.link
+        if self.store_prices is not None:
+            item["store_prices"] = {store: prices_to_dict(prices) for store, prices in self.store_prices}
+        if self.categories is not None:
+            item["categories"] = list(self.categories)
+        return item
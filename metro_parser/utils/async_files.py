@@ -0,0 +1,111 @@
+import asyncio
+
+from concurrent.futures import ThreadPoolExecutor
+
+from metro_parser.utils.logger import logger
+from metro_parser.utils.file_handler import FileHandler
+from metro_parser.config import FILE_WRITE_QUEUE_SIZE, FILE_WRITE_BATCH_SIZE, FILE_WRITE_WORKERS
+
+
+class BackgroundFileWriter:
+    def __init__(self, queue_size=FILE_WRITE_QUEUE_SIZE, batch_size=FILE_WRITE_BATCH_SIZE, workers=FILE_WRITE_WORKERS):
+        """
+        Фоновая запись файлов: корутины ставят задания в очередь, а пул потоков
+        выполняет их пачками, не блокируя цикл событий.
+
+        Очередь ограничена queue_size: если диск не успевает, submit() ждёт освобождения
+        места (обратное давление), и память не растёт.
+
+        При workers > 1 пачки выполняются параллельно, поэтому задания должны писать
+        в разные файлы (как HTML-ответы); для записи в один файл нужен workers=1.
+
+        :param queue_size: Максимальное количество заданий в очереди.
+        :param batch_size: Максимальное количество заданий, выполняемых потоком за один раз.
+        :param workers: Количество потоков записи.
+        """
+        self.queue_size = queue_size
+        self.batch_size = batch_size
+        self.workers = workers
+        self.queue = None
+        self.completed = 0
+        self.failed = 0
+        self.batches = 0
+        self._thread = None
+        self._task = None
+
+    async def start(self):
+        self.queue = asyncio.Queue(self.queue_size)
+        self._thread = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="file-writer")
+        self._task = asyncio.create_task(self._drain())
+        return self
+
+    async def close(self):
+        """
+        Дописывает все поставленные задания и останавливает поток.
+        """
+        if self._task:
+            await self.queue.put(None)
+            await self._task
+            self._thread.shutdown(wait=True)
+            self._task = None
+
+    async def __aenter__(self):
+        return await self.start()
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        await self.close()
+
+    async def submit(self, func, *args, **kwargs):
+        """
+        Ставит запись в очередь. Ждёт, если очередь заполнена.
+        :param func: Синхронная функция записи (например, FileHandler.write_response).
+        :param args: Позиционные аргументы функции.
+        :param kwargs: Именованные аргументы функции.
+        """
+        await self.queue.put((func, args, kwargs))
+
+    async def save_response(self, content, response_id=None, directory=None):
+        """
+        Асинхронный вариант FileHandler.write_response.
+        """
+        kwargs = {"directory": directory} if directory else {}
+        await self.submit(FileHandler.write_response, content, response_id, **kwargs)
+
+    async def _drain(self):
+        loop = asyncio.get_running_loop()
+        # Пачек в работе не больше, чем потоков: остальные задания ждут в ограниченной очереди
+        slots = asyncio.Semaphore(self.workers)
+        running = set()
+        stopping = False
+        while not stopping:
+            batch = [await self.queue.get()]
+            await slots.acquire()
+            # Пока ждали свободный поток, в очереди могли накопиться ещё задания
+            while len(batch) < self.batch_size and not self.queue.empty():
+                batch.append(self.queue.get_nowait())
+            if None in batch:
+                stopping = True
+                batch = [job for job in batch if job is not None]
+            if not batch:
+                slots.release()
+                continue
+
+            future = loop.run_in_executor(self._thread, self._run_batch, batch)
+            future.add_done_callback(lambda _: slots.release())
+            running.add(future)
+            future.add_done_callback(running.discard)
+        if running:
+            await asyncio.gather(*running)
+
+    def _run_batch(self, batch):
+        """
+        Выполняет пачку заданий в фоновом потоке. Ошибка одного задания не останавливает остальные.
+        """
+        self.batches += 1
+        for func, args, kwargs in batch:
+            try:
+                func(*args, **kwargs)
+                self.completed += 1
+            except Exception as e:
+                self.failed += 1
+                logger.error(f"Ошибка фоновой записи файла: {e}")
@@ -0,0 +1,80 @@
+import codecs
+
+from aiohttp.compression_utils import HAS_BROTLI
+
+try:
+    import zstandard
+except ImportError:  # zstandard — необязательная зависимость
+    zstandard = None
+
+from metro_parser.backends import sniff_encoding
+from metro_parser.config import ACCEPT_ENCODINGS
+
+# Сжатия, которые aiohttp распаковывает сам (br — только при установленном пакете Brotli)
+AIOHTTP_CODINGS = {"identity": True, "gzip": True, "deflate": True, "br": HAS_BROTLI}
+
+
+def coding_available(coding):
+    """
+    :param coding: Значение Content-Encoding ("gzip", "br", "zstd"...).
+    :return: True, если ответ с таким сжатием можно распаковать.
+    """
+    if coding == "zstd":
+        return zstandard is not None
+    return AIOHTTP_CODINGS.get(coding, False)
+
+
+def accept_encoding(codings=ACCEPT_ENCODINGS):
+    """
+    Значение заголовка Accept-Encoding: объявляются только сжатия, для которых есть декодер,
+    поэтому без Brotli или zstandard сайт отвечает в gzip, а не тем, что нельзя распаковать.
+    :param codings: Сжатия в порядке предпочтения.
+    :return: Строка заголовка, например "zstd, br, gzip, deflate".
+    """
+    return ", ".join(coding for coding in codings if coding_available(coding))
+
+
+def body_decompressor(headers):
+    """
+    Распаковщик тела для сжатия, которое aiohttp не распаковывает сам (zstd).
+    :param headers: Заголовки ответа.
+    :return: Объект с методом decompress(chunk) или None, если тело уже распаковано.
+    """
+    coding = headers.get("Content-Encoding", "").strip().lower()
+    if coding != "zstd":
+        return None
+    if zstandard is None:
+        raise RuntimeError("Ответ сжат zstd: установите пакет zstandard")
+    return zstandard.ZstdDecompressor().decompressobj()
+
+
+def decompress_body(body, headers):
+    """
+    :param body: Тело ответа, полученное от aiohttp.
+    :param headers: Заголовки ответа.
+    :return: Распакованное тело.
+    """
+    decompressor = body_decompressor(headers)
+    return decompressor.decompress(body) if decompressor else body
+
+
+def _codec_name(encoding):
+    try:
+        return codecs.lookup(encoding).name
+    except LookupError:
+        return None
+
+
+def self_describing(body, charset):
+    """
+    Бэкенды парсинга определяют кодировку по байтам документа (<meta charset>, иначе UTF-8).
+    Если кодировка известна только из заголовка и это не UTF-8, тело перекодируется в UTF-8,
+    чтобы байты можно было передать парсеру как есть. Обычные страницы не копируются.
+    :param body: Тело ответа (bytes).
+    :param charset: charset из заголовка Content-Type или None.
+    :return: Байты документа.
+    """
+    codec = _codec_name(charset) if charset else None
+    if codec is None or codec == "utf-8" or sniff_encoding(body, None) is not None:
+        return body
+    return body.decode(codec, errors="replace").encode("utf-8")
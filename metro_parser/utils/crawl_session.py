@@ -0,0 +1,61 @@
+import time
+
+from contextlib import AsyncExitStack, asynccontextmanager
+
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.logger import logger
+from metro_parser.utils.metrics import MetricsReporter
+from metro_parser.utils.parse_executor import ParseExecutor
+from metro_parser.utils.proxy_pool import ProxyPool
+from metro_parser.utils.response_cache import ResponseCache
+from metro_parser.utils.scheduler import RequestScheduler
+from metro_parser.config import METRICS_ENABLED, USE_RESPONSE_CACHE, USE_PROXY_POOL
+
+
+@asynccontextmanager
+async def crawl_session(client=None, executor=None, metrics_reporter=None):
+    """
+    Открывает на время парсинга общие ресурсы, которые не переданы явно: HTTPClient (с кешем ответов
+    и пулом прокси по config.py), ParseExecutor и MetricsReporter.
+
+    :param client: Открытый HTTPClient или None.
+    :param executor: Открытый ParseExecutor или None.
+    :param metrics_reporter: MetricsReporter, если нужен не с настройками по умолчанию. Сводка метрик
+                             пишется один раз на процесс — тем, кто открывает HTTPClient, поэтому
+                             при переданном client метрики не запускаются.
+    :return: Кортеж (client, executor).
+    """
+    async with AsyncExitStack() as stack:
+        if client is None:
+            if METRICS_ENABLED:
+                await stack.enter_async_context(metrics_reporter or MetricsReporter())
+            cache = stack.enter_context(ResponseCache()) if USE_RESPONSE_CACHE else None
+            proxy_pool = ProxyPool.from_file() if USE_PROXY_POOL else None
+            client = await stack.enter_async_context(
+                HTTPClient(scheduler=RequestScheduler(), cache=cache, proxy_pool=proxy_pool)
+            )
+        if executor is None:
+            executor = stack.enter_context(ParseExecutor())
+        yield client, executor
+
+
+def log_crawl_summary(title, start_time, total_requests, products_count, pipeline=None):
+    """
+    Пишет в лог итоги парсинга.
+    :param title: Первая строка итогов.
+    :param start_time: Время начала парсинга (time.time()).
+    :param total_requests: Количество запросов.
+    :param products_count: Количество записанных товаров.
+    :param pipeline: ProductPipeline, статистика которого добавляется к итогам, или None.
+    """
+    if pipeline:
+        if pipeline.embedded:
+            logger.info(f"Товаров без загрузки страницы товара: {pipeline.embedded}")
+        if pipeline.reused:
+            logger.info(f"Товаров из индекса дедупликации (без загрузки): {pipeline.reused}")
+        if pipeline.duplicates:
+            logger.info(f"Пропущено дубликатов по артикулу: {pipeline.duplicates}")
+    logger.info(title)
+    logger.info(f"Общее количество запросов: {total_requests}")
+    logger.info(f"Общее количество товаров: {products_count}")
+    logger.info(f"Общее время выполнения: {time.time() - start_time:.2f} секунд.")
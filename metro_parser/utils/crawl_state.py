@@ -0,0 +1,172 @@
+import os
+import sqlite3
+import time
+
+from metro_parser.config import STATE_FILE, STATE_CHECKPOINT_INTERVAL
+
+PENDING = "pending"
+DONE = "done"
+
+
+class CrawlState:
+    def __init__(self, category_url, filepath=STATE_FILE, checkpoint_interval=STATE_CHECKPOINT_INTERVAL):
+        """
+        Хранилище состояния парсинга категории в SQLite: загруженные страницы категории,
+        найденные ссылки на товары и успешно разобранные товары.
+
+        Изменения фиксируются на диске не реже, чем раз в checkpoint_interval секунд,
+        поэтому после падения процесса теряется не больше этого интервала работы.
+
+        :param category_url: URL категории (состояние хранится отдельно для каждой категории).
+        :param filepath: Путь к файлу базы данных.
+        :param checkpoint_interval: Интервал фиксации изменений (в секундах).
+        """
+        self.category_url = category_url
+        self.filepath = filepath
+        self.checkpoint_interval = checkpoint_interval
+        self.connection = None
+        self._last_checkpoint = time.monotonic()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self.connection = sqlite3.connect(self.filepath)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS categories (
+                category TEXT PRIMARY KEY,
+                last_page INTEGER,
+                paginated INTEGER NOT NULL DEFAULT 0
+            );
+            CREATE TABLE IF NOT EXISTS pages (
+                category TEXT NOT NULL,
+                page INTEGER NOT NULL,
+                fetched_at REAL NOT NULL,
+                PRIMARY KEY (category, page)
+            );
+            CREATE TABLE IF NOT EXISTS products (
+                category TEXT NOT NULL,
+                link TEXT NOT NULL,
+                status TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (category, link)
+            );
+            """
+        )
+        # В состояниях, сохранённых до перехода по следующим страницам, столбца paginated нет:
+        # их последняя страница не используется при продолжении парсинга
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(categories)")}
+        if "paginated" not in columns:
+            self.connection.execute("ALTER TABLE categories ADD COLUMN paginated INTEGER NOT NULL DEFAULT 0")
+        return self
+
+    def close(self):
+        if self.connection:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def for_category(self, category_url):
+        """
+        Состояние другой категории в той же базе. Использует общее соединение,
+        поэтому несколько категорий одного запуска не блокируют друг друга при записи.
+        Закрывается вместе с исходным состоянием.
+        :param category_url: URL категории.
+        :return: CrawlState.
+        """
+        state = CrawlState(category_url, self.filepath, self.checkpoint_interval)
+        state.connection = self.connection
+        return state
+
+    def reset(self):
+        """
+        Удаляет сохранённое состояние категории (новый парсинг с нуля).
+        """
+        for table in ("categories", "pages", "products"):
+            self.connection.execute(f"DELETE FROM {table} WHERE category = ?", (self.category_url,))
+        self.checkpoint()
+
+    def checkpoint(self):
+        """
+        Фиксирует накопленные изменения на диске.
+        """
+        self.connection.commit()
+        self._last_checkpoint = time.monotonic()
+
+    def _maybe_checkpoint(self):
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.checkpoint()
+
+    def set_last_page(self, last_page, paginated=True):
+        """
+        :param last_page: Номер последней страницы категории.
+        :param paginated: True — номер взят из пагинации, False — последняя страница, до которой дошёл
+                          переход по следующим страницам.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO categories (category, last_page, paginated) VALUES (?, ?, ?)",
+            (self.category_url, last_page, int(paginated)),
+        )
+        self._maybe_checkpoint()
+
+    def get_last_page(self, paginated_only=False):
+        """
+        :param paginated_only: Вернуть номер, только если он взят из пагинации.
+        :return: Номер последней страницы категории или None.
+        """
+        row = self.connection.execute(
+            "SELECT last_page, paginated FROM categories WHERE category = ?", (self.category_url,)
+        ).fetchone()
+        if not row or (paginated_only and not row[1]):
+            return None
+        return row[0]
+
+    def add_page(self, page, links):
+        """
+        Отмечает страницу категории как загруженную вместе с найденными на ней ссылками.
+        :param page: Номер страницы.
+        :param links: Ссылки на товары со страницы.
+        """
+        now = time.time()
+        self.connection.executemany(
+            "INSERT OR IGNORE INTO products (category, link, status, updated_at) VALUES (?, ?, ?, ?)",
+            [(self.category_url, link, PENDING, now) for link in links],
+        )
+        self.connection.execute(
+            "INSERT OR REPLACE INTO pages (category, page, fetched_at) VALUES (?, ?, ?)", (self.category_url, page, now)
+        )
+        self._maybe_checkpoint()
+
+    def completed_pages(self):
+        """
+        :return: Множество номеров уже загруженных страниц категории.
+        """
+        rows = self.connection.execute("SELECT page FROM pages WHERE category = ?", (self.category_url,))
+        return {page for (page,) in rows}
+
+    def product_done(self, link):
+        """
+        Отмечает товар как успешно разобранный и записанный.
+        :param link: URL товара.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO products (category, link, status, updated_at) VALUES (?, ?, ?, ?)",
+            (self.category_url, link, DONE, time.time()),
+        )
+        self._maybe_checkpoint()
+
+    def links(self, status):
+        """
+        :param status: PENDING или DONE.
+        :return: Список ссылок на товары категории с указанным статусом.
+        """
+        rows = self.connection.execute(
+            "SELECT link FROM products WHERE category = ? AND status = ?", (self.category_url, status)
+        )
+        return [link for (link,) in rows]
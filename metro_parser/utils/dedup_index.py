@@ -0,0 +1,136 @@
+import hashlib
+import json
+import math
+import os
+import sqlite3
+import time
+
+from metro_parser.config import (
+    DEDUP_INDEX_FILE,
+    DEDUP_WINDOW,
+    DEDUP_BLOOM_CAPACITY,
+    DEDUP_BLOOM_ERROR_RATE,
+    STATE_CHECKPOINT_INTERVAL,
+)
+
+
+class BloomFilter:
+    def __init__(self, capacity=DEDUP_BLOOM_CAPACITY, error_rate=DEDUP_BLOOM_ERROR_RATE):
+        """
+        Фильтр Блума: компактное множество строк без хранения самих строк. Проверка может ошибиться
+        только в одну сторону — сказать "есть" для отсутствующей строки (с вероятностью около error_rate,
+        пока добавлено не больше capacity строк), но никогда не скажет "нет" для добавленной.
+
+        :param capacity: Ожидаемое количество строк.
+        :param error_rate: Допустимая доля ложных срабатываний.
+        """
+        self.size = max(8, int(-capacity * math.log(error_rate) / math.log(2) ** 2))
+        self.hashes = max(1, round(self.size / capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode("utf-8"), digest_size=16).digest()
+        first = int.from_bytes(digest[:8], "little")
+        second = int.from_bytes(digest[8:], "little") | 1
+        return ((first + index * second) % self.size for index in range(self.hashes))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class DedupIndex:
+    def __init__(
+        self,
+        filepath=DEDUP_INDEX_FILE,
+        window=DEDUP_WINDOW,
+        checkpoint_interval=STATE_CHECKPOINT_INTERVAL,
+        bloom_capacity=DEDUP_BLOOM_CAPACITY,
+        bloom_error_rate=DEDUP_BLOOM_ERROR_RATE,
+    ):
+        """
+        Индекс товаров, загруженных за последние window секунд, по канонической ссылке.
+        Общий для всех категорий и запусков: товар из индекса не загружается повторно, а берётся
+        из сохранённой копии. Записи старше окна удаляются при открытии.
+
+        Ссылки индекса дублируются в фильтре Блума в памяти, поэтому проверка новой ссылки
+        (обычный случай при первом проходе каталога) не обращается к базе.
+
+        :param filepath: Путь к файлу базы данных.
+        :param window: Окно дедупликации (в секундах).
+        :param checkpoint_interval: Интервал фиксации изменений (в секундах).
+        :param bloom_capacity: Ожидаемое количество товаров в индексе.
+        :param bloom_error_rate: Доля ложных срабатываний фильтра Блума.
+        """
+        self.filepath = filepath
+        self.window = window
+        self.checkpoint_interval = checkpoint_interval
+        self.bloom = BloomFilter(bloom_capacity, bloom_error_rate)
+        self.connection = None
+        self.expired = 0
+        self._last_checkpoint = time.monotonic()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self.connection = sqlite3.connect(self.filepath)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                link TEXT PRIMARY KEY,
+                product TEXT NOT NULL,
+                fetched_at REAL NOT NULL
+            )
+            """
+        )
+        self.expired = self.connection.execute(
+            "DELETE FROM products WHERE fetched_at < ?", (time.time() - self.window,)
+        ).rowcount
+        self.connection.commit()
+        for (link,) in self.connection.execute("SELECT link FROM products"):
+            self.bloom.add(link)
+        return self
+
+    def close(self):
+        if self.connection:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def recent(self, link):
+        """
+        :param link: Каноническая ссылка на товар.
+        :return: Товар, загруженный в пределах окна, или None.
+        """
+        if link not in self.bloom:
+            return None
+        row = self.connection.execute(
+            "SELECT product FROM products WHERE link = ? AND fetched_at >= ?", (link, time.time() - self.window)
+        ).fetchone()
+        return json.loads(row[0]) if row else None
+
+    def add(self, product):
+        """
+        Запоминает загруженный товар. Список категорий не сохраняется: он зависит от запуска.
+        :param product: Словарь товара с ключом "link".
+        """
+        stored = {key: value for key, value in product.items() if key != "categories"}
+        self.connection.execute(
+            "INSERT OR REPLACE INTO products (link, product, fetched_at) VALUES (?, ?, ?)",
+            (product["link"], json.dumps(stored, ensure_ascii=False), time.time()),
+        )
+        self.bloom.add(product["link"])
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.connection.commit()
+            self._last_checkpoint = time.monotonic()
@@ -1,8 +1,28 @@
 import os
+import re
+import gzip
 import json
 from datetime import datetime
 import shutil
-from metro_parser.config import OUTPUT_FILE, RESPONSES_DIR, SAVE_HTML_RESPONSES
+
+try:
+    import zstandard
+except ImportError:  # zstandard — необязательная зависимость
+    zstandard = None
+
+from metro_parser.config import (
+    OUTPUT_FILE,
+    RESPONSES_DIR,
+    SAVE_HTML_RESPONSES,
+    ARCHIVE_COMPRESSION,
+    ARCHIVE_RETENTION,
+)
+
+# Расширения файлов для поддерживаемых видов сжатия
+COMPRESSION_SUFFIXES = {"gzip": ".gz", "zstd": ".zst"}
+
+# Метка архива, которую _archive_file добавляет к имени файла
+ARCHIVE_SUFFIX_RE = re.compile(r"\.\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2}\.bak$")
 
 
 class FileHandler:
@@ -35,22 +55,88 @@ class FileHandler:
         with open(filepath, "r", encoding="utf-8") as f:
             return json.load(f)
 
+    @staticmethod
+    def read_jsonl(filepath):
+        """
+        Построчно читает файл JSON Lines.
+
+        :param filepath: Путь к файлу.
+        :return: Генератор объектов (по одному на строку).
+        """
+        if not os.path.exists(filepath):
+            return
+
+        with FileHandler.open_file(filepath, "rt") as f:
+            for line in f:
+                if line.strip():
+                    yield json.loads(line)
+
+    @staticmethod
+    def compression_of(filepath):
+        """
+        Определяет сжатие файла по расширению.
+
+        :param filepath: Путь к файлу (в том числе архив: output.jsonl.gz.<метка>.bak).
+        :return: "gzip", "zstd" или None.
+        """
+        filepath = ARCHIVE_SUFFIX_RE.sub("", filepath)
+        for compression, suffix in COMPRESSION_SUFFIXES.items():
+            if filepath.endswith(suffix):
+                return compression
+        return None
+
+    @staticmethod
+    def open_file(filepath, mode, compression=None):
+        """
+        Открывает файл с учётом сжатия (по параметру или по расширению файла).
+
+        :param filepath: Путь к файлу.
+        :param mode: Режим открытия ("rt", "wt", "rb", "wb").
+        :param compression: "gzip", "zstd" или None (определить по расширению).
+        :return: Файловый объект.
+        """
+        compression = compression or FileHandler.compression_of(filepath)
+        encoding = "utf-8" if "t" in mode else None
+        if compression == "gzip":
+            return gzip.open(filepath, mode, encoding=encoding)
+        if compression == "zstd":
+            if zstandard is None:
+                raise RuntimeError("Для сжатия zstd установите пакет zstandard: pip install zstandard")
+            return zstandard.open(filepath, mode, encoding=encoding)
+        return open(filepath, mode, encoding=encoding)
+
     @staticmethod
     def save_response(content, response_id=None):
         """
         Сохраняет HTML-ответ в файл, если включено сохранение.
 
-        :param content: HTML-строка.
+        :param content: HTML-строка или исходные байты ответа.
         :param response_id: Идентификатор или метка для файла (например, URL или номер страницы).
         """
         if not SAVE_HTML_RESPONSES:
             return
 
+        FileHandler.write_response(content, response_id)
+
+    @staticmethod
+    def write_response(content, response_id=None, directory=RESPONSES_DIR):
+        """
+        Записывает HTML-ответ в файл (без проверки SAVE_HTML_RESPONSES).
+
+        :param content: HTML-строка или исходные байты ответа.
+        :param response_id: Идентификатор или метка для файла (например, URL или номер страницы).
+        :param directory: Папка для HTML-ответов.
+        """
         if not response_id:
             timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
             response_id = f"response_{timestamp}"
 
-        filename = os.path.join(RESPONSES_DIR, f"{response_id}.html")
+        filename = os.path.join(directory, f"{response_id}.html")
+
+        if isinstance(content, bytes):
+            with open(filename, "wb") as f:
+                f.write(content)
+            return
 
         with open(filename, "w", encoding="utf-8") as f:
             f.write(content)
@@ -72,17 +158,48 @@ class FileHandler:
                     os.remove(file_path)
 
     @staticmethod
-    def _archive_file(filepath):
+    def _archive_file(filepath, compression=ARCHIVE_COMPRESSION, retention=ARCHIVE_RETENTION):
         """
-        Перемещает файл в архив, добавляя метку времени к имени.
+        Перемещает файл в архив, добавляя метку времени к имени. Архив сжимается,
+        если файл ещё не сжат, а старые архивы сверх retention удаляются.
 
         :param filepath: Путь к файлу для архивирования.
+        :param compression: Сжатие архива: None, "gzip" или "zstd".
+        :param retention: Сколько архивов файла хранить (None — все).
         """
         archive_dir = os.path.dirname(filepath)
         filename = os.path.basename(filepath)
         timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
         archive_name = os.path.join(archive_dir, f"{filename}.{timestamp}.bak")
-        shutil.move(filepath, archive_name)
+
+        # Сжатые и колоночные файлы повторно не сжимаются
+        if compression and not FileHandler.compression_of(filename) and not filename.endswith(".parquet"):
+            archive_name += COMPRESSION_SUFFIXES[compression]
+            with open(filepath, "rb") as source, FileHandler.open_file(archive_name, "wb", compression) as target:
+                shutil.copyfileobj(source, target, 1024 * 1024)
+            os.remove(filepath)
+        else:
+            shutil.move(filepath, archive_name)
+
+        if retention is not None:
+            FileHandler._rotate_archives(archive_dir, filename, retention)
+
+    @staticmethod
+    def _rotate_archives(archive_dir, filename, retention):
+        """
+        Удаляет самые старые архивы файла, оставляя retention последних.
+
+        :param archive_dir: Папка с архивами.
+        :param filename: Имя исходного файла.
+        :param retention: Сколько архивов оставить.
+        """
+        archives = sorted(
+            name
+            for name in os.listdir(archive_dir)
+            if name.startswith(filename) and ARCHIVE_SUFFIX_RE.fullmatch(re.sub(r"\.(gz|zst)$", "", name[len(filename) :]))
+        )
+        for name in archives[: max(len(archives) - retention, 0)]:
+            os.remove(os.path.join(archive_dir, name))
 
     @staticmethod
     def file_exists(filepath):
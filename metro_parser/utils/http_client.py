@@ -1,13 +1,35 @@
 import aiohttp
 import asyncio
+import time
+from contextlib import nullcontext
+from urllib.parse import urlsplit
 from aiohttp_socks import ProxyConnector
-from metro_parser.utils.logger import logger
+from metro_parser.utils.logger import logger, FetchProgress
 from metro_parser.utils.file_handler import FileHandler
+from metro_parser.utils.scheduler import parse_retry_after
+from metro_parser.utils.async_files import BackgroundFileWriter
+from metro_parser.utils.proxy_pool import is_proxy_fault
+from metro_parser.utils.content_encoding import accept_encoding, body_decompressor, decompress_body, self_describing
+from metro_parser.backends import sniff_encoding
+from metro_parser.utils.retry_policy import RetryPolicy, CircuitBreaker, is_transient, is_permanent, CLOSED, NETWORK_ERRORS
+from metro_parser.utils.metrics import trace_config, HTTP_REQUESTS, HTTP_RETRIES, HTTP_CACHE, HTTP_PHASE, HTTP_LATENCY, HTTP_STREAM, HTTP_BYTES
 from metro_parser.config import (
     HEADERS,
+    ACCEPT_ENCODINGS,
     TIMEOUT,
-    REQUEST_DELAY,
+    RETRY_ATTEMPTS,
+    POOL_LIMIT,
+    POOL_LIMIT_PER_HOST,
+    KEEPALIVE_TIMEOUT,
+    DNS_CACHE_TTL,
     SAVE_HTML_RESPONSES,
+    RESPONSES_DIR,
+    ASYNC_FILE_IO,
+    METRICS_ENABLED,
+    STREAM_CHUNK_SIZE,
+    STREAM_DRAIN_LIMIT,
+    STORE_IDS,
+    STORE_COOKIE,
     USE_PROXY,
     PROXY_TYPE,
     PROXY_IP,
@@ -19,78 +41,442 @@ from datetime import datetime
 
 
 class HTTPClient:
-    def __init__(self):
+    def __init__(
+        self,
+        limit=POOL_LIMIT,
+        limit_per_host=POOL_LIMIT_PER_HOST,
+        keepalive_timeout=KEEPALIVE_TIMEOUT,
+        dns_cache_ttl=DNS_CACHE_TTL,
+        scheduler=None,
+        cache=None,
+        save_responses=SAVE_HTML_RESPONSES,
+        responses_dir=RESPONSES_DIR,
+        async_file_io=ASYNC_FILE_IO,
+        retry_policy=None,
+        proxy_pool=None,
+        stream_chunk_size=STREAM_CHUNK_SIZE,
+        stream_drain_limit=STREAM_DRAIN_LIMIT,
+        accept_encodings=ACCEPT_ENCODINGS,
+        stores=STORE_IDS,
+        store_cookie=STORE_COOKIE,
+    ):
         """
-        Инициализация клиента с настройкой заголовков, тайм-аутов и прокси.
+        Инициализация клиента с настройкой заголовков, тайм-аутов, пула соединений и прокси.
+
+        Клиент рассчитан на то, чтобы жить всё время парсинга: одна сессия и один пул
+        соединений переиспользуются всеми запросами, поэтому TCP/TLS-рукопожатие и
+        DNS-запрос выполняются один раз на соединение, а не на каждую страницу.
+
+        :param limit: Общее количество соединений в пуле.
+        :param limit_per_host: Количество соединений на один хост.
+        :param keepalive_timeout: Время жизни простаивающего соединения (в секундах).
+        :param dns_cache_ttl: Время кэширования DNS-ответов (в секундах).
+        :param scheduler: RequestScheduler, ограничивающий темп и параллельность запросов.
+        :param cache: Открытый ResponseCache для условных запросов (ETag/Last-Modified).
+        :param save_responses: Сохранять ли HTML-ответы в responses_dir.
+        :param responses_dir: Папка для HTML-ответов.
+        :param async_file_io: Сохранять ответы через BackgroundFileWriter, не блокируя запросы.
+        :param retry_policy: RetryPolicy (задержки и бюджет повторов). По умолчанию — своя на каждый клиент,
+                             то есть бюджет повторов действует на весь запуск.
+        :param proxy_pool: ProxyPool: запросы идут через прокси пула вместо USE_PROXY.
+        :param stream_chunk_size: Размер части тела, передаваемой потоковому читателю (в байтах).
+        :param stream_drain_limit: Недочитанный остаток потоковой загрузки до этого размера дочитывается,
+                                   чтобы соединение вернулось в пул; при большем соединение закрывается.
+        :param accept_encodings: Сжатия ответов в порядке предпочтения; объявляются только те,
+                                 для которых установлен декодер.
+        :param stores: Идентификаторы магазинов: для каждого открывается своя сессия (свои cookie)
+                       на общем пуле соединений, см. fetch(store=...) и fetch_stores.
+        :param store_cookie: Cookie, в которой сайт хранит выбранный магазин.
         """
+        if stores and proxy_pool:
+            raise ValueError("Цены нескольких магазинов не поддерживаются вместе с пулом прокси.")
+        self.scheduler = scheduler
+        self.cache = cache
+        self.save_responses = save_responses
+        self.responses_dir = responses_dir
+        self.async_file_io = async_file_io
+        self.retry_policy = retry_policy or RetryPolicy()
+        self.breakers = {}
+        self.proxy_pool = proxy_pool
+        self.stream_chunk_size = stream_chunk_size
+        self.stream_drain_limit = stream_drain_limit
+        self.accept_encoding = accept_encoding(accept_encodings)
+        self.stores = [str(store) for store in stores]
+        self.store_cookie = store_cookie
+        self.store_sessions = {}
+        # Сводка по загрузкам раз в LOG_PROGRESS_INTERVAL вместо строки лога на каждую страницу
+        self.progress = FetchProgress()
+        self.file_writer = None
         self.session = None
+        self.connector = None
         self.timeout = aiohttp.ClientTimeout(total=TIMEOUT)
-        self.connector = self._build_connector()
+        self.connector_options = {
+            "limit": limit,
+            "limit_per_host": limit_per_host,
+            "keepalive_timeout": keepalive_timeout,
+            "use_dns_cache": True,
+            "ttl_dns_cache": dns_cache_ttl,
+        }
 
     @staticmethod
-    def _build_connector():
+    def _build_connector(**options):
         """
-        Создает ProxyConnector, если в конфигурации включено использование прокси.
-        :return: ProxyConnector или None.
+        Создает коннектор с пулом соединений. Если в конфигурации включено использование
+        прокси, возвращает ProxyConnector с теми же настройками пула.
+        :param options: Параметры пула соединений (limit, limit_per_host, keepalive_timeout и т.д.).
+        :return: ProxyConnector или TCPConnector.
         """
         if USE_PROXY:
             proxy_url = f"{PROXY_TYPE}://{PROXY_IP}:{PROXY_PORT}"
             if PROXY_USER and PROXY_PASSWORD:
                 proxy_url = f"{PROXY_TYPE}://{PROXY_USER}:{PROXY_PASSWORD}@{PROXY_IP}:{PROXY_PORT}"
 
-            return ProxyConnector.from_url(proxy_url)
-        return None
+            return ProxyConnector.from_url(proxy_url, **options)
+        return aiohttp.TCPConnector(**options)
 
     async def __aenter__(self):
         """
         Контекстный менеджер для работы с клиентом.
         """
-        self.session = aiohttp.ClientSession(headers=HEADERS, timeout=self.timeout, connector=self.connector)
+        self.connector = self._build_connector(**self.connector_options)
+        self.session = self._create_session(self.connector)
+        for store in self.stores:
+            # Сессии магазинов не владеют коннектором: пул соединений закрывается вместе с основной сессией
+            self.store_sessions[store] = self._create_session(
+                self.connector, cookies={self.store_cookie: store}, connector_owner=False
+            )
+        if self.proxy_pool:
+            await self.proxy_pool.start(self._create_session, **self.connector_options)
+        if self.save_responses and self.async_file_io:
+            self.file_writer = await BackgroundFileWriter().start()
         return self
 
     async def __aexit__(self, exc_type, exc_value, traceback):
         """
-        Закрытие сессии при выходе из контекста.
+        Закрытие сессии (и пула соединений) при выходе из контекста.
         """
+        for session in self.store_sessions.values():
+            await session.close()
+        self.store_sessions = {}
         if self.session:
             await self.session.close()
+            self.session = None
+            self.connector = None
+        if self.proxy_pool:
+            await self.proxy_pool.close()
+        if self.file_writer:
+            await self.file_writer.close()
+            self.file_writer = None
+        self.progress.flush()
+
+    def _create_session(self, connector, cookies=None, connector_owner=True):
+        """
+        Создаёт сессию с общими заголовками, тайм-аутом и трассировкой для коннектора.
+        :param connector: Коннектор (пул соединений).
+        :param cookies: Начальные cookie сессии (например, выбранный магазин) или None.
+        :param connector_owner: Закрывать ли коннектор вместе с сессией.
+        :return: aiohttp.ClientSession.
+        """
+        return aiohttp.ClientSession(
+            headers={**HEADERS, "Accept-Encoding": self.accept_encoding},
+            timeout=self.timeout,
+            connector=connector,
+            connector_owner=connector_owner,
+            cookies=cookies,
+            trace_configs=[trace_config()] if METRICS_ENABLED else None,
+        )
+
+    async def save_response(self, content, response_id=None):
+        """
+        Сохраняет HTML-ответ, если включено сохранение: в фоне через BackgroundFileWriter
+        или синхронно, если фоновая запись выключена.
+        :param content: HTML-строка или исходные байты ответа.
+        :param response_id: Идентификатор или метка для файла.
+        """
+        if not self.save_responses:
+            return
+        if self.file_writer:
+            await self.file_writer.save_response(content, response_id, self.responses_dir)
+        else:
+            FileHandler.write_response(content, response_id, self.responses_dir)
+
+    def circuit_breaker(self, url):
+        """
+        Возвращает (создавая при необходимости) автоматический выключатель хоста URL.
+        :param url: URL запроса.
+        :return: CircuitBreaker.
+        """
+        host = urlsplit(url).netloc
+        breaker = self.breakers.get(host)
+        if breaker is None:
+            breaker = self.breakers[host] = CircuitBreaker(host)
+        return breaker
 
-    async def fetch(self, url, retries=10, delay=REQUEST_DELAY):
+    async def fetch(self, url, retries=RETRY_ATTEMPTS, raw=False, reader=None, store=None):
         """
         Асинхронно получает HTML-контент страницы с обработкой ошибок и повторными попытками.
 
+        Повторяются только временные ошибки (5xx, 429, тайм-ауты, разрывы соединения) — с экспоненциальной
+        задержкой и в пределах бюджета повторов; постоянные (404 и другие 4xx) завершают загрузку сразу.
+
         :param url: URL для запроса.
-        :param retries: Количество попыток в случае неудачи.
-        :param delay: Задержка между повторными попытками.
-        :return: HTML-контент страницы.
+        :param retries: Максимальное количество попыток.
+        :param raw: Вернуть исходные байты ответа без декодирования.
+        :param reader: Фабрика потокового читателя (например, StreamingPlanParser) для потоковой загрузки:
+                       тело передаётся читателю частями (reader.feed), и загрузка прекращается, как только
+                       feed вернёт True. На каждую попытку создаётся новый читатель.
+        :param store: Магазин из stores: запрос идёт через сессию магазина, а ответ кэшируется отдельно.
+        :return: HTML-контент страницы (str или bytes при raw=True) или результат reader.close().
         """
+        key = self._cache_key(url, store)
+        entry = self.cache.get(key) if self.cache else None
+        if entry and entry.fresh:
+            logger.debug("Страница взята из кэша: %s", url)
+            HTTP_CACHE.inc(result="fresh")
+            self.progress.record(cached=True)
+            if reader:
+                return self._read_cached(entry, reader)[0]
+            return entry.body if raw else entry.text()
+
+        breaker = self.circuit_breaker(url)
+        start_time = time.monotonic()
         attempt = 0
+        error = None
         while attempt < retries:
+            attempt += 1
+            probe = await breaker.wait()
+            self.retry_policy.budget.record_request()
             try:
-                async with self.session.get(url) as response:
+                content = await self._get(url, entry, raw, reader, store)
+            except NETWORK_ERRORS as e:
+                error = e
+            except BaseException:
+                breaker.record(None, probe)
+                raise
+            else:
+                breaker.record(True, probe)
+                body = content
+                if reader:
+                    # Сохраняется прочитанная часть ответа
+                    content, body = content
+                await self.save_response(body, response_id=self._get_response_id(key))
+                logger.debug("Успешно загружена страница: %s", url)
+                self.progress.record(time.monotonic() - start_time)
+                return content
+
+            # С пулом прокси ошибка соединения или блокировка IP относится к прокси: повтор уйдёт через другой
+            proxy_fault = self.proxy_pool is not None and is_proxy_fault(error)
+            transient = proxy_fault or is_transient(error)
+            # Постоянная ошибка (4xx) говорит о странице, а не о здоровье сайта
+            breaker.record(None if proxy_fault else not transient, probe)
+            message = str(error) or type(error).__name__
+            logger.error(f"Ошибка при запросе {url}: {message} (попытка {attempt}/{retries})")
+            if not transient:
+                break
+            if attempt >= retries:
+                break
+            # Пока хост на паузе, повтор ждёт выключателя и не расходует бюджет
+            if breaker.state == CLOSED and not self.retry_policy.budget.spend():
+                logger.warning(f"Бюджет повторных попыток исчерпан, страница пропущена: {url}")
+                break
+            HTTP_RETRIES.inc()
+            headers = getattr(error, "headers", None) or {}
+            retry_after = None if proxy_fault else parse_retry_after(headers.get("Retry-After"))
+            await asyncio.sleep(self.retry_policy.backoff(attempt, retry_after))
+
+        logger.critical(f"Не удалось загрузить страницу после {attempt} попыток: {url}")
+        self.progress.record(failed=True)
+        # Исходная ошибка сохраняется в __cause__: по ней вызывающий код отличает 404 (см. is_not_found)
+        raise Exception(f"Failed to fetch {url} after {attempt} attempts") from error
+
+    async def fetch_stores(self, url, retries=RETRY_ATTEMPTS):
+        """
+        Загружает страницу одновременно во всех магазинах (stores) через их сессии на общем пуле соединений.
+        :param url: URL для запроса.
+        :param retries: Максимальное количество попыток для каждого магазина.
+        :return: Словарь магазин -> исходные байты ответа (в порядке stores). Магазины, в которых
+                 страницу загрузить не удалось, пропускаются.
+        """
+        if not self.stores:
+            raise ValueError("Магазины не заданы (STORE_IDS).")
+        pages = await asyncio.gather(
+            *(self.fetch(url, retries, raw=True, store=store) for store in self.stores), return_exceptions=True
+        )
+        result = {}
+        errors = []
+        for store, page in zip(self.stores, pages):
+            if isinstance(page, Exception):
+                logger.error(f"Ошибка загрузки страницы {url} в магазине {store}: {page}")
+                errors.append(page)
+            else:
+                result[store] = page
+        if not result:
+            # Причина — временная ошибка, если она была хотя бы в одном магазине: тогда повтор имеет смысл
+            cause = next((error for error in errors if not is_permanent(error)), errors[-1])
+            raise Exception(f"Failed to fetch {url} in any store") from cause
+        return result
+
+    @staticmethod
+    def _cache_key(url, store=None):
+        """
+        :return: Ключ ответа в кэше: страница зависит от магазина сессии.
+        """
+        return url if store is None else f"{url}#store={store}"
+
+    async def _get(self, url, entry=None, raw=False, reader=None, store=None):
+        """
+        Одна попытка загрузки страницы: через прокси из пула, если он задан, и через планировщик.
+        :param url: URL для запроса.
+        :param entry: Запись кэша для условного запроса или None.
+        :param raw: Вернуть исходные байты ответа без декодирования.
+        :param reader: Фабрика потокового читателя или None.
+        :param store: Магазин (сессия магазина) или None.
+        :return: HTML-контент страницы.
+        """
+        if self.proxy_pool is None:
+            session = self.session if store is None else self.store_sessions[store]
+            return await self._request(session, url, entry, raw, reader=reader, key=self._cache_key(url, store))
+
+        async with self.proxy_pool.acquire() as proxy:
+            start_time = time.monotonic()
+            try:
+                content = await self._request(proxy.session, url, entry, raw, route=proxy.url, reader=reader)
+            except NETWORK_ERRORS as e:
+                self.proxy_pool.record(proxy, not is_proxy_fault(e))
+                raise
+            self.proxy_pool.record(proxy, True, time.monotonic() - start_time)
+            return content
+
+    async def _request(self, session, url, entry=None, raw=False, route=None, reader=None, key=None):
+        """
+        Выполняет запрос через сессию.
+        :param session: aiohttp.ClientSession (общая или сессия прокси).
+        :param url: URL для запроса.
+        :param entry: Запись кэша для условного запроса или None.
+        :param raw: Вернуть исходные байты ответа без декодирования.
+        :param route: Маршрут для планировщика (URL прокси) или None.
+        :param reader: Фабрика потокового читателя или None.
+        :param key: Ключ ответа в кэше (по умолчанию — URL).
+        :return: HTML-контент страницы, а с reader — кортеж (результат читателя, прочитанные байты).
+        """
+        key = key or url
+        headers = entry.validators() if entry else None
+        status = None
+        retry_after = None
+        start_time = time.monotonic()
+        async with self.scheduler.slot(url, route) if self.scheduler else nullcontext():
+            try:
+                async with session.get(url, headers=headers) as response:
+                    status = response.status
+                    HTTP_REQUESTS.inc(status=status)
+                    retry_after = parse_retry_after(response.headers.get("Retry-After"))
                     response.raise_for_status()
-                    content = await response.text()
+                    if status == 304 and entry:
+                        # Страница не изменилась: берём сохранённую копию
+                        await asyncio.to_thread(self.cache.refresh, key)
+                        HTTP_CACHE.inc(result="not_modified")
+                        logger.debug("Страница не изменилась, взята из кэша: %s", url)
+                        if reader:
+                            return self._read_cached(entry, reader)
+                        return entry.body if raw else entry.text()
+                    if reader:
+                        return await self._read_stream(key, response, reader())
 
-                    if SAVE_HTML_RESPONSES:
-                        FileHandler.save_response(content, response_id=self._get_response_id(url))
+                    body_start = time.monotonic()
+                    body = decompress_body(await response.read(), response.headers)
+                    HTTP_PHASE.observe(time.monotonic() - body_start, phase="body")
+                    # Дальше тело передаётся в байтах: кодировка берётся из заголовка или <meta charset>
+                    body = self_describing(body, response.charset)
+                    encoding = sniff_encoding(body)
+                    if self.cache:
+                        # Запись тела и фиксация индекса кэша — в потоке, не в цикле событий
+                        await asyncio.to_thread(
+                            self.cache.store,
+                            key,
+                            body,
+                            etag=response.headers.get("ETag"),
+                            last_modified=response.headers.get("Last-Modified"),
+                            encoding=encoding,
+                        )
+                    return body if raw else body.decode(encoding, errors="replace")
+            finally:
+                HTTP_LATENCY.observe(time.monotonic() - start_time)
+                if self.scheduler:
+                    await self.scheduler.record(url, status, time.monotonic() - start_time, retry_after, route)
 
-                    logger.info(f"Успешно загружена страница: {url}")
-                    return content
+    async def _read_stream(self, key, response, reader):
+        """
+        Передаёт тело ответа читателю по частям. Когда читателю больше ничего не нужно, небольшой остаток
+        тела (до stream_drain_limit) дочитывается, чтобы соединение вернулось в пул, а при большом
+        остатке соединение закрывается.
+        :param key: Ключ ответа в кэше (URL запроса).
+        :param response: Ответ aiohttp.
+        :param reader: Потоковый читатель (feed/close).
+        :return: Кортеж (результат reader.close(), прочитанные байты).
+        """
+        # Прочитанное тело нужно только для кэша и сохранения ответов
+        chunks = [] if self.cache or self.save_responses else None
+        decompressor = body_decompressor(response.headers)
+        body_start = time.monotonic()
+        stopped = False
+        async for chunk in response.content.iter_chunked(self.stream_chunk_size):
+            # Трассировка aiohttp учитывает только тело, прочитанное через read()
+            HTTP_BYTES.inc(len(chunk))
+            if decompressor:
+                chunk = decompressor.decompress(chunk)
+            if chunks is not None:
+                chunks.append(chunk)
+            if reader.feed(chunk):
+                stopped = True
+                break
 
-            except (aiohttp.ClientResponseError, aiohttp.ClientConnectorError) as e:
-                attempt += 1
-                logger.error(f"Ошибка при запросе {url}: {str(e)} (попытка {attempt}/{retries})")
-                if attempt < retries and delay:
-                    await asyncio.sleep(delay)
+        if not stopped or response.content.at_eof():
+            result = "eof"
+        elif self._remaining(response) <= self.stream_drain_limit:
+            rest = await response.read()
+            if decompressor:
+                rest = decompressor.decompress(rest)
+            if chunks is not None:
+                chunks.append(rest)
+            result = "drained"
+        else:
+            response.close()
+            result = "closed"
+        HTTP_STREAM.inc(result=result)
+        HTTP_PHASE.observe(time.monotonic() - body_start, phase="body")
 
-            except asyncio.TimeoutError:
-                logger.error(f"Тайм-аут запроса: {url} (попытка {attempt}/{retries})")
-                attempt += 1
-                if attempt < retries and delay:
-                    await asyncio.sleep(delay)
+        body = b"".join(chunks) if chunks is not None else b""
+        if self.cache and result != "closed":
+            body = self_describing(body, response.charset)
+            await asyncio.to_thread(
+                self.cache.store,
+                key,
+                body,
+                etag=response.headers.get("ETag"),
+                last_modified=response.headers.get("Last-Modified"),
+                encoding=sniff_encoding(body),
+            )
+        return reader.close(), body
 
-        logger.critical(f"Не удалось загрузить страницу после {retries} попыток: {url}")
-        raise Exception(f"Failed to fetch {url} after {retries} retries")
+    @staticmethod
+    def _remaining(response):
+        """
+        :return: Сколько байт тела ещё не получено, или бесконечность, если это неизвестно
+                 (нет Content-Length или тело сжато).
+        """
+        if response.content_length is None or response.headers.get("Content-Encoding"):
+            return float("inf")
+        return response.content_length - response.content.total_bytes
+
+    @staticmethod
+    def _read_cached(entry, reader):
+        """
+        Передаёт читателю тело из кэша целиком.
+        :return: Кортеж (результат reader.close(), тело).
+        """
+        reader = reader()
+        reader.feed(entry.body)
+        return reader.close(), entry.body
 
     @staticmethod
     def _get_response_id(url):
@@ -1,54 +1,157 @@
+import atexit
+import json
 import logging
 import os
-import shutil
+import queue
+import time
 from datetime import datetime
-from metro_parser.config import LOG_LEVEL, LOG_FORMAT, LOG_FILE
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from metro_parser.config import (
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_FILE,
+    LOG_ASYNC,
+    LOG_FILE_FORMAT,
+    LOG_MAX_BYTES,
+    LOG_BACKUP_COUNT,
+    LOG_PROGRESS_INTERVAL,
+)
 
+# Атрибуты, которые есть у любой записи лога: всё остальное передано через extra
+_RECORD_ATTRIBUTES = frozenset(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime"}
 
-def archive_log_file(log_file_path):
+
+class JsonFormatter(logging.Formatter):
     """
-    Архивирует существующий лог-файл, добавляя текущую дату к его имени.
+    Форматирует запись как строку JSON (JSON Lines) для систем сбора логов.
+    Поля, переданные через extra (например, logger.info(..., extra={"pages": 10})), попадают в запись.
     """
-    if os.path.exists(log_file_path):
-        # Формируем имя для архива
-        timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
-        archive_name = f"{log_file_path}.{timestamp}.bak"
 
-        # Перемещаем текущий лог в архив
-        shutil.move(log_file_path, archive_name)
+    def format(self, record):
+        entry = {
+            "time": datetime.fromtimestamp(record.created).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRIBUTES:
+                entry[key] = value
+        if record.exc_info:
+            entry["exception"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+
+class LazyQueueHandler(QueueHandler):
+    """
+    QueueHandler, который не форматирует сообщение в вызывающем потоке (стандартный prepare() делает это
+    ради передачи записи между процессами): подстановка аргументов и запись выполняются в потоке QueueListener.
+    """
+
+    def prepare(self, record):
+        return record
 
 
 def setup_logger(name="metro_parser"):
     """
     Создаёт и настраивает логгер.
+
+    При LOG_ASYNC логгер только кладёт записи в очередь, а форматирование и запись в консоль и файл
+    выполняет фоновый поток (QueueListener), поэтому вызовы логгера не блокируют цикл событий.
+    Лог-файл ротируется по размеру (LOG_MAX_BYTES, LOG_BACKUP_COUNT).
+
     :param name: Имя логгера.
     :return: Настроенный объект логгера.
     """
-    # Архивируем лог при каждом новом запуске
-    archive_log_file(LOG_FILE)
+    # Директория логов может ещё не существовать при первом импорте
+    os.makedirs(os.path.dirname(LOG_FILE), exist_ok=True)
 
     # Создаём логгер
     logger = logging.getLogger(name)
     logger.setLevel(LOG_LEVEL)
 
-    # Устанавливаем формат логов
-    formatter = logging.Formatter(LOG_FORMAT)
-
     # Консольный обработчик (для вывода в терминал)
     console_handler = logging.StreamHandler()
     console_handler.setLevel(LOG_LEVEL)
-    console_handler.setFormatter(formatter)
+    console_handler.setFormatter(logging.Formatter(LOG_FORMAT))
 
-    # Обработчик для записи логов в файл
-    file_handler = logging.FileHandler(LOG_FILE, mode="a", encoding="utf-8")
+    # Обработчик для записи логов в файл с ротацией по размеру
+    file_handler = RotatingFileHandler(LOG_FILE, maxBytes=LOG_MAX_BYTES, backupCount=LOG_BACKUP_COUNT, encoding="utf-8")
     file_handler.setLevel(LOG_LEVEL)
-    file_handler.setFormatter(formatter)
+    file_handler.setFormatter(JsonFormatter() if LOG_FILE_FORMAT == "json" else logging.Formatter(LOG_FORMAT))
 
-    # Добавляем обработчики в логгер
-    logger.addHandler(console_handler)
-    logger.addHandler(file_handler)
+    if not LOG_ASYNC:
+        logger.addHandler(console_handler)
+        logger.addHandler(file_handler)
+        return logger
 
+    records = queue.SimpleQueue()
+    listener = QueueListener(records, console_handler, file_handler, respect_handler_level=True)
+    listener.start()
+    # При завершении процесса фоновый поток дописывает оставшиеся записи
+    atexit.register(listener.stop)
+    logger.addHandler(LazyQueueHandler(records))
     return logger
 
 
 logger = setup_logger()
+
+
+class FetchProgress:
+    def __init__(self, interval=LOG_PROGRESS_INTERVAL, log=logger):
+        """
+        Сводка по загрузкам страниц вместо строки лога на каждый запрос: раз в interval секунд
+        пишется одна строка с количеством страниц и временем ответа (p50/p95).
+        Отдельные запросы логируются на уровне DEBUG.
+
+        :param interval: Интервал сводки (в секундах).
+        :param log: Логгер.
+        """
+        self.interval = interval
+        self.log = log
+        self._latencies = []
+        self._cached = 0
+        self._failed = 0
+        self._started = time.monotonic()
+
+    def record(self, latency=None, cached=False, failed=False):
+        """
+        Учитывает одну загрузку и пишет сводку, если интервал истёк.
+        :param latency: Время загрузки (в секундах), включая повторы.
+        :param cached: Страница взята из кэша.
+        :param failed: Страницу не удалось загрузить.
+        """
+        if failed:
+            self._failed += 1
+        elif cached:
+            self._cached += 1
+        else:
+            self._latencies.append(latency)
+        if time.monotonic() - self._started >= self.interval:
+            self.flush()
+
+    def flush(self):
+        """
+        Пишет сводку за прошедший интервал (если были загрузки) и начинает новый.
+        """
+        elapsed = time.monotonic() - self._started
+        latencies = sorted(self._latencies)
+        pages = len(latencies) + self._cached
+        if pages or self._failed:
+            p50 = round(1000 * latencies[len(latencies) // 2], 1) if latencies else 0
+            p95 = round(1000 * latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))], 1) if latencies else 0
+            self.log.info(
+                "Загружено страниц за %.0f с: %d (%.1f/с, из кэша %d, ошибок %d), время ответа p50/p95 %.0f/%.0f мс",
+                elapsed,
+                pages,
+                pages / elapsed if elapsed else 0,
+                self._cached,
+                self._failed,
+                p50,
+                p95,
+                extra={"pages": pages, "cached": self._cached, "failed": self._failed, "p50_ms": p50, "p95_ms": p95},
+            )
+        self._latencies = []
+        self._cached = 0
+        self._failed = 0
+        self._started = time.monotonic()
@@ -0,0 +1,328 @@
+import asyncio
+import bisect
+import os
+import time
+
+from types import SimpleNamespace
+
+import aiohttp
+from aiohttp import web
+
+from metro_parser.utils.logger import logger
+from metro_parser.config import METRICS_FILE, METRICS_PORT, METRICS_INTERVAL
+
+# Границы корзин гистограмм времени (в секундах)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+PARSE_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 1)
+
+
+def _format_labels(labelnames, labels):
+    if not labelnames:
+        return ""
+    pairs = ",".join(f'{name}="{value}"' for name, value in zip(labelnames, labels))
+    return "{" + pairs + "}"
+
+
+class Metric:
+    type = None
+
+    def __init__(self, name, documentation, labelnames=()):
+        """
+        Метрика в формате Prometheus.
+        :param name: Имя метрики.
+        :param documentation: Описание (строка HELP).
+        :param labelnames: Имена меток.
+        """
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.values = {}
+
+    def _key(self, labels):
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def samples(self):
+        """
+        :return: Список пар (имя с метками, значение).
+        """
+        return [(self.name + _format_labels(self.labelnames, key), value) for key, value in self.values.items()]
+
+    def total(self):
+        return sum(self.values.values())
+
+
+class Counter(Metric):
+    type = "counter"
+
+    def inc(self, amount=1, **labels):
+        key = self._key(labels)
+        self.values[key] = self.values.get(key, 0) + amount
+
+
+class Gauge(Metric):
+    type = "gauge"
+
+    def __init__(self, name, documentation, labelnames=()):
+        super().__init__(name, documentation, labelnames)
+        self.functions = {}
+
+    def set(self, value, **labels):
+        self.values[self._key(labels)] = value
+
+    def set_function(self, function, **labels):
+        """
+        Значение вычисляется функцией в момент чтения метрик (например, размер очереди).
+        """
+        self.functions[self._key(labels)] = function
+
+    def samples(self):
+        for key, function in self.functions.items():
+            self.values[key] = function()
+        return super().samples()
+
+
+class Histogram(Metric):
+    type = "histogram"
+
+    def __init__(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(buckets)
+
+    def observe(self, value, **labels):
+        key = self._key(labels)
+        state = self.values.get(key)
+        if state is None:
+            # Счётчики корзин (последняя — +Inf), сумма и количество
+            state = self.values[key] = [[0] * (len(self.buckets) + 1), 0.0, 0]
+        state[0][bisect.bisect_left(self.buckets, value)] += 1
+        state[1] += value
+        state[2] += 1
+
+    def samples(self):
+        samples = []
+        for key, (counts, total, count) in self.values.items():
+            cumulative = 0
+            for bound, bucket_count in zip((*self.buckets, "+Inf"), counts):
+                cumulative += bucket_count
+                labels = _format_labels((*self.labelnames, "le"), (*key, bound))
+                samples.append((f"{self.name}_bucket{labels}", cumulative))
+            labels = _format_labels(self.labelnames, key)
+            samples.append((f"{self.name}_sum{labels}", total))
+            samples.append((f"{self.name}_count{labels}", count))
+        return samples
+
+    def _states(self, labels):
+        states = [self.values.get(self._key(labels))] if labels else list(self.values.values())
+        return [state for state in states if state]
+
+    def mean(self, **labels):
+        """
+        :return: Среднее значение наблюдений (по всем меткам, если они не указаны) или None.
+        """
+        states = self._states(labels)
+        count = sum(state[2] for state in states)
+        return sum(state[1] for state in states) / count if count else None
+
+    def quantile(self, q, **labels):
+        """
+        Оценка квантиля по корзинам (верхняя граница корзины, в которую попадает квантиль).
+        :param q: Квантиль от 0 до 1.
+        :return: Значение или None, если наблюдений нет.
+        """
+        states = self._states(labels)
+        counts = [sum(bucket) for bucket in zip(*(state[0] for state in states))]
+        total = sum(counts)
+        if not total:
+            return None
+        cumulative = 0
+        for bound, bucket_count in zip((*self.buckets, float("inf")), counts):
+            cumulative += bucket_count
+            if cumulative >= q * total:
+                return bound
+        return float("inf")
+
+
+class MetricsRegistry:
+    def __init__(self):
+        """
+        Набор метрик процесса. Вывод в текстовом формате Prometheus — render().
+        """
+        self.metrics = {}
+
+    def _register(self, metric):
+        return self.metrics.setdefault(metric.name, metric)
+
+    def counter(self, name, documentation, labelnames=()):
+        return self._register(Counter(name, documentation, labelnames))
+
+    def gauge(self, name, documentation, labelnames=()):
+        return self._register(Gauge(name, documentation, labelnames))
+
+    def histogram(self, name, documentation, labelnames=(), buckets=LATENCY_BUCKETS):
+        return self._register(Histogram(name, documentation, labelnames, buckets))
+
+    def render(self):
+        """
+        :return: Все метрики в текстовом формате Prometheus.
+        """
+        lines = []
+        for metric in self.metrics.values():
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.type}")
+            for sample, value in metric.samples():
+                lines.append(f"{sample} {value}")
+        return "\n".join(lines) + "\n"
+
+    def reset(self):
+        for metric in self.metrics.values():
+            metric.values.clear()
+
+
+metrics = MetricsRegistry()
+
+HTTP_REQUESTS = metrics.counter("metro_http_requests_total", "Ответы сайта по коду статуса", ("status",))
+HTTP_ERRORS = metrics.counter("metro_http_errors_total", "Ошибки запросов по типу", ("error",))
+HTTP_RETRIES = metrics.counter("metro_http_retries_total", "Повторные попытки запросов")
+HTTP_BYTES = metrics.counter("metro_http_bytes_total", "Загружено байт (тела ответов)")
+HTTP_CACHE = metrics.counter("metro_http_cache_total", "Ответы из кэша", ("result",))
+HTTP_STREAM = metrics.counter(
+    "metro_http_stream_total", "Потоковые загрузки по способу завершения (eof, drained, closed)", ("result",)
+)
+HTTP_PHASE = metrics.histogram(
+    "metro_http_phase_seconds", "Время этапов запроса: dns, connect, ttfb, body", ("phase",)
+)
+HTTP_LATENCY = metrics.histogram("metro_http_request_seconds", "Полное время запроса")
+PARSE_TIME = metrics.histogram("metro_parse_seconds", "Время разбора страницы", ("task",), PARSE_BUCKETS)
+QUEUE_DEPTH = metrics.gauge("metro_queue_depth", "Размер очередей конвейера", ("queue",))
+PRODUCTS = metrics.counter("metro_products_total", "Записанные товары")
+PROXIES = metrics.gauge("metro_proxies", "Прокси в пуле: здоровые и исключённые", ("state",))
+
+
+def trace_config():
+    """
+    TraceConfig для aiohttp: время DNS, установки соединения, до первого байта ответа и объём данных.
+    :return: aiohttp.TraceConfig.
+    """
+
+    async def on_request_start(session, context, params):
+        context.start = time.monotonic()
+
+    async def on_dns_resolvehost_start(session, context, params):
+        context.dns_start = time.monotonic()
+
+    async def on_dns_resolvehost_end(session, context, params):
+        HTTP_PHASE.observe(time.monotonic() - context.dns_start, phase="dns")
+
+    async def on_connection_create_start(session, context, params):
+        context.connect_start = time.monotonic()
+
+    async def on_connection_create_end(session, context, params):
+        HTTP_PHASE.observe(time.monotonic() - context.connect_start, phase="connect")
+
+    async def on_request_end(session, context, params):
+        # Заголовки ответа получены
+        HTTP_PHASE.observe(time.monotonic() - context.start, phase="ttfb")
+
+    async def on_response_chunk_received(session, context, params):
+        HTTP_BYTES.inc(len(params.chunk))
+
+    async def on_request_exception(session, context, params):
+        HTTP_ERRORS.inc(error=type(params.exception).__name__)
+
+    config = aiohttp.TraceConfig(trace_config_ctx_factory=lambda trace_request_ctx: SimpleNamespace())
+    config.on_request_start.append(on_request_start)
+    config.on_dns_resolvehost_start.append(on_dns_resolvehost_start)
+    config.on_dns_resolvehost_end.append(on_dns_resolvehost_end)
+    config.on_connection_create_start.append(on_connection_create_start)
+    config.on_connection_create_end.append(on_connection_create_end)
+    config.on_request_end.append(on_request_end)
+    config.on_response_chunk_received.append(on_response_chunk_received)
+    config.on_request_exception.append(on_request_exception)
+    return config
+
+
+def summary_line(elapsed=None):
+    """
+    Краткая сводка метрик для лога.
+    :param elapsed: Время с начала работы (в секундах) для расчёта скорости.
+    :return: Строка.
+    """
+
+    def ms(value):
+        return f"{1000 * value:.0f}" if value not in (None, float("inf")) else "-"
+
+    requests = int(HTTP_REQUESTS.total())
+    downloaded = HTTP_BYTES.total()
+    speed = f", {downloaded / 1024 / elapsed:.0f} КБ/с" if elapsed else ""
+    queues = "/".join(str(value) for _, value in QUEUE_DEPTH.samples()) or "-"
+    parse = PARSE_TIME.mean()
+    return (
+        f"Метрики: запросов {requests} (ошибок {int(HTTP_ERRORS.total())}, повторов {int(HTTP_RETRIES.total())}), "
+        f"загружено {downloaded / 1024 / 1024:.1f} МБ{speed}, "
+        f"TTFB p50/p95 {ms(HTTP_PHASE.quantile(0.5, phase='ttfb'))}/{ms(HTTP_PHASE.quantile(0.95, phase='ttfb'))} мс, "
+        f"разбор {ms(parse) if parse is not None else '-'} мс/стр, "
+        f"очереди {queues}, товаров {int(PRODUCTS.total())}"
+    )
+
+
+class MetricsReporter:
+    def __init__(self, filepath=METRICS_FILE, port=METRICS_PORT, interval=METRICS_INTERVAL, registry=metrics):
+        """
+        Периодически пишет сводку метрик в лог и файл в формате Prometheus (для node_exporter
+        textfile collector) и, если задан порт, отдаёт метрики по HTTP: GET /metrics.
+
+        :param filepath: Файл метрик (None — не писать).
+        :param port: Порт HTTP-эндпоинта (None — не запускать).
+        :param interval: Интервал обновления (в секундах).
+        :param registry: MetricsRegistry.
+        """
+        self.filepath = filepath
+        self.port = port
+        self.interval = interval
+        self.registry = registry
+        self._task = None
+        self._runner = None
+        self._start_time = None
+
+    async def __aenter__(self):
+        self._start_time = time.monotonic()
+        if self.port:
+            app = web.Application()
+            app.router.add_get("/metrics", self._handle_metrics)
+            self._runner = web.AppRunner(app, access_log=None)
+            await self._runner.setup()
+            await web.TCPSite(self._runner, port=self.port).start()
+            logger.info(f"Метрики доступны на http://localhost:{self.port}/metrics")
+        self._task = asyncio.create_task(self._report_periodically())
+        return self
+
+    async def __aexit__(self, exc_type, exc_value, traceback):
+        self._task.cancel()
+        await asyncio.gather(self._task, return_exceptions=True)
+        self.report()
+        if self._runner:
+            await self._runner.cleanup()
+            self._runner = None
+
+    async def _handle_metrics(self, request):
+        return web.Response(text=self.registry.render(), content_type="text/plain", charset="utf-8")
+
+    async def _report_periodically(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            self.report()
+
+    def report(self):
+        """
+        Пишет сводку в лог и обновляет файл метрик.
+        """
+        logger.info(summary_line(time.monotonic() - self._start_time))
+        if self.filepath:
+            try:
+                os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+                temp_path = f"{self.filepath}.tmp"
+                with open(temp_path, "w", encoding="utf-8") as f:
+                    f.write(self.registry.render())
+                os.replace(temp_path, self.filepath)
+            except OSError as e:
+                logger.error(f"Не удалось записать метрики в {self.filepath}: {e}")
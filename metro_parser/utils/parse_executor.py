@@ -0,0 +1,68 @@
+import asyncio
+import time
+from concurrent.futures import ThreadPoolExecutor, ProcessPoolExecutor
+from functools import partial
+
+from metro_parser.utils.metrics import PARSE_TIME
+from metro_parser.config import PARSE_EXECUTOR, PARSE_WORKERS
+
+PARSE_EXECUTOR_MODES = ("inline", "thread", "process")
+
+
+def _timed_call(func, *args, **kwargs):
+    """
+    Выполняет функцию и замеряет время её работы там, где она выполняется
+    (в потоке или процессе пула), без учёта ожидания в очереди пула и передачи данных.
+    :return: Кортеж (время в секундах, результат).
+    """
+    start = time.perf_counter()
+    result = func(*args, **kwargs)
+    return time.perf_counter() - start, result
+
+
+class ParseExecutor:
+    def __init__(self, mode=PARSE_EXECUTOR, workers=PARSE_WORKERS):
+        """
+        Исполнитель функций парсинга.
+
+        - inline: функция выполняется прямо в цикле событий (как раньше);
+        - thread: в пуле потоков (цикл событий не блокируется, но парсинг упирается в GIL);
+        - process: в пуле процессов (парсинг масштабируется по ядрам).
+
+        Функции должны быть объявлены на уровне модуля и принимать/возвращать только
+        простые объекты (bytes, str, dict, list), чтобы их можно было передать в процесс.
+
+        :param mode: Режим: "inline", "thread" или "process".
+        :param workers: Количество потоков или процессов в пуле.
+        """
+        if mode not in PARSE_EXECUTOR_MODES:
+            raise ValueError(f"Неизвестный режим парсинга: {mode}. Допустимые: {', '.join(PARSE_EXECUTOR_MODES)}")
+        self.mode = mode
+        self.workers = workers
+        self.pool = None
+
+    def __enter__(self):
+        if self.mode == "thread":
+            self.pool = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="parser")
+        elif self.mode == "process":
+            self.pool = ProcessPoolExecutor(max_workers=self.workers)
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.pool:
+            self.pool.shutdown(wait=True, cancel_futures=exc_type is not None)
+            self.pool = None
+
+    async def run(self, func, *args, **kwargs):
+        """
+        Выполняет функцию парсинга в выбранном режиме.
+        :param func: Функция уровня модуля.
+        :return: Результат функции.
+        """
+        if self.pool is None:
+            elapsed, result = _timed_call(func, *args, **kwargs)
+        else:
+            loop = asyncio.get_running_loop()
+            elapsed, result = await loop.run_in_executor(self.pool, partial(_timed_call, func, *args, **kwargs))
+        PARSE_TIME.observe(elapsed, task=func.__name__)
+        return result
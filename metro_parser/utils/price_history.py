@@ -0,0 +1,343 @@
+import json
+import os
+import re
+import sqlite3
+import time
+from datetime import datetime
+from functools import lru_cache
+
+from metro_parser.product import Product, from_kopecks, format_discount, prices_to_dict
+from metro_parser.utils.file_handler import FileHandler, ARCHIVE_SUFFIX_RE
+from metro_parser.utils.logger import logger
+from metro_parser.config import PRICE_HISTORY_FILE, PRICE_HISTORY_BATCH_SIZE, OUTPUT_FILE
+
+# Метка времени в имени архива (FileHandler._archive_file)
+_ARCHIVE_TIMESTAMP_RE = re.compile(r"\.(\d{4}-\d{2}-\d{2}_\d{2}-\d{2}-\d{2})\.bak(?:\.gz|\.zst)?$")
+
+# Столбцы таблицы prices, которые возвращают запросы (кроме служебных)
+_COLUMNS = (
+    "article, run_at, link, name, brand, current_price, old_price, discount, discount_text, offline_prices, store_prices"
+)
+
+
+def _timestamp(value, default=None):
+    """
+    :param value: datetime, метка времени Unix или None.
+    :param default: Значение вместо None.
+    :return: Метка времени Unix (float).
+    """
+    if value is None:
+        return default
+    if isinstance(value, datetime):
+        return value.timestamp()
+    return value
+
+
+@lru_cache(maxsize=256)
+def _datetime(timestamp):
+    # Строки одного запуска имеют одинаковое время: datetime создаётся один раз
+    return datetime.fromtimestamp(timestamp)
+
+
+def _row(product, run_at):
+    offline_prices = list(product.offline_prices) if product.has_prices else None
+    return (
+        product.id,
+        run_at,
+        product.link,
+        product.name,
+        product.brand,
+        product.current_price,
+        product.old_price,
+        product.discount,
+        product.discount_text,
+        json.dumps(offline_prices) if offline_prices is not None else None,
+        json.dumps(dict(product.store_prices)) if product.store_prices is not None else None,
+    )
+
+
+def _entry(row):
+    """
+    :param row: Строка таблицы prices (столбцы _COLUMNS).
+    :return: Словарь с ценами в рублях, как в результатах парсинга, и временем запуска run_at (datetime).
+    """
+    (
+        article,
+        run_at,
+        link,
+        name,
+        brand,
+        current_price,
+        old_price,
+        discount,
+        discount_text,
+        offline_prices,
+        store_prices,
+    ) = row
+    entry = {
+        "id": article,
+        "run_at": _datetime(run_at),
+        "name": name,
+        "brand": brand,
+        "current_price": from_kopecks(current_price),
+        "old_price": from_kopecks(old_price),
+        "discount": discount_text if discount_text is not None else format_discount(discount),
+        "offline_prices": [
+            {"actual_price": from_kopecks(actual), "old_price": from_kopecks(old)}
+            for actual, old in json.loads(offline_prices)
+        ]
+        if offline_prices is not None
+        else None,
+        "link": link,
+    }
+    if store_prices is not None:
+        entry["store_prices"] = {store: prices_to_dict(prices) for store, prices in json.loads(store_prices).items()}
+    return entry
+
+
+class PriceHistory:
+    def __init__(self, filepath=PRICE_HISTORY_FILE, batch_size=PRICE_HISTORY_BATCH_SIZE):
+        """
+        История цен: по строке на товар в каждом запуске парсинга, ключ — время запуска и артикул
+        (строки одного запуска лежат в базе подряд). Цены хранятся в копейках. Индексы по артикулу,
+        бренду и дате позволяют получать историю товара, крупнейшие снижения цен и состояние каталога
+        на момент времени без чтения архивов результатов.
+
+        :param filepath: Путь к файлу базы данных.
+        :param batch_size: Количество строк в одной пачке вставки.
+        """
+        self.filepath = filepath
+        self.batch_size = batch_size
+        self.connection = None
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self.connection = sqlite3.connect(self.filepath)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS runs (
+                id INTEGER PRIMARY KEY,
+                run_at REAL NOT NULL,
+                source TEXT UNIQUE,
+                products INTEGER NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS prices (
+                article TEXT NOT NULL,
+                run_at REAL NOT NULL,
+                link TEXT,
+                name TEXT,
+                brand TEXT,
+                current_price INTEGER,
+                old_price INTEGER,
+                discount INTEGER,
+                discount_text TEXT,
+                offline_prices TEXT,
+                store_prices TEXT,
+                PRIMARY KEY (run_at, article)
+            ) WITHOUT ROWID;
+            CREATE INDEX IF NOT EXISTS prices_article ON prices (article, run_at);
+            CREATE INDEX IF NOT EXISTS prices_brand ON prices (brand, run_at);
+            """
+        )
+        # В базах, созданных до режима нескольких магазинов, столбца store_prices нет
+        columns = {row[1] for row in self.connection.execute("PRAGMA table_info(prices)")}
+        if "store_prices" not in columns:
+            self.connection.execute("ALTER TABLE prices ADD COLUMN store_prices TEXT")
+        return self
+
+    def close(self):
+        if self.connection:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def add_run(self, products, run_at=None, source=None):
+        """
+        Добавляет товары одного запуска пачками в одной транзакции. Товары без артикула пропускаются.
+
+        :param products: Итерируемый объект словарей товаров (строки output.jsonl).
+        :param run_at: Время запуска (datetime или метка Unix), по умолчанию — текущее.
+        :param source: Файл, из которого взяты товары: повторно файл не добавляется.
+        :return: Количество добавленных товаров (0, если файл уже добавлен или товаров нет).
+        """
+        run_at = _timestamp(run_at, time.time())
+        if source and self.connection.execute("SELECT 1 FROM runs WHERE source = ?", (source,)).fetchone():
+            return 0
+
+        count = 0
+        batch = []
+        with self.connection:
+            for item in products:
+                product = Product.from_dict(item)
+                if not product.id:
+                    continue
+                batch.append(_row(product, run_at))
+                if len(batch) >= self.batch_size:
+                    count += self._insert(batch)
+                    batch = []
+            count += self._insert(batch)
+            if not count:
+                # Пустой запуск не записывается: иначе он считался бы последним состоянием каталога
+                return 0
+            self.connection.execute(
+                "INSERT INTO runs (run_at, source, products) VALUES (?, ?, ?)", (run_at, source, count)
+            )
+        return count
+
+    def _insert(self, rows):
+        # Один артикул в запуске под несколькими ссылками: остаётся последняя запись
+        self.connection.executemany(f"INSERT OR REPLACE INTO prices ({_COLUMNS}) VALUES ({', '.join('?' * 11)})", rows)
+        return len(rows)
+
+    def import_archives(self, directory=None, filename=None):
+        """
+        Добавляет в историю архивы результатов (output.json.<дата>.bak[.gz|.zst] и т.п.).
+        Время запуска берётся из метки в имени архива; уже добавленные архивы пропускаются.
+
+        :param directory: Папка с архивами (по умолчанию — папка OUTPUT_FILE).
+        :param filename: Имя исходного файла архивов (по умолчанию — имя OUTPUT_FILE; для
+                         архивов JSON Lines — "output.jsonl").
+        :return: Словарь путь к архиву -> количество добавленных товаров.
+        """
+        directory = directory or os.path.dirname(OUTPUT_FILE)
+        filename = filename or os.path.basename(OUTPUT_FILE)
+        imported = {}
+        for name in sorted(os.listdir(directory)):
+            match = _ARCHIVE_TIMESTAMP_RE.search(name)
+            if not match or name[: match.start()] not in (filename, *(filename + suffix for suffix in (".gz", ".zst"))):
+                continue
+            run_at = datetime.strptime(match.group(1), "%Y-%m-%d_%H-%M-%S")
+            path = os.path.join(directory, name)
+            imported[path] = self.add_run(read_products(path), run_at, source=os.path.abspath(path))
+        return imported
+
+    def runs(self):
+        """
+        :return: Список кортежей (время запуска — datetime, количество товаров) по возрастанию времени.
+        """
+        return [
+            (datetime.fromtimestamp(run_at), products)
+            for run_at, products in self.connection.execute("SELECT run_at, products FROM runs ORDER BY run_at")
+        ]
+
+    def history(self, article, since=None, until=None):
+        """
+        История цен товара.
+        :param article: Артикул товара.
+        :param since: Начало периода (datetime или метка Unix) или None.
+        :param until: Конец периода или None.
+        :return: Список записей (словари с run_at) по возрастанию времени.
+        """
+        rows = self.connection.execute(
+            f"SELECT {_COLUMNS} FROM prices WHERE article = ? AND run_at >= ? AND run_at <= ? ORDER BY run_at",
+            (article, _timestamp(since, 0), _timestamp(until, float("inf"))),
+        )
+        return [_entry(row) for row in rows]
+
+    def _latest(self, at=None):
+        """
+        :param at: Момент времени (datetime или метка Unix) или None.
+        :return: Запрос и параметры: последняя запись каждого артикула не позже at (по умолчанию — последняя вообще).
+        """
+        # Время последней записи ищется по индексу prices_article, сами записи — по первичному ключу
+        return (
+            f"SELECT {_COLUMNS} FROM (SELECT article, MAX(run_at) AS run_at FROM prices WHERE run_at <= ? GROUP BY article) "
+            "JOIN prices USING (article, run_at)",
+            (_timestamp(at, float("inf")),),
+        )
+
+    def snapshot(self, at=None, brand=None):
+        """
+        Состояние каталога на момент времени — для каждого артикула последняя цена не позже at,
+        поэтому товары, не попавшие в частичный запуск, берутся из предыдущих запусков.
+        :param at: Момент времени (datetime или метка Unix), по умолчанию — последний запуск.
+        :param brand: Только товары бренда или None.
+        :return: Список записей, отсортированный по артикулу.
+        """
+        latest, params = self._latest(at)
+        rows = self.connection.execute(
+            latest + (" WHERE brand = ?" if brand else "") + " ORDER BY article",
+            (*params, *((brand,) if brand else ())),
+        )
+        return [_entry(row) for row in rows]
+
+    def biggest_drops(self, since, until=None, limit=20, brand=None):
+        """
+        Крупнейшие снижения текущей цены: последняя цена каждого артикула не позже until сравнивается
+        с его последней ценой не позже since.
+
+        :param since: Начало периода (datetime или метка Unix).
+        :param until: Конец периода, по умолчанию — последний запуск.
+        :param limit: Максимальное количество товаров.
+        :param brand: Только товары бренда или None.
+        :return: Список словарей (id, name, brand, link, previous_price, current_price, drop, drop_percent),
+                 по убыванию снижения в процентах.
+        """
+        before, before_params = self._latest(since)
+        after, after_params = self._latest(until)
+        rows = self.connection.execute(
+            f"""
+            SELECT after.article, after.name, after.brand, after.link, before.current_price, after.current_price
+            FROM ({after}) AS after
+            JOIN ({before}) AS before ON before.article = after.article
+            WHERE after.current_price < before.current_price
+            """
+            + (" AND after.brand = ?" if brand else "")
+            + """
+            ORDER BY CAST(before.current_price - after.current_price AS REAL) / before.current_price DESC,
+                     after.article DESC
+            LIMIT ?
+            """,
+            (*after_params, *before_params, *((brand,) if brand else ()), limit),
+        )
+        return [
+            {
+                "id": article,
+                "name": name,
+                "brand": brand,
+                "link": link,
+                "previous_price": from_kopecks(previous),
+                "current_price": from_kopecks(current),
+                "drop": from_kopecks(previous - current),
+                "drop_percent": round(100 * (previous - current) / previous, 1),
+            }
+            for article, name, brand, link, previous, current in rows
+        ]
+
+
+def read_products(filepath):
+    """
+    Товары из файла результатов: JSON Lines или JSON-массив (в том числе сжатый архив).
+    :param filepath: Путь к файлу.
+    :return: Итерируемый объект словарей товаров.
+    """
+    name = re.sub(r"\.(gz|zst)$", "", ARCHIVE_SUFFIX_RE.sub("", re.sub(r"\.(gz|zst)$", "", filepath)))
+    if name.endswith(".jsonl"):
+        return FileHandler.read_jsonl(filepath)
+    with FileHandler.open_file(filepath, "rt") as f:
+        return json.load(f)
+
+
+def record_run(source, filepath=PRICE_HISTORY_FILE, complete=True):
+    """
+    Добавляет результаты завершённого запуска в историю цен.
+    :param source: Путь к файлу JSON Lines с результатами запуска.
+    :param filepath: Путь к файлу истории цен.
+    :param complete: Загружены ли все страницы категорий. Незавершённый запуск не добавляется.
+    :return: Количество добавленных товаров.
+    """
+    if not complete:
+        logger.warning("Не все страницы категорий загружены, запуск не добавлен в историю цен.")
+        return 0
+    with PriceHistory(filepath) as history:
+        count = history.add_run(FileHandler.read_jsonl(source))
+    logger.info(f"В историю цен добавлено товаров: {count}")
+    return count
@@ -0,0 +1,153 @@
+import cProfile
+import io
+import os
+import pstats
+import sys
+import threading
+import time
+
+from collections import Counter
+from datetime import datetime
+
+from metro_parser.utils.logger import logger
+from metro_parser.config import PROFILE_DIR, PROFILE_SAMPLE_INTERVAL
+
+PROFILE_MODES = ("cprofile", "sampling")
+
+# Сколько строк отчёта писать в лог
+REPORT_LINES = 25
+
+
+class StackSampler:
+    def __init__(self, interval=PROFILE_SAMPLE_INTERVAL):
+        """
+        Семплирующий профилировщик: фоновый поток периодически снимает стеки всех потоков
+        процесса. В отличие от cProfile почти не замедляет программу, поэтому подходит
+        для замеров на полной нагрузке.
+
+        Результат — «свёрнутые» стеки (формат flamegraph.pl и speedscope): строка на стек,
+        кадры через ";", в конце количество попаданий.
+
+        :param interval: Интервал между снятиями стеков (в секундах).
+        """
+        self.interval = interval
+        self.stacks = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name="stack-sampler", daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        own_id = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for thread_id, frame in sys._current_frames().items():
+                if thread_id == own_id:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                    frame = frame.f_back
+                stack.append(names.get(thread_id, str(thread_id)))
+                self.stacks[";".join(reversed(stack))] += 1
+            self.samples += 1
+
+    def write_folded(self, filepath):
+        """
+        Сохраняет свёрнутые стеки в файл.
+        :param filepath: Путь к файлу.
+        """
+        with open(filepath, "w", encoding="utf-8") as f:
+            for stack, count in self.stacks.most_common():
+                f.write(f"{stack} {count}\n")
+
+    def top(self, limit=REPORT_LINES):
+        """
+        Функции, на которых чаще всего заставал профилировщик (верхний кадр стека).
+        Простаивающий цикл событий попадает сюда как select/poll.
+        :param limit: Количество строк.
+        :return: Список пар (функция, доля снятий).
+        """
+        own = Counter()
+        for stack, count in self.stacks.items():
+            own[stack.rsplit(";", 1)[-1]] += count
+        total = sum(own.values()) or 1
+        return [(frame, count / total) for frame, count in own.most_common(limit)]
+
+
+class RunProfiler:
+    def __init__(self, mode, filepath=None, interval=PROFILE_SAMPLE_INTERVAL):
+        """
+        Профилирование всего запуска парсера.
+
+        cprofile — детерминированный профиль cProfile (файл .prof для pstats/snakeviz);
+        sampling — StackSampler (файл .folded для flamegraph.pl/speedscope).
+        Краткий отчёт пишется в лог.
+
+        :param mode: Режим из PROFILE_MODES.
+        :param filepath: Файл профиля. По умолчанию — PROFILE_DIR/profile_<дата>.<prof|folded>.
+        :param interval: Интервал семплирования (для sampling).
+        """
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Неизвестный режим профилирования: {mode}. Допустимые: {', '.join(PROFILE_MODES)}")
+        if filepath is None:
+            timestamp = datetime.now().strftime("%Y-%m-%d_%H-%M-%S")
+            suffix = "prof" if mode == "cprofile" else "folded"
+            filepath = os.path.join(PROFILE_DIR, f"profile_{timestamp}.{suffix}")
+        self.mode = mode
+        self.filepath = filepath
+        self.profiler = cProfile.Profile() if mode == "cprofile" else StackSampler(interval)
+        self._start_time = None
+
+    def __enter__(self):
+        self._start_time = time.perf_counter()
+        if self.mode == "cprofile":
+            self.profiler.enable()
+        else:
+            self.profiler.start()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.mode == "cprofile":
+            self.profiler.disable()
+        else:
+            self.profiler.stop()
+        elapsed = time.perf_counter() - self._start_time
+        try:
+            self.save()
+        except OSError as e:
+            logger.error(f"Не удалось сохранить профиль в {self.filepath}: {e}")
+            return
+        logger.info(f"Профиль ({self.mode}, {elapsed:.2f} с) сохранён: {self.filepath}")
+        logger.info(self.report())
+
+    def save(self):
+        os.makedirs(os.path.dirname(self.filepath) or ".", exist_ok=True)
+        if self.mode == "cprofile":
+            self.profiler.dump_stats(self.filepath)
+        else:
+            self.profiler.write_folded(self.filepath)
+
+    def report(self, limit=REPORT_LINES):
+        """
+        :return: Текстовый отчёт: самые затратные функции.
+        """
+        if self.mode == "cprofile":
+            stream = io.StringIO()
+            pstats.Stats(self.profiler, stream=stream).sort_stats("cumulative").print_stats(limit)
+            return "Самые затратные функции (cProfile, по общему времени):\n" + stream.getvalue()
+
+        lines = [f"Самые частые функции (снятий стека: {self.profiler.samples}):"]
+        lines += [f"{100 * share:6.1f}%  {frame}" for frame, share in self.profiler.top(limit)]
+        return "\n".join(lines)
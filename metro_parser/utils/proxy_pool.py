@@ -0,0 +1,254 @@
+import asyncio
+import time
+
+from collections import deque
+from contextlib import asynccontextmanager
+from urllib.parse import urlsplit
+
+import aiohttp
+from aiohttp_socks import ProxyConnector, ProxyError
+
+from metro_parser.utils.logger import logger
+from metro_parser.utils.scheduler import TokenBucket
+from metro_parser.utils.metrics import PROXIES
+from metro_parser.utils.retry_policy import NETWORK_ERRORS
+from metro_parser.config import (
+    PROXY_FILE,
+    PROXY_RATE_LIMIT,
+    PROXY_CONCURRENCY,
+    PROXY_HEALTH_WINDOW,
+    PROXY_MAX_FAILURE_RATE,
+    PROXY_RECHECK_INTERVAL,
+    PROXY_CHECK_URL,
+)
+
+# Ответы, которые означают, что сайт ограничил или заблокировал IP прокси
+PROXY_BLOCK_STATUSES = (403, 407, 429)
+
+# Коэффициент сглаживания времени ответа прокси (экспоненциальное скользящее среднее)
+LATENCY_SMOOTHING = 0.2
+
+
+def read_proxies(filepath=PROXY_FILE):
+    """
+    Читает список прокси из файла: по одному URL на строку, пустые строки и строки с # пропускаются.
+    :param filepath: Путь к файлу.
+    :return: Список URL прокси.
+    """
+    with open(filepath, "r", encoding="utf-8") as f:
+        return [line.strip() for line in f if line.strip() and not line.strip().startswith("#")]
+
+
+def is_proxy_fault(error):
+    """
+    Виноват ли в ошибке прокси, а не сайт: ошибки соединения и тайм-ауты, а также ответы 403/407/429.
+    :param error: Исключение запроса.
+    :return: bool.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status in PROXY_BLOCK_STATUSES
+    return isinstance(error, (asyncio.TimeoutError, aiohttp.ClientConnectionError, ProxyError, OSError))
+
+
+class ProxyState:
+    def __init__(self, url, rate, concurrency, window):
+        """
+        Состояние одного прокси в пуле.
+
+        :param url: URL прокси.
+        :param rate: Максимум запросов в секунду (None — без ограничения).
+        :param concurrency: Максимум одновременных запросов.
+        :param window: Количество последних запросов для оценки доли ошибок.
+        """
+        self.url = url
+        parts = urlsplit(url)
+        # В логи не попадают логин и пароль
+        self.name = f"{parts.scheme}://{parts.hostname}:{parts.port}"
+        self.bucket = TokenBucket(rate) if rate else None
+        self.concurrency = concurrency
+        self.session = None
+        self.in_flight = 0
+        self.outcomes = deque(maxlen=window)
+        self.latency = None
+        self.requests = 0
+        self.evicted = False
+        self.next_check = 0.0
+
+    @property
+    def failure_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    @property
+    def available(self):
+        return not self.evicted and self.in_flight < self.concurrency
+
+    def cost(self):
+        """
+        Ожидаемая «цена» следующего запроса через прокси: чем быстрее прокси, чем меньше у него
+        ошибок и запросов в работе, тем она ниже. Новые прокси (без замеров) выбираются первыми.
+        """
+        if self.latency is None:
+            # Пока нет замеров, запросы распределяются между новыми прокси поровну
+            return self.in_flight * 1e-6
+        return (self.in_flight + 1) * self.latency / max(0.05, 1 - self.failure_rate)
+
+    def reset(self):
+        self.outcomes.clear()
+        self.latency = None
+        self.evicted = False
+
+
+class ProxyPool:
+    def __init__(
+        self,
+        proxies,
+        rate=PROXY_RATE_LIMIT,
+        concurrency=PROXY_CONCURRENCY,
+        window=PROXY_HEALTH_WINDOW,
+        max_failure_rate=PROXY_MAX_FAILURE_RATE,
+        recheck_interval=PROXY_RECHECK_INTERVAL,
+        check_url=PROXY_CHECK_URL,
+    ):
+        """
+        Пул прокси с оценкой здоровья. Запрос уходит через доступный прокси с наименьшей ожидаемой
+        «ценой» (время ответа, доля ошибок, загрузка). Прокси, у которого доля ошибок среди последних
+        window запросов достигла max_failure_rate, исключается и каждые recheck_interval секунд
+        проверяется запросом к check_url; после успешной проверки он возвращается в пул.
+
+        У каждого прокси своя сессия и свой пул соединений, свой лимит скорости и одновременных запросов,
+        поэтому общая пропускная способность растёт с количеством здоровых прокси.
+
+        :param proxies: URL прокси (socks5://, socks4://, http://).
+        :param rate: Максимум запросов в секунду через один прокси (None — без ограничения).
+        :param concurrency: Максимум одновременных запросов через один прокси.
+        :param window: Количество последних запросов для оценки доли ошибок.
+        :param max_failure_rate: Доля ошибок, при которой прокси исключается.
+        :param recheck_interval: Интервал проверки исключённых прокси (в секундах).
+        :param check_url: URL для проверки.
+        """
+        if not proxies:
+            raise ValueError("Список прокси пуст")
+        self.proxies = [ProxyState(url, rate, concurrency, window) for url in dict.fromkeys(proxies)]
+        self.window = window
+        self.max_failure_rate = max_failure_rate
+        self.recheck_interval = recheck_interval
+        self.check_url = check_url
+        self._condition = None
+        self._recheck_task = None
+
+    @classmethod
+    def from_file(cls, filepath=PROXY_FILE, **kwargs):
+        """
+        Создаёт пул из файла со списком прокси.
+        :param filepath: Путь к файлу.
+        :param kwargs: Остальные параметры ProxyPool.
+        :return: ProxyPool.
+        """
+        return cls(read_proxies(filepath), **kwargs)
+
+    @property
+    def healthy(self):
+        return sum(1 for proxy in self.proxies if not proxy.evicted)
+
+    async def start(self, session_factory, **connector_options):
+        """
+        Открывает сессии всех прокси.
+        :param session_factory: Функция, создающая aiohttp.ClientSession для коннектора.
+        :param connector_options: Параметры пула соединений (limit, keepalive_timeout и т.д.).
+        """
+        self._condition = asyncio.Condition()
+        for proxy in self.proxies:
+            proxy.session = session_factory(ProxyConnector.from_url(proxy.url, **connector_options))
+        self._recheck_task = asyncio.create_task(self._recheck_periodically())
+        PROXIES.set_function(lambda: self.healthy, state="healthy")
+        PROXIES.set_function(lambda: len(self.proxies) - self.healthy, state="evicted")
+        logger.info(f"Пул прокси: {len(self.proxies)}")
+
+    async def close(self):
+        if self._recheck_task:
+            self._recheck_task.cancel()
+            await asyncio.gather(self._recheck_task, return_exceptions=True)
+            self._recheck_task = None
+        for proxy in self.proxies:
+            if proxy.session:
+                await proxy.session.close()
+                proxy.session = None
+
+    @asynccontextmanager
+    async def acquire(self):
+        """
+        Контекстный менеджер, выдающий прокси для запроса. Ждёт, если все прокси заняты или исключены.
+        :return: ProxyState (сессия — proxy.session).
+        """
+        while True:
+            async with self._condition:
+                await self._condition.wait_for(lambda: any(proxy.available for proxy in self.proxies))
+                proxy = min((proxy for proxy in self.proxies if proxy.available), key=ProxyState.cost)
+                proxy.in_flight += 1
+            try:
+                if proxy.bucket:
+                    await proxy.bucket.acquire()
+                # Пока ждали лимита скорости, прокси могли исключить: выбираем другой
+                if not proxy.evicted:
+                    yield proxy
+                    return
+            finally:
+                async with self._condition:
+                    proxy.in_flight -= 1
+                    self._condition.notify_all()
+
+    def record(self, proxy, success, latency=None):
+        """
+        Учитывает результат запроса через прокси.
+        :param proxy: ProxyState.
+        :param success: False, если в ошибке виноват прокси (см. is_proxy_fault).
+        :param latency: Время запроса (в секундах), учитывается для успешных запросов.
+        """
+        proxy.requests += 1
+        proxy.outcomes.append(success)
+        if success and latency is not None:
+            proxy.latency = latency if proxy.latency is None else (
+                LATENCY_SMOOTHING * latency + (1 - LATENCY_SMOOTHING) * proxy.latency
+            )
+        if (
+            not proxy.evicted
+            and len(proxy.outcomes) >= self.window // 2
+            and proxy.failure_rate >= self.max_failure_rate
+        ):
+            proxy.evicted = True
+            proxy.next_check = time.monotonic() + self.recheck_interval
+            logger.warning(
+                f"Прокси {proxy.name} исключён из пула ({100 * proxy.failure_rate:.0f}% ошибок), "
+                f"здоровых прокси: {self.healthy}/{len(self.proxies)}"
+            )
+            if not self.healthy:
+                logger.error(f"Все прокси исключены, ждём повторной проверки через {self.recheck_interval} с")
+
+    async def check(self, proxy):
+        """
+        Проверяет исключённый прокси запросом к check_url и возвращает его в пул при успехе.
+        :param proxy: ProxyState.
+        :return: True, если прокси работает.
+        """
+        try:
+            async with proxy.session.get(self.check_url) as response:
+                ok = response.status < 400
+        except NETWORK_ERRORS:
+            ok = False
+
+        if not ok:
+            proxy.next_check = time.monotonic() + self.recheck_interval
+            return False
+        async with self._condition:
+            proxy.reset()
+            self._condition.notify_all()
+        logger.info(f"Прокси {proxy.name} снова работает, здоровых прокси: {self.healthy}/{len(self.proxies)}")
+        return True
+
+    async def _recheck_periodically(self):
+        while True:
+            await asyncio.sleep(min(5.0, self.recheck_interval))
+            now = time.monotonic()
+            due = [proxy for proxy in self.proxies if proxy.evicted and proxy.next_check <= now]
+            if due:
+                await asyncio.gather(*(self.check(proxy) for proxy in due))
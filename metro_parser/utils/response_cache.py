@@ -0,0 +1,275 @@
+import hashlib
+import os
+import sqlite3
+import threading
+import time
+
+from metro_parser.config import CACHE_DIR, CACHE_TTL, CACHE_MAX_SIZE, CACHE_EVICT_TARGET, CACHE_ACCESS_FLUSH_INTERVAL
+
+
+class CacheEntry:
+    __slots__ = ("url", "path", "etag", "last_modified", "encoding", "stored_at", "fresh")
+
+    def __init__(self, url, path, etag, last_modified, encoding, stored_at, fresh):
+        """
+        Сохранённый ответ. Тело читается с диска только при обращении к body.
+        :param path: Путь к файлу с телом ответа.
+        :param fresh: True, если ответ моложе TTL и его можно отдать без запроса к сайту.
+        """
+        self.url = url
+        self.path = path
+        self.etag = etag
+        self.last_modified = last_modified
+        self.encoding = encoding
+        self.stored_at = stored_at
+        self.fresh = fresh
+
+    def validators(self):
+        """
+        Заголовки условного запроса для повторной проверки ответа.
+        :return: Словарь заголовков (может быть пустым).
+        """
+        headers = {}
+        if self.etag:
+            headers["If-None-Match"] = self.etag
+        if self.last_modified:
+            headers["If-Modified-Since"] = self.last_modified
+        return headers
+
+    @property
+    def body(self):
+        with open(self.path, "rb") as f:
+            return f.read()
+
+    def text(self):
+        return self.body.decode(self.encoding or "utf-8")
+
+
+class ResponseCache:
+    def __init__(
+        self,
+        directory=CACHE_DIR,
+        ttl=CACHE_TTL,
+        max_size=CACHE_MAX_SIZE,
+        evict_target=CACHE_EVICT_TARGET,
+        flush_interval=CACHE_ACCESS_FLUSH_INTERVAL,
+    ):
+        """
+        Дисковый кэш HTTP-ответов.
+
+        Тела ответов хранятся по SHA-256 содержимого (одинаковые страницы занимают место один раз),
+        индекс URL -> тело, валидаторы (ETag, Last-Modified) и время доступа — в SQLite.
+        Как только размер превышает max_size, давно не использованные записи удаляются (LRU),
+        пока кэш не уменьшится до evict_target * max_size. Время доступа копится в памяти и записывается
+        в индекс раз в flush_interval секунд, перед вытеснением и при закрытии.
+
+        store() и refresh() можно вызывать из других потоков (asyncio.to_thread), чтобы запись тела
+        и фиксация транзакции не блокировали цикл событий; обращения к индексу выполняются по очереди.
+
+        :param directory: Папка кэша.
+        :param ttl: Сколько секунд ответ считается свежим и отдаётся без запроса (0 — всегда перепроверять).
+        :param max_size: Максимальный суммарный размер тел ответов (в байтах).
+        :param evict_target: Доля max_size, до которой уменьшается кэш при превышении.
+        :param flush_interval: Интервал записи времени доступа в индекс (в секундах).
+        """
+        self.directory = directory
+        self.ttl = ttl
+        self.max_size = max_size
+        self.evict_target = evict_target
+        self.flush_interval = flush_interval
+        self.connection = None
+        self._lock = threading.Lock()
+        # URL -> время последнего доступа, ещё не записанное в индекс
+        self._accessed = {}
+        self._flushed_at = time.monotonic()
+        # Суммарный размер записей индекса, поддерживается при записи и удалении
+        self.size = 0
+        self.hits = 0
+        self.revalidated = 0
+
+    def open(self):
+        os.makedirs(os.path.join(self.directory, "bodies"), exist_ok=True)
+        self.connection = sqlite3.connect(os.path.join(self.directory, "index.sqlite3"), check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute("PRAGMA synchronous=NORMAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS entries (
+                url TEXT PRIMARY KEY,
+                content_hash TEXT NOT NULL,
+                size INTEGER NOT NULL,
+                etag TEXT,
+                last_modified TEXT,
+                encoding TEXT,
+                stored_at REAL NOT NULL,
+                accessed_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at);
+            CREATE INDEX IF NOT EXISTS entries_content_hash ON entries (content_hash);
+            """
+        )
+        (self.size,) = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+        return self
+
+    def close(self):
+        """
+        Записывает время доступа, применяет ограничение размера и закрывает индекс.
+        """
+        if self.connection:
+            self.evict()
+            with self._lock:
+                self.connection.close()
+                self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _body_path(self, content_hash):
+        return os.path.join(self.directory, "bodies", content_hash[:2], content_hash)
+
+    def get(self, url):
+        """
+        Возвращает сохранённый ответ для URL.
+        :param url: URL запроса.
+        :return: CacheEntry или None, если ответа нет (или его тело потеряно).
+        """
+        with self._lock:
+            row = self.connection.execute(
+                "SELECT content_hash, etag, last_modified, encoding, stored_at FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+        if row is None:
+            return None
+
+        content_hash, etag, last_modified, encoding, stored_at = row
+        path = self._body_path(content_hash)
+        if not os.path.exists(path):
+            with self._lock:
+                self.connection.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self.connection.commit()
+            return None
+
+        now = time.time()
+        fresh = bool(self.ttl) and now - stored_at < self.ttl
+        self._accessed[url] = now
+        if time.monotonic() - self._flushed_at >= self.flush_interval:
+            self.flush()
+        if fresh:
+            self.hits += 1
+        return CacheEntry(url, path, etag, last_modified, encoding, stored_at, fresh)
+
+    def store(self, url, body, etag=None, last_modified=None, encoding=None):
+        """
+        Сохраняет ответ.
+        :param url: URL запроса.
+        :param body: Тело ответа (bytes).
+        :param etag: Заголовок ETag.
+        :param last_modified: Заголовок Last-Modified.
+        :param encoding: Кодировка тела.
+        """
+        content_hash = hashlib.sha256(body).hexdigest()
+        path = self._body_path(content_hash)
+        # Тело пишется без блокировки индекса: цикл событий может читать индекс в это время
+        self._write_body(path, body)
+
+        now = time.time()
+        with self._lock:
+            # Пока писали тело, другой поток мог удалить такой же файл как ненужный
+            self._write_body(path, body)
+            previous = self.connection.execute(
+                "SELECT content_hash, size FROM entries WHERE url = ?", (url,)
+            ).fetchone()
+            self.connection.execute(
+                "INSERT OR REPLACE INTO entries "
+                "(url, content_hash, size, etag, last_modified, encoding, stored_at, accessed_at) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (url, content_hash, len(body), etag, last_modified, encoding, now, now),
+            )
+            self._accessed.pop(url, None)
+            self.size += len(body) - (previous[1] if previous else 0)
+            if previous and previous[0] != content_hash:
+                self._remove_orphan(previous[0])
+            self.connection.commit()
+        if self.size > self.max_size:
+            self.evict()
+
+    @staticmethod
+    def _write_body(path, body):
+        """
+        Записывает тело ответа, если файла ещё нет. Временный файл у каждого потока свой.
+        """
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        temp_path = f"{path}.{threading.get_ident()}.tmp"
+        with open(temp_path, "wb") as f:
+            f.write(body)
+        os.replace(temp_path, path)
+
+    def refresh(self, url):
+        """
+        Отмечает сохранённый ответ как снова актуальный (сайт ответил 304 Not Modified).
+        :param url: URL запроса.
+        """
+        now = time.time()
+        with self._lock:
+            self.connection.execute("UPDATE entries SET stored_at = ?, accessed_at = ? WHERE url = ?", (now, now, url))
+            self._accessed.pop(url, None)
+            self.connection.commit()
+        self.revalidated += 1
+
+    def flush(self):
+        """
+        Записывает накопленное время доступа к записям в индекс одной транзакцией.
+        """
+        with self._lock:
+            accessed, self._accessed = self._accessed, {}
+            self._flushed_at = time.monotonic()
+            if accessed:
+                self.connection.executemany(
+                    "UPDATE entries SET accessed_at = ? WHERE url = ?", [(now, url) for url, now in accessed.items()]
+                )
+                self.connection.commit()
+
+    def evict(self):
+        """
+        Если размер кэша больше max_size, удаляет давно не использованные записи,
+        пока он не уменьшится до evict_target * max_size.
+        :return: Количество удалённых записей.
+        """
+        # Порядок вытеснения зависит от времени доступа: сначала записываются накопленные значения
+        self.flush()
+        with self._lock:
+            (self.size,) = self.connection.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()
+            if self.size <= self.max_size:
+                return 0
+
+            target = self.max_size * self.evict_target
+            removed = 0
+            rows = self.connection.execute(
+                "SELECT url, content_hash, size FROM entries ORDER BY accessed_at"
+            ).fetchall()
+            for url, content_hash, size in rows:
+                if self.size <= target:
+                    break
+                self.connection.execute("DELETE FROM entries WHERE url = ?", (url,))
+                self._remove_orphan(content_hash)
+                self.size -= size
+                removed += 1
+            self.connection.commit()
+            return removed
+
+    def _remove_orphan(self, content_hash):
+        """
+        Удаляет файл тела, если на него больше не ссылается ни один URL.
+        """
+        referenced = self.connection.execute(
+            "SELECT 1 FROM entries WHERE content_hash = ? LIMIT 1", (content_hash,)
+        ).fetchone()
+        if not referenced:
+            try:
+                os.remove(self._body_path(content_hash))
+            except FileNotFoundError:
+                pass
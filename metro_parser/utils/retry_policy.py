@@ -0,0 +1,233 @@
+import asyncio
+import random
+import time
+
+from collections import deque
+
+import aiohttp
+from aiohttp_socks import ProxyError
+
+from metro_parser.utils.logger import logger
+from metro_parser.config import (
+    RETRY_BACKOFF_BASE,
+    RETRY_BACKOFF_MAX,
+    RETRY_BACKOFF_MULTIPLIER,
+    RETRY_BUDGET_RATIO,
+    RETRY_BUDGET_MIN,
+    CIRCUIT_WINDOW,
+    CIRCUIT_ERROR_THRESHOLD,
+    CIRCUIT_MIN_REQUESTS,
+    CIRCUIT_OPEN_TIME,
+    CIRCUIT_MAX_OPEN_TIME,
+)
+
+# Ошибки запроса, которые обрабатывает HTTPClient.fetch. OSError — сброс соединения, который
+# прокси-коннектор пробрасывает без обёртки aiohttp
+NETWORK_ERRORS = (aiohttp.ClientError, asyncio.TimeoutError, ProxyError, OSError)
+
+# Коды 4xx, после которых повтор имеет смысл: тайм-аут запроса, "слишком рано", ограничение частоты
+TRANSIENT_CLIENT_STATUSES = (408, 425, 429)
+
+CLOSED = "closed"
+OPEN = "open"
+HALF_OPEN = "half_open"
+
+
+def is_transient(error):
+    """
+    Временная ли ошибка запроса (повтор может помочь) или постоянная (4xx: страницы нет, доступ запрещён).
+
+    :param error: Исключение aiohttp, прокси или asyncio.TimeoutError.
+    :return: True для 5xx, 408/425/429, тайм-аутов, разрывов и ошибок соединения.
+    """
+    if isinstance(error, aiohttp.ClientResponseError):
+        return error.status >= 500 or error.status in TRANSIENT_CLIENT_STATUSES
+    # Тайм-ауты, ServerDisconnectedError, ClientConnectorError, ClientPayloadError, ошибки прокси и т.п.
+    return isinstance(error, NETWORK_ERRORS)
+
+
+def is_not_found(error):
+    """
+    Означает ли ошибка загрузки, что страницы нет (ответ 404).
+
+    :param error: Исключение запроса или исключение HTTPClient.fetch (исходная ошибка — в __cause__).
+    :return: True для ответа 404.
+    """
+    while error is not None:
+        if isinstance(error, aiohttp.ClientResponseError):
+            return error.status == 404
+        error = error.__cause__
+    return False
+
+
+def is_permanent(error):
+    """
+    Означает ли ошибка загрузки, что повтор не поможет (см. is_transient).
+
+    :param error: Исключение запроса или исключение HTTPClient.fetch (исходная ошибка — в __cause__).
+    :return: True для постоянной ошибки запроса; False для временной и для ошибок, не связанных с запросом.
+    """
+    while error is not None:
+        if isinstance(error, NETWORK_ERRORS):
+            return not is_transient(error)
+        error = error.__cause__
+    return False
+
+
+class RetryBudget:
+    def __init__(self, ratio=RETRY_BUDGET_RATIO, min_retries=RETRY_BUDGET_MIN):
+        """
+        Бюджет повторов на запуск: повторов не больше min_retries + ratio * количество запросов.
+        Когда сайт лежит, повторы перестают умножать нагрузку, и парсинг быстрее переходит к следующим страницам.
+
+        :param ratio: Допустимая доля повторов от всех запросов.
+        :param min_retries: Запас повторов, доступный с самого начала.
+        """
+        self.ratio = ratio
+        self.min_retries = min_retries
+        self.requests = 0
+        self.retries = 0
+        self.exhausted = 0
+
+    def record_request(self):
+        self.requests += 1
+
+    def spend(self):
+        """
+        Забирает один повтор из бюджета.
+        :return: False, если бюджет исчерпан.
+        """
+        if self.retries >= self.min_retries + self.ratio * self.requests:
+            self.exhausted += 1
+            return False
+        self.retries += 1
+        return True
+
+
+class RetryPolicy:
+    def __init__(
+        self,
+        base_delay=RETRY_BACKOFF_BASE,
+        max_delay=RETRY_BACKOFF_MAX,
+        multiplier=RETRY_BACKOFF_MULTIPLIER,
+        budget=None,
+    ):
+        """
+        Политика повторов: экспоненциальная задержка со случайным разбросом ("full jitter")
+        и общий бюджет повторов.
+
+        :param base_delay: Верхняя граница задержки перед первым повтором (в секундах).
+        :param max_delay: Максимальная задержка (в секундах).
+        :param multiplier: Во сколько раз растёт граница задержки с каждой попыткой.
+        :param budget: RetryBudget. По умолчанию создаётся новый.
+        """
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.multiplier = multiplier
+        self.budget = budget or RetryBudget()
+
+    def backoff(self, attempt, retry_after=None):
+        """
+        Задержка перед следующей попыткой.
+        :param attempt: Номер неудачной попытки (с 1).
+        :param retry_after: Задержка из заголовка Retry-After; если есть, используется она.
+        :return: Задержка в секундах.
+        """
+        if retry_after:
+            return min(retry_after, self.max_delay)
+        # Случайная задержка разводит повторы запросов, упавших одновременно
+        return random.uniform(0, min(self.max_delay, self.base_delay * self.multiplier ** (attempt - 1)))
+
+
+class CircuitBreaker:
+    def __init__(
+        self,
+        name,
+        window=CIRCUIT_WINDOW,
+        threshold=CIRCUIT_ERROR_THRESHOLD,
+        min_requests=CIRCUIT_MIN_REQUESTS,
+        open_time=CIRCUIT_OPEN_TIME,
+        max_open_time=CIRCUIT_MAX_OPEN_TIME,
+    ):
+        """
+        Автоматический выключатель для хоста. Если среди последних window запросов доля временных
+        ошибок достигает threshold, запросы к хосту приостанавливаются на open_time секунд.
+        Затем пропускается один пробный запрос: при успехе работа продолжается,
+        при ошибке пауза повторяется и удваивается (до max_open_time).
+
+        :param name: Имя (хост) для логов.
+        :param window: Количество последних запросов для расчёта доли ошибок.
+        :param threshold: Доля ошибок (от 0 до 1), при которой выключатель срабатывает.
+        :param min_requests: Минимум запросов в окне для срабатывания.
+        :param open_time: Начальная длительность паузы (в секундах).
+        :param max_open_time: Максимальная длительность паузы (в секундах).
+        """
+        self.name = name
+        self.threshold = threshold
+        self.min_requests = min_requests
+        self.base_open_time = open_time
+        self.max_open_time = max_open_time
+        self.open_time = open_time
+        self.outcomes = deque(maxlen=window)
+        self.state = CLOSED
+        self.opened_until = 0.0
+        self.trips = 0
+        self._probing = False
+
+    @property
+    def error_rate(self):
+        return self.outcomes.count(False) / len(self.outcomes) if self.outcomes else 0.0
+
+    async def wait(self):
+        """
+        Ждёт, пока запросы к хосту разрешены. В полуоткрытом состоянии пропускает один пробный запрос.
+        :return: True, если вызывающий выполняет пробный запрос (его результат передаётся в record с probe=True).
+        """
+        while True:
+            if self.state == CLOSED:
+                return False
+            if self.state == OPEN:
+                pause = self.opened_until - time.monotonic()
+                if pause > 0:
+                    await asyncio.sleep(pause)
+                    continue
+                self.state = HALF_OPEN
+            if not self._probing:
+                self._probing = True
+                return True
+            # Пробный запрос уже выполняется: ждём его результата
+            await asyncio.sleep(min(1.0, self.base_open_time))
+
+    def record(self, success, probe=False):
+        """
+        Учитывает результат запроса.
+        :param success: True — ответ получен (в том числе постоянная ошибка 4xx), False — временная ошибка,
+                        None — запрос прерван без результата.
+        :param probe: Результат пробного запроса (wait() вернул True).
+        """
+        if probe:
+            self._probing = False
+            if success:
+                self.state = CLOSED
+                self.outcomes.clear()
+                self.open_time = self.base_open_time
+                logger.info(f"Хост {self.name} снова отвечает, запросы возобновлены")
+            elif success is False:
+                self.open_time = min(self.max_open_time, self.open_time * 2)
+                self._open()
+            return
+
+        if success is None:
+            return
+        self.outcomes.append(success)
+        if self.state == CLOSED and len(self.outcomes) >= self.min_requests and self.error_rate >= self.threshold:
+            self._open()
+
+    def _open(self):
+        self.state = OPEN
+        self.opened_until = time.monotonic() + self.open_time
+        self.trips += 1
+        logger.warning(
+            f"Много ошибок от {self.name} ({100 * self.error_rate:.0f}% последних запросов): "
+            f"запросы приостановлены на {self.open_time:.0f} с"
+        )
@@ -0,0 +1,235 @@
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from urllib.parse import urlsplit
+
+from metro_parser.utils.logger import logger
+from metro_parser.config import (
+    MAX_CONCURRENCY,
+    MAX_CONCURRENCY_PER_HOST,
+    RATE_LIMIT,
+    RATE_LIMIT_MIN,
+    RATE_LIMIT_MAX,
+    LATENCY_TARGET,
+    AIMD_INCREASE,
+    AIMD_DECREASE,
+)
+
+
+def parse_retry_after(value):
+    """
+    Разбирает заголовок Retry-After.
+
+    :param value: Значение заголовка (число секунд или HTTP-дата).
+    :return: Задержка в секундах (float) или None, если заголовок отсутствует или некорректен.
+    """
+    if not value:
+        return None
+    value = value.strip()
+    if value.isdigit():
+        return float(value)
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class TokenBucket:
+    def __init__(self, rate, capacity=None):
+        """
+        Ограничитель скорости по алгоритму token bucket.
+
+        :param rate: Скорость пополнения (токенов в секунду).
+        :param capacity: Ёмкость корзины (максимальный всплеск запросов).
+        """
+        self.rate = rate
+        self.capacity = capacity or max(1.0, rate)
+        self.tokens = self.capacity
+        self.updated = time.monotonic()
+
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+
+    async def acquire(self):
+        """
+        Ждёт, пока в корзине появится токен, и забирает его.
+        """
+        while True:
+            self._refill()
+            if self.tokens >= 1:
+                self.tokens -= 1
+                return
+            await asyncio.sleep((1 - self.tokens) / self.rate)
+
+
+class AdaptiveSemaphore:
+    def __init__(self, limit):
+        """
+        Семафор, лимит которого можно менять во время работы.
+
+        :param limit: Начальное количество одновременных владельцев.
+        """
+        self.limit = limit
+        self.active = 0
+        self._condition = asyncio.Condition()
+
+    async def acquire(self):
+        async with self._condition:
+            await self._condition.wait_for(lambda: self.active < int(self.limit))
+            self.active += 1
+
+    async def release(self):
+        async with self._condition:
+            self.active -= 1
+            self._condition.notify_all()
+
+    async def set_limit(self, limit):
+        async with self._condition:
+            self.limit = limit
+            self._condition.notify_all()
+
+
+class HostState:
+    def __init__(self, rate, concurrency):
+        """
+        Состояние планировщика для одного хоста.
+
+        :param rate: Начальная скорость запросов (в секунду).
+        :param concurrency: Начальный лимит одновременных запросов.
+        """
+        self.bucket = TokenBucket(rate)
+        self.semaphore = AdaptiveSemaphore(concurrency)
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+
+
+class RequestScheduler:
+    def __init__(
+        self,
+        max_concurrency=MAX_CONCURRENCY,
+        max_concurrency_per_host=MAX_CONCURRENCY_PER_HOST,
+        rate=RATE_LIMIT,
+        min_rate=RATE_LIMIT_MIN,
+        max_rate=RATE_LIMIT_MAX,
+        latency_target=LATENCY_TARGET,
+        increase=AIMD_INCREASE,
+        decrease=AIMD_DECREASE,
+    ):
+        """
+        Планировщик запросов: общий и per-host лимит одновременных запросов,
+        token bucket на каждый хост и адаптация темпа по схеме AIMD.
+
+        Успешные быстрые ответы аддитивно увеличивают скорость и лимит соединений хоста,
+        ответы 429/5xx, сетевые ошибки и медленные ответы уменьшают их мультипликативно.
+        Retry-After приостанавливает все запросы к хосту на указанное время.
+
+        :param max_concurrency: Общий лимит одновременных запросов.
+        :param max_concurrency_per_host: Верхняя граница лимита запросов на один хост.
+        :param rate: Начальная скорость запросов к хосту (в секунду).
+        :param min_rate: Минимальная скорость запросов к хосту.
+        :param max_rate: Максимальная скорость запросов к хосту.
+        :param latency_target: Время ответа (в секундах), выше которого темп снижается.
+        :param increase: Прирост скорости (запросов в секунду) за секунду успешной работы.
+        :param decrease: Множитель скорости и лимита при перегрузке.
+        """
+        self.max_concurrency_per_host = max_concurrency_per_host
+        self.rate = rate
+        self.min_rate = min_rate
+        self.max_rate = max_rate
+        self.latency_target = latency_target
+        self.increase = increase
+        self.decrease = decrease
+        self.hosts = {}
+        self._global = AdaptiveSemaphore(max_concurrency)
+
+    def host_state(self, url, route=None):
+        """
+        Возвращает (создавая при необходимости) состояние хоста для URL.
+        :param url: URL запроса.
+        :param route: Маршрут запроса (например, URL прокси): темп подбирается отдельно для каждой пары хост-маршрут,
+                      так как сайт ограничивает скорость по IP.
+        :return: HostState.
+        """
+        host = urlsplit(url).netloc
+        key = (host, route) if route else host
+        state = self.hosts.get(key)
+        if state is None:
+            state = HostState(self.rate, self.max_concurrency_per_host)
+            self.hosts[key] = state
+        return state
+
+    @asynccontextmanager
+    async def slot(self, url, route=None):
+        """
+        Контекстный менеджер, внутри которого разрешено выполнить запрос к URL.
+        :param url: URL запроса.
+        :param route: Маршрут запроса (см. host_state).
+        """
+        state = self.host_state(url, route)
+        while True:
+            pause = state.paused_until - time.monotonic()
+            if pause <= 0:
+                break
+            await asyncio.sleep(pause)
+
+        await state.bucket.acquire()
+        await self._global.acquire()
+        await state.semaphore.acquire()
+        try:
+            yield
+        finally:
+            await state.semaphore.release()
+            await self._global.release()
+
+    async def record(self, url, status, latency, retry_after=None, route=None):
+        """
+        Учитывает результат запроса и подстраивает темп для хоста.
+
+        :param url: URL запроса.
+        :param status: HTTP-статус ответа или None при сетевой ошибке/тайм-ауте.
+        :param latency: Время выполнения запроса (в секундах).
+        :param retry_after: Задержка из заголовка Retry-After (в секундах).
+        :param route: Маршрут запроса (см. host_state).
+        """
+        state = self.host_state(url, route)
+        if retry_after:
+            state.paused_until = max(state.paused_until, time.monotonic() + retry_after)
+            logger.warning(f"Сервер просит подождать {retry_after:.0f} с: {urlsplit(url).netloc}")
+
+        overloaded = status is None or status == 429 or status >= 500
+        if overloaded or latency > self.latency_target:
+            await self._slow_down(state)
+        elif status < 400:
+            await self._speed_up(state)
+
+    async def _speed_up(self, state):
+        bucket = state.bucket
+        # Аддитивный рост: за секунду успешной работы скорость растёт примерно на increase
+        bucket.rate = min(self.max_rate, bucket.rate + self.increase / bucket.rate)
+        bucket.capacity = max(1.0, bucket.rate)
+        limit = state.semaphore.limit
+        if limit < self.max_concurrency_per_host:
+            await state.semaphore.set_limit(min(self.max_concurrency_per_host, limit + 1 / limit))
+
+    async def _slow_down(self, state):
+        now = time.monotonic()
+        # Ответы на запросы, отправленные до снижения, не должны снижать темп повторно
+        if now - state.last_decrease < self.latency_target:
+            return
+        state.last_decrease = now
+        bucket = state.bucket
+        bucket.rate = max(self.min_rate, bucket.rate * self.decrease)
+        bucket.capacity = max(1.0, bucket.rate)
+        bucket.tokens = min(bucket.tokens, bucket.capacity)
+        await state.semaphore.set_limit(max(1.0, state.semaphore.limit * self.decrease))
+        logger.info(
+            f"Снижаем темп запросов: {bucket.rate:.2f} запросов/с, "
+            f"до {int(state.semaphore.limit)} одновременных"
+        )
@@ -0,0 +1,118 @@
+import json
+import os
+import sqlite3
+import time
+
+from metro_parser.config import SNAPSHOT_FILE, STATE_CHECKPOINT_INTERVAL
+
+
+class ProductSnapshot:
+    def __init__(self, category_url, filepath=SNAPSHOT_FILE, checkpoint_interval=STATE_CHECKPOINT_INTERVAL):
+        """
+        Снимок товаров категории с прошлого запуска: хеш значимого фрагмента страницы
+        и извлечённые поля каждого товара. Используется инкрементальным режимом.
+
+        :param category_url: URL категории (снимок хранится отдельно для каждой категории).
+        :param filepath: Путь к файлу базы данных.
+        :param checkpoint_interval: Интервал фиксации изменений (в секундах).
+        """
+        self.category_url = category_url
+        self.filepath = filepath
+        self.checkpoint_interval = checkpoint_interval
+        self.connection = None
+        self._last_checkpoint = time.monotonic()
+
+    def open(self):
+        os.makedirs(os.path.dirname(self.filepath), exist_ok=True)
+        self.connection = sqlite3.connect(self.filepath)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(
+            """
+            CREATE TABLE IF NOT EXISTS products (
+                category TEXT NOT NULL,
+                link TEXT NOT NULL,
+                content_hash TEXT NOT NULL,
+                product TEXT NOT NULL,
+                updated_at REAL NOT NULL,
+                PRIMARY KEY (category, link)
+            )
+            """
+        )
+        return self
+
+    def close(self):
+        if self.connection:
+            self.connection.commit()
+            self.connection.close()
+            self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def get(self, link):
+        """
+        :param link: URL товара.
+        :return: Кортеж (хеш фрагмента, товар) с прошлого запуска или None.
+        """
+        row = self.connection.execute(
+            "SELECT content_hash, product FROM products WHERE category = ? AND link = ?", (self.category_url, link)
+        ).fetchone()
+        if row is None:
+            return None
+        return row[0], json.loads(row[1])
+
+    def put(self, link, content_hash, product):
+        """
+        Сохраняет товар в снимок.
+        :param link: URL товара.
+        :param content_hash: Хеш значимого фрагмента страницы.
+        :param product: Словарь товара.
+        """
+        self.connection.execute(
+            "INSERT OR REPLACE INTO products (category, link, content_hash, product, updated_at) VALUES (?, ?, ?, ?, ?)",
+            (self.category_url, link, content_hash, json.dumps(product, ensure_ascii=False), time.time()),
+        )
+        if time.monotonic() - self._last_checkpoint >= self.checkpoint_interval:
+            self.connection.commit()
+            self._last_checkpoint = time.monotonic()
+
+    def items(self):
+        """
+        :return: Генератор пар (ссылка, товар) из снимка категории.
+        """
+        rows = self.connection.execute("SELECT link, product FROM products WHERE category = ?", (self.category_url,))
+        for link, product in rows:
+            yield link, json.loads(product)
+
+    def remove(self, links):
+        """
+        Удаляет товары из снимка.
+        :param links: Ссылки на товары.
+        """
+        self.connection.executemany(
+            "DELETE FROM products WHERE category = ? AND link = ?", [(self.category_url, link) for link in links]
+        )
+        self.connection.commit()
+
+
+def diff_products(previous, current):
+    """
+    Сравнивает товар с его версией из снимка.
+    :param previous: Товар с прошлого запуска или None.
+    :param current: Текущий товар.
+    :return: Запись изменения для файла изменений или None, если поля не изменились.
+    """
+    if previous is None:
+        return {"change": "added", "id": current.get("id"), "link": current.get("link"), "product": current}
+
+    fields = {
+        key: {"old": previous.get(key), "new": value}
+        for key, value in current.items()
+        if previous.get(key) != value
+    }
+    if not fields:
+        return None
+    return {"change": "changed", "id": current.get("id"), "link": current.get("link"), "fields": fields, "product": current}
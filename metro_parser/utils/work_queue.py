@@ -0,0 +1,534 @@
+import json
+import os
+import sqlite3
+import threading
+import time
+
+from collections import Counter
+
+try:
+    import redis
+except ImportError:  # redis — необязательная зависимость (очередь на нескольких машинах)
+    redis = None
+
+from metro_parser.config import WORK_QUEUE, WORK_LEASE_TIMEOUT, WORK_MAX_ATTEMPTS
+
+QUEUED = "queued"
+LEASED = "leased"
+DONE = "done"
+FAILED = "failed"
+STATUSES = (QUEUED, LEASED, DONE, FAILED)
+
+
+class SQLiteWorkQueue:
+    def __init__(self, filepath=WORK_QUEUE, lease_timeout=WORK_LEASE_TIMEOUT, max_attempts=WORK_MAX_ATTEMPTS):
+        """
+        Общая очередь ссылок на товары в файле SQLite для процессов на одной машине.
+
+        Воркер берёт ссылки в аренду на lease_timeout секунд и продлевает её, пока обрабатывает их.
+        Аренда, которую не продлили (воркер упал или завис), истекает, и ссылка возвращается в очередь;
+        после max_attempts выдач ссылка считается неудачной. Результаты (товары) хранятся в той же базе.
+
+        :param filepath: Путь к файлу базы данных.
+        :param lease_timeout: Длительность аренды (в секундах).
+        :param max_attempts: Максимум выдач одной ссылки.
+        """
+        self.filepath = filepath
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.connection = None
+        # Воркер вызывает методы очереди из потоков (asyncio.to_thread): соединение одно, запросы — по очереди
+        self._lock = threading.Lock()
+
+    def open(self):
+        os.makedirs(os.path.dirname(os.path.abspath(self.filepath)), exist_ok=True)
+        # Транзакции открываются явно; timeout — ожидание блокировки, пока пишет другой процесс
+        self.connection = sqlite3.connect(self.filepath, timeout=30, isolation_level=None, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.executescript(
+            """
+            CREATE TABLE IF NOT EXISTS tasks (
+                url TEXT PRIMARY KEY,
+                status TEXT NOT NULL,
+                worker TEXT,
+                lease_expires REAL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                error TEXT,
+                updated_at REAL NOT NULL
+            );
+            CREATE INDEX IF NOT EXISTS tasks_status ON tasks (status, lease_expires);
+            CREATE TABLE IF NOT EXISTS results (
+                url TEXT PRIMARY KEY,
+                product TEXT NOT NULL
+            );
+            CREATE TABLE IF NOT EXISTS meta (
+                key TEXT PRIMARY KEY,
+                value TEXT
+            );
+            """
+        )
+        return self
+
+    def close(self):
+        # Ждёт запрос, который ещё выполняется в потоке отменённой задачи воркера
+        with self._lock:
+            if self.connection:
+                self.connection.close()
+                self.connection = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def _transaction(self, statements):
+        """
+        Выполняет функцию statements(cursor) в транзакции с блокировкой записи.
+        """
+        with self._lock:
+            cursor = self.connection.cursor()
+            cursor.execute("BEGIN IMMEDIATE")
+            try:
+                result = statements(cursor)
+            except BaseException:
+                cursor.execute("ROLLBACK")
+                raise
+            cursor.execute("COMMIT")
+            return result
+
+    def reset(self):
+        """
+        Очищает очередь и результаты перед новым запуском.
+        """
+        self._transaction(
+            lambda cursor: [cursor.execute(f"DELETE FROM {table}") for table in ("tasks", "results", "meta")]
+        )
+
+    def push(self, urls):
+        """
+        Ставит ссылки в очередь. Уже известные ссылки (в том числе обработанные) пропускаются.
+        :param urls: Ссылки на товары.
+        :return: Количество новых ссылок.
+        """
+        now = time.time()
+        return self._transaction(
+            lambda cursor: cursor.executemany(
+                "INSERT OR IGNORE INTO tasks (url, status, updated_at) VALUES (?, ?, ?)",
+                [(url, QUEUED, now) for url in urls],
+            ).rowcount
+        )
+
+    def add_result(self, url, product):
+        """
+        Сохраняет готовый товар без постановки в очередь (данные взяты со страницы категории).
+        """
+        now = time.time()
+
+        def statements(cursor):
+            cursor.execute(
+                "INSERT OR REPLACE INTO tasks (url, status, updated_at) VALUES (?, ?, ?)", (url, DONE, now)
+            )
+            cursor.execute(
+                "INSERT OR REPLACE INTO results (url, product) VALUES (?, ?)",
+                (url, json.dumps(product, ensure_ascii=False)),
+            )
+
+        self._transaction(statements)
+
+    def lease(self, worker, count):
+        """
+        Выдаёт воркеру до count ссылок в аренду. Сначала возвращает в очередь ссылки с истёкшей арендой.
+        :param worker: Идентификатор воркера.
+        :param count: Максимум ссылок.
+        :return: Список ссылок.
+        """
+        now = time.time()
+
+        def statements(cursor):
+            self._expire(cursor, now)
+            urls = [
+                row[0]
+                for row in cursor.execute(
+                    "SELECT url FROM tasks WHERE status = ? ORDER BY rowid LIMIT ?", (QUEUED, count)
+                )
+            ]
+            cursor.executemany(
+                "UPDATE tasks SET status = ?, worker = ?, lease_expires = ?, attempts = attempts + 1, updated_at = ? "
+                "WHERE url = ?",
+                [(LEASED, worker, now + self.lease_timeout, now, url) for url in urls],
+            )
+            return urls
+
+        return self._transaction(statements)
+
+    def _expire(self, cursor, now):
+        cursor.execute(
+            "UPDATE tasks SET status = CASE WHEN attempts >= ? THEN ? ELSE ? END, worker = NULL, "
+            "error = 'Истекла аренда', updated_at = ? WHERE status = ? AND lease_expires < ?",
+            (self.max_attempts, FAILED, QUEUED, now, LEASED, now),
+        )
+
+    def extend(self, worker, urls):
+        """
+        Продлевает аренду ссылок, которые воркер ещё обрабатывает.
+        """
+        now = time.time()
+        self._transaction(
+            lambda cursor: cursor.executemany(
+                "UPDATE tasks SET lease_expires = ? WHERE url = ? AND worker = ? AND status = ?",
+                [(now + self.lease_timeout, url, worker, LEASED) for url in urls],
+            )
+        )
+
+    def complete(self, url, worker, product):
+        """
+        Сохраняет товар и отмечает ссылку обработанной.
+        Если аренда истекла или перешла к другому воркеру, ничего не делает.
+        :param url: Ссылка.
+        :param worker: Идентификатор воркера.
+        :param product: Словарь товара.
+        :return: True, если товар сохранён.
+        """
+        now = time.time()
+
+        def statements(cursor):
+            cursor.execute(
+                "UPDATE tasks SET status = ?, worker = NULL, updated_at = ? WHERE url = ? AND worker = ? AND status = ?",
+                (DONE, now, url, worker, LEASED),
+            )
+            if not cursor.rowcount:
+                return False
+            cursor.execute(
+                "INSERT OR REPLACE INTO results (url, product) VALUES (?, ?)",
+                (url, json.dumps(product, ensure_ascii=False)),
+            )
+            return True
+
+        return self._transaction(statements)
+
+    def fail(self, url, worker, error, retry=True):
+        """
+        Возвращает ссылку в очередь после ошибки или отмечает её неудачной, если попытки исчерпаны.
+        Если аренда уже перешла к другому воркеру, ничего не делает.
+        :param retry: False — ошибка постоянная (например, 404), ссылка сразу отмечается неудачной.
+        """
+        now = time.time()
+        self._transaction(
+            lambda cursor: cursor.execute(
+                "UPDATE tasks SET status = CASE WHEN ? OR attempts >= ? THEN ? ELSE ? END, worker = NULL, error = ?, "
+                "updated_at = ? WHERE url = ? AND worker = ? AND status = ?",
+                (not retry, self.max_attempts, FAILED, QUEUED, str(error), now, url, worker, LEASED),
+            )
+        )
+
+    def release(self, worker):
+        """
+        Возвращает в очередь все ссылки воркера без учёта попытки (воркер остановлен).
+        """
+        now = time.time()
+        self._transaction(
+            lambda cursor: cursor.execute(
+                "UPDATE tasks SET status = ?, worker = NULL, attempts = attempts - 1, updated_at = ? "
+                "WHERE worker = ? AND status = ?",
+                (QUEUED, now, worker, LEASED),
+            )
+        )
+
+    def set_discovery_done(self, done=True):
+        """
+        Отмечает, что координатор поставил в очередь все ссылки.
+        """
+        self._transaction(
+            lambda cursor: cursor.execute(
+                "INSERT OR REPLACE INTO meta (key, value) VALUES ('discovery_done', ?)", ("1" if done else "0",)
+            )
+        )
+
+    def finished(self):
+        """
+        :return: True, если все ссылки поставлены в очередь и обработаны (успешно или нет).
+        """
+        with self._lock:
+            row = self.connection.execute("SELECT value FROM meta WHERE key = 'discovery_done'").fetchone()
+            if not row or row[0] != "1":
+                return False
+            return self.connection.execute(
+                "SELECT 1 FROM tasks WHERE status IN (?, ?) LIMIT 1", (QUEUED, LEASED)
+            ).fetchone() is None
+
+    def stats(self):
+        """
+        :return: Словарь статус -> количество ссылок.
+        """
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(self.connection.execute("SELECT status, COUNT(*) FROM tasks GROUP BY status"))
+        return counts
+
+    def failures(self):
+        """
+        :return: Генератор пар (ссылка, последняя ошибка) для неудачных ссылок.
+        """
+        yield from self.connection.execute("SELECT url, error FROM tasks WHERE status = ?", (FAILED,))
+
+    def results(self):
+        """
+        :return: Генератор товаров в порядке сохранения.
+        """
+        for (product,) in self.connection.execute("SELECT product FROM results ORDER BY rowid"):
+            yield json.loads(product)
+
+
+class RedisWorkQueue:
+    def __init__(
+        self, url, lease_timeout=WORK_LEASE_TIMEOUT, max_attempts=WORK_MAX_ATTEMPTS, prefix="metro_parser", client=None
+    ):
+        """
+        Общая очередь ссылок на товары в Redis (или совместимом сервере) для воркеров на нескольких машинах.
+        Поведение такое же, как у SQLiteWorkQueue. Используются только базовые команды
+        (списки, хеши, отсортированные множества, транзакции WATCH/MULTI), поэтому подходят и совместимые серверы.
+
+        Ключи: <prefix>:queue — список ожидающих ссылок, <prefix>:leases — аренды (ссылка -> срок),
+        <prefix>:status, :workers, :attempts, :errors, :results — хеши по ссылке, <prefix>:order — порядок результатов,
+        <prefix>:meta — флаги.
+
+        :param url: redis://host:port/db.
+        :param lease_timeout: Длительность аренды (в секундах).
+        :param max_attempts: Максимум выдач одной ссылки.
+        :param prefix: Префикс ключей (несколько очередей на одном сервере).
+        :param client: Готовый клиент Redis (например, для тестов); иначе создаётся по url.
+        """
+        if client is None and redis is None:
+            raise RuntimeError("Для очереди в Redis установите пакет redis: pip install redis")
+        self.url = url
+        self.lease_timeout = lease_timeout
+        self.max_attempts = max_attempts
+        self.prefix = prefix
+        self.client = client
+        self._own_client = client is None
+
+    def _key(self, name):
+        return f"{self.prefix}:{name}"
+
+    def open(self):
+        if self.client is None:
+            self.client = redis.Redis.from_url(self.url, decode_responses=True)
+        return self
+
+    def close(self):
+        if self._own_client and self.client is not None:
+            self.client.close()
+            self.client = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+    def reset(self):
+        names = ("queue", "leases", "status", "workers", "attempts", "errors", "results", "order", "meta")
+        self.client.delete(*(self._key(name) for name in names))
+
+    def push(self, urls):
+        status = self._key("status")
+        urls = list(dict.fromkeys(urls))
+        added = 0
+        for start in range(0, len(urls), 1000):
+            chunk = urls[start : start + 1000]
+
+            def add(pipe):
+                # Известные ссылки отсекаются, а новые ставятся в очередь в одной транзакции,
+                # даже если ссылки ставят несколько процессов
+                new = [url for url, value in zip(chunk, pipe.hmget(status, chunk)) if value is None]
+                pipe.multi()
+                if new:
+                    pipe.hset(status, mapping=dict.fromkeys(new, QUEUED))
+                    pipe.lpush(self._key("queue"), *new)
+                return len(new)
+
+            added += self.client.transaction(add, status, value_from_callable=True)
+        return added
+
+    def _set_result(self, pipe, url, product):
+        pipe.hset(self._key("results"), url, json.dumps(product, ensure_ascii=False))
+        # Порядок товаров — по времени первого результата; повторный результат той же ссылки его не меняет
+        pipe.zadd(self._key("order"), {url: time.time()}, nx=True)
+        pipe.hset(self._key("status"), url, DONE)
+
+    def add_result(self, url, product):
+        with self.client.pipeline() as pipe:
+            self._set_result(pipe, url, product)
+            pipe.zrem(self._key("leases"), url)
+            pipe.hdel(self._key("workers"), url)
+            pipe.execute()
+
+    def _requeue(self, pipe, url, attempts, error=None, retry=True):
+        """
+        Добавляет в транзакцию возврат ссылки в очередь или отметку о неудаче, если попытки исчерпаны
+        или повтор не нужен (retry=False).
+        """
+        if error is not None:
+            pipe.hset(self._key("errors"), url, str(error))
+        if not retry or attempts >= self.max_attempts:
+            pipe.hset(self._key("status"), url, FAILED)
+        else:
+            pipe.hset(self._key("status"), url, QUEUED)
+            pipe.lpush(self._key("queue"), url)
+
+    def _end_lease(self, url, update, worker=None, expired_at=None):
+        """
+        Снимает аренду ссылки и в той же транзакции (WATCH/MULTI/EXEC) меняет её состояние,
+        поэтому аренду снимает только один процесс, и ссылка не бывает ни в аренде, ни в очереди.
+        :param update: Функция update(pipe, attempts), добавляющая в транзакцию новое состояние ссылки.
+        :param worker: Снимать, только если аренда принадлежит этому воркеру (None — любому).
+        :param expired_at: Снимать, только если аренда истекла к этому времени (None — в любом случае).
+        :return: True, если аренда снята.
+        """
+        leases = self._key("leases")
+        workers = self._key("workers")
+
+        def end(pipe):
+            expires = pipe.zscore(leases, url)
+            if expires is None or (expired_at is not None and expires > expired_at):
+                return False
+            if worker is not None and pipe.hget(workers, url) != worker:
+                return False
+            attempts = int(pipe.hget(self._key("attempts"), url) or 0)
+            pipe.multi()
+            pipe.zrem(leases, url)
+            pipe.hdel(workers, url)
+            update(pipe, attempts)
+            return True
+
+        return self.client.transaction(end, leases, workers, value_from_callable=True)
+
+    def _expire(self, now):
+        for url in self.client.zrangebyscore(self._key("leases"), "-inf", now):
+            self._end_lease(
+                url,
+                lambda pipe, attempts, url=url: self._requeue(pipe, url, attempts, "Истекла аренда"),
+                expired_at=now,
+            )
+
+    def lease(self, worker, count):
+        now = time.time()
+        self._expire(now)
+        if count <= 0:
+            return []
+        queue = self._key("queue")
+
+        def claim(pipe):
+            # Ссылки снимаются с очереди и получают аренду в одной транзакции (WATCH/MULTI/EXEC):
+            # между ними нет момента, когда ссылки нет ни в очереди, ни в арендах. Если очередь
+            # изменилась после чтения, redis-py повторяет транзакцию.
+            urls = pipe.lrange(queue, -count, -1)[::-1]
+            pipe.multi()
+            if urls:
+                pipe.ltrim(queue, 0, -len(urls) - 1)
+                pipe.zadd(self._key("leases"), {url: now + self.lease_timeout for url in urls})
+                pipe.hset(self._key("status"), mapping=dict.fromkeys(urls, LEASED))
+                pipe.hset(self._key("workers"), mapping=dict.fromkeys(urls, worker))
+                for url in urls:
+                    pipe.hincrby(self._key("attempts"), url, 1)
+            return urls
+
+        return self.client.transaction(claim, queue, value_from_callable=True)
+
+    def _owned(self, url, worker):
+        return self.client.hget(self._key("workers"), url) == worker
+
+    def extend(self, worker, urls):
+        expires = time.time() + self.lease_timeout
+        for url in urls:
+            if self._owned(url, worker):
+                # XX: не создаёт аренду заново, если она уже истекла и снята
+                self.client.zadd(self._key("leases"), {url: expires}, xx=True)
+
+    def complete(self, url, worker, product):
+        # Результат устаревшей аренды (истекла или перешла к другому воркеру) не сохраняется
+        return self._end_lease(url, lambda pipe, attempts: self._set_result(pipe, url, product), worker=worker)
+
+    def fail(self, url, worker, error, retry=True):
+        self._end_lease(url, lambda pipe, attempts: self._requeue(pipe, url, attempts, error, retry), worker=worker)
+
+    def release(self, worker):
+        def requeue(url):
+            def update(pipe, attempts):
+                # Остановка воркера не засчитывается как попытка
+                pipe.hincrby(self._key("attempts"), url, -1)
+                self._requeue(pipe, url, attempts - 1)
+
+            return update
+
+        for url, owner in self.client.hgetall(self._key("workers")).items():
+            if owner == worker:
+                self._end_lease(url, requeue(url), worker=worker)
+
+    def set_discovery_done(self, done=True):
+        self.client.hset(self._key("meta"), "discovery_done", "1" if done else "0")
+
+    def recover(self):
+        """
+        Возвращает в очередь ссылки со статусом "в очереди" или "в аренде", которых нет ни в списке,
+        ни в арендах. Переходы состояний выполняются транзакциями, поэтому такие ссылки появляются
+        только в несогласованных данных (например, оставленных прежней версией очереди).
+        :return: Количество возвращённых ссылок.
+        """
+        # Очередь, аренды и статусы читаются одной транзакцией — согласованный снимок
+        with self.client.pipeline() as pipe:
+            pipe.lrange(self._key("queue"), 0, -1)
+            pipe.zrange(self._key("leases"), 0, -1)
+            pipe.hgetall(self._key("status"))
+            queued, leased, statuses = pipe.execute()
+        queued, leased = set(queued), set(leased)
+        lost = [
+            url
+            for url, status in statuses.items()
+            if status in (QUEUED, LEASED) and url not in queued and url not in leased
+        ]
+        for url in lost:
+            attempts = int(self.client.hget(self._key("attempts"), url) or 0)
+            with self.client.pipeline() as pipe:
+                pipe.hdel(self._key("workers"), url)
+                self._requeue(pipe, url, attempts)
+                pipe.execute()
+        return len(lost)
+
+    def finished(self):
+        if self.client.hget(self._key("meta"), "discovery_done") != "1":
+            return False
+        if self.client.llen(self._key("queue")) or self.client.zcard(self._key("leases")):
+            return False
+        # Очередь и аренды пусты: проверяем, не потерялись ли ссылки
+        return self.recover() == 0
+
+    def stats(self):
+        counts = dict.fromkeys(STATUSES, 0)
+        counts.update(Counter(self.client.hvals(self._key("status"))))
+        return counts
+
+    def failures(self):
+        errors = self.client.hgetall(self._key("errors"))
+        for url, status in self.client.hgetall(self._key("status")).items():
+            if status == FAILED:
+                yield url, errors.get(url)
+
+    def results(self):
+        order = self.client.zrange(self._key("order"), 0, -1)
+        for start in range(0, len(order), 1000):
+            for product in self.client.hmget(self._key("results"), order[start:start + 1000]):
+                if product is not None:
+                    yield json.loads(product)
+
+
+def open_work_queue(location=WORK_QUEUE, **kwargs):
+    """
+    Создаёт очередь по адресу: redis://... — RedisWorkQueue, иначе путь к файлу SQLite.
+    :param location: Путь к файлу или URL Redis.
+    :param kwargs: Остальные параметры очереди.
+    :return: Открытая очередь (закрывается через with или close()).
+    """
+    if location.startswith(("redis://", "rediss://", "unix://")):
+        return RedisWorkQueue(location, **kwargs).open()
+    return SQLiteWorkQueue(location, **kwargs).open()
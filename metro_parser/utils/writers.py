@@ -0,0 +1,259 @@
+import os
+import json
+
+try:
+    import pyarrow
+    import pyarrow.parquet
+except ImportError:  # pyarrow — необязательная зависимость
+    pyarrow = None
+
+from metro_parser.utils.file_handler import FileHandler
+from metro_parser.config import OUTPUT_JSONL_FILE, OUTPUT_FORMATS, PARQUET_ROW_GROUP_SIZE
+
+
+class JsonLinesWriter:
+    def __init__(self, filepath=OUTPUT_JSONL_FILE, archive=True, append=False, compression=None, lazy=False):
+        """
+        Потоковая запись товаров в файл JSON Lines: одна строка на товар.
+        Каждая строка несжатого файла сбрасывается на диск сразу, поэтому при падении процесса
+        уже обработанные товары не теряются.
+
+        :param filepath: Путь к файлу.
+        :param archive: Флаг, указывающий, нужно ли архивировать старый файл.
+        :param append: Дописывать в существующий файл вместо создания нового (только без сжатия).
+        :param compression: Сжатие: None, "gzip" или "zstd".
+        :param lazy: Архивировать старый файл и открывать новый только при записи первого объекта:
+                     если ничего не записано, прежний файл остаётся без изменений.
+        """
+        if append and compression:
+            raise ValueError("Дозапись в сжатый файл не поддерживается.")
+        self.filepath = filepath
+        self.archive = archive
+        self.append = append
+        self.compression = compression
+        self.lazy = lazy
+        self.count = 0
+        self._file = None
+
+    def open(self):
+        if self.append:
+            # Недописанная строка мешает прочитать файл перед дозаписью, поэтому обрезается сразу
+            self._truncate_partial_line()
+        if not self.lazy:
+            self._open_file()
+        return self
+
+    def _open_file(self):
+        if not self.append and self.archive and os.path.exists(self.filepath):
+            FileHandler._archive_file(self.filepath)
+        if self.compression:
+            self._file = FileHandler.open_file(self.filepath, "wt", self.compression)
+        else:
+            self._file = open(self.filepath, "a" if self.append else "w", encoding="utf-8")
+
+    def _truncate_partial_line(self):
+        """
+        Обрезает недописанную последнюю строку, оставшуюся после аварийного завершения.
+        """
+        if not os.path.exists(self.filepath):
+            return
+        with open(self.filepath, "rb+") as f:
+            end = f.seek(0, os.SEEK_END)
+            position = end
+            while position > 0:
+                start = max(0, position - 65536)
+                f.seek(start)
+                chunk = f.read(position - start)
+                if position == end and chunk.endswith(b"\n"):
+                    return
+                newline = chunk.rfind(b"\n")
+                if newline != -1:
+                    f.truncate(start + newline + 1)
+                    return
+                position = start
+            f.truncate(0)
+
+    def write(self, item):
+        """
+        Записывает один объект строкой JSON.
+        :param item: Данные для сохранения (dict).
+        """
+        if self._file is None:
+            self._open_file()
+        self._file.write(json.dumps(item, ensure_ascii=False) + "\n")
+        if not self.compression:
+            # Сброс каждой строки сжатого потока заметно ухудшает степень сжатия
+            self._file.flush()
+        self.count += 1
+
+    def close(self):
+        if self._file:
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+class JsonArrayWriter:
+    def __init__(self, filepath, archive=True):
+        """
+        Потоковая запись JSON-массива с отступами. Формат совпадает с FileHandler.save_json.
+
+        :param filepath: Путь к файлу.
+        :param archive: Флаг, указывающий, нужно ли архивировать старый файл.
+        """
+        self.filepath = filepath
+        self.archive = archive
+        self.count = 0
+        self._file = None
+
+    def open(self):
+        if self.archive and os.path.exists(self.filepath):
+            FileHandler._archive_file(self.filepath)
+        self._file = open(self.filepath, "w", encoding="utf-8")
+        self._file.write("[")
+        return self
+
+    def write(self, item):
+        item_json = json.dumps(item, ensure_ascii=False, indent=4).replace("\n", "\n    ")
+        self._file.write(("," if self.count else "") + "\n    " + item_json)
+        self.count += 1
+
+    def close(self):
+        if self._file:
+            self._file.write("\n]" if self.count else "]")
+            self._file.close()
+            self._file = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+def product_schema():
+    """
+    Схема Parquet для товаров: цены хранятся типизированными столбцами float64.
+    :return: pyarrow.Schema.
+    """
+    price_line = pyarrow.struct([("actual_price", pyarrow.float64()), ("old_price", pyarrow.float64())])
+    return pyarrow.schema(
+        [
+            ("id", pyarrow.string()),
+            ("name", pyarrow.string()),
+            ("brand", pyarrow.string()),
+            ("current_price", pyarrow.float64()),
+            ("old_price", pyarrow.float64()),
+            ("discount", pyarrow.string()),
+            ("offline_prices", pyarrow.list_(price_line)),
+            ("link", pyarrow.string()),
+            ("categories", pyarrow.list_(pyarrow.string())),
+        ]
+    )
+
+
+class ParquetWriter:
+    def __init__(self, filepath, archive=True, row_group_size=PARQUET_ROW_GROUP_SIZE):
+        """
+        Потоковая запись товаров в колоночный файл Parquet (сжатие zstd).
+        Товары копятся в памяти группами по row_group_size строк.
+
+        :param filepath: Путь к файлу.
+        :param archive: Флаг, указывающий, нужно ли архивировать старый файл.
+        :param row_group_size: Количество строк в группе строк.
+        """
+        if pyarrow is None:
+            raise RuntimeError("Для вывода в Parquet установите пакет pyarrow: pip install pyarrow")
+        self.filepath = filepath
+        self.archive = archive
+        self.row_group_size = row_group_size
+        self.schema = product_schema()
+        self.count = 0
+        self._rows = []
+        self._writer = None
+
+    def open(self):
+        if self.archive and os.path.exists(self.filepath):
+            FileHandler._archive_file(self.filepath)
+        self._writer = pyarrow.parquet.ParquetWriter(self.filepath, self.schema, compression="zstd")
+        return self
+
+    def write(self, item):
+        self._rows.append(item)
+        self.count += 1
+        if len(self._rows) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if self._rows:
+            self._writer.write_table(pyarrow.Table.from_pylist(self._rows, schema=self.schema))
+            self._rows = []
+
+    def close(self):
+        if self._writer:
+            self._flush()
+            self._writer.close()
+            self._writer = None
+
+    def __enter__(self):
+        return self.open()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        self.close()
+
+
+# Форматы результата: фабрика writer'а по пути к файлу
+OUTPUT_WRITERS = {
+    "json": lambda filepath: JsonArrayWriter(filepath),
+    "jsonl": lambda filepath: JsonLinesWriter(filepath),
+    "jsonl.gz": lambda filepath: JsonLinesWriter(filepath, compression="gzip"),
+    "jsonl.zst": lambda filepath: JsonLinesWriter(filepath, compression="zstd"),
+    "parquet": lambda filepath: ParquetWriter(filepath),
+}
+
+
+def create_writer(output_format, filepath):
+    """
+    Создаёт writer для формата результата.
+    :param output_format: Ключ OUTPUT_WRITERS.
+    :param filepath: Путь к файлу.
+    :return: Writer с методами open/write/close.
+    """
+    if output_format not in OUTPUT_WRITERS:
+        raise ValueError(f"Неизвестный формат результата: {output_format}. Допустимые: {', '.join(OUTPUT_WRITERS)}")
+    return OUTPUT_WRITERS[output_format](filepath)
+
+
+def export_outputs(source=OUTPUT_JSONL_FILE, formats=OUTPUT_FORMATS):
+    """
+    Собирает итоговые файлы из потокового файла JSON Lines за один проход по нему.
+    Файлы называются как исходный, но с расширением формата (output.jsonl -> output.parquet).
+
+    :param source: Путь к файлу JSON Lines.
+    :param formats: Форматы результата (ключи OUTPUT_WRITERS); "jsonl" пропускается — это сам исходный файл.
+    :return: Словарь формат -> путь к файлу.
+    """
+    base = source[: -len(".jsonl")] if source.endswith(".jsonl") else source
+    writers = {
+        output_format: create_writer(output_format, f"{base}.{output_format}")
+        for output_format in formats
+        if output_format != "jsonl"
+    }
+    if not writers:
+        return {}
+
+    try:
+        for writer in writers.values():
+            writer.open()
+        for item in FileHandler.read_jsonl(source):
+            for writer in writers.values():
+                writer.write(item)
+    finally:
+        for writer in writers.values():
+            writer.close()
+    return {output_format: writer.filepath for output_format, writer in writers.items()}
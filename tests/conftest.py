@@ -0,0 +1,56 @@
+import asyncio
+import os
+import shutil
+import socket
+import tempfile
+
+import pytest
+
+# Папка данных задаётся до импорта metro_parser: пути в config.py вычисляются при импорте
+DATA_DIR = tempfile.mkdtemp(prefix="metro_parser_tests_")
+os.environ["METRO_PARSER_DATA_DIR"] = DATA_DIR
+
+from benchmarks.stub_server import start_stub_server  # noqa: E402
+from metro_parser.config import LOGS_DIR, OUTPUT_DIR  # noqa: E402
+
+
+@pytest.fixture
+def data_dir():
+    """
+    Пустая папка данных (кроме логов, файл которых открыт логгером) для каждого теста.
+    """
+    for name in os.listdir(DATA_DIR):
+        path = os.path.join(DATA_DIR, name)
+        if path == LOGS_DIR:
+            continue
+        if os.path.isdir(path):
+            shutil.rmtree(path)
+        else:
+            os.remove(path)
+    os.makedirs(OUTPUT_DIR, exist_ok=True)
+    return DATA_DIR
+
+
+@pytest.fixture
+def with_stub_server(data_dir):
+    """
+    :return: Функция run(make_app, crawl): запускает stub-сервер (приложение make_app()) и корутинную
+             функцию crawl(base_url) в одном цикле событий и возвращает её результат.
+             Приложение aiohttp привязывается к циклу событий, поэтому создаётся на каждый запуск,
+             а порт один на тест: состояние парсинга хранится по URL категории.
+    """
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    def run(make_app, crawl):
+        async def main():
+            runner, base_url = await start_stub_server(make_app(), port=port)
+            try:
+                return await crawl(base_url)
+            finally:
+                await runner.cleanup()
+
+        return asyncio.run(main())
+
+    return run
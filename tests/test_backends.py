@@ -0,0 +1,28 @@
+import pytest
+
+from benchmarks.bench_parser_backends import available_backends, golden_cases
+from benchmarks.fixtures import category_page
+from metro_parser.extract import extract_last_page, extract_product, extract_product_links
+
+BACKENDS = available_backends()
+CASES = golden_cases()
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+@pytest.mark.parametrize("name, html_content, expected", CASES, ids=[name for name, _, _ in CASES])
+def test_product_matches_golden(backend, name, html_content, expected):
+    assert extract_product(html_content, f"golden://{name}", backend) == expected
+
+
+@pytest.mark.parametrize("backend", BACKENDS)
+def test_category_page(backend):
+    category = category_page(2, 7, 30).encode("utf-8")
+    assert extract_product_links(category, "https://example.test/c", backend) == [
+        f"https://example.test/products/product-{index}" for index in range(30, 60)
+    ]
+    assert extract_last_page(category, backend) == 7
+
+
+def test_unknown_backend_is_rejected():
+    with pytest.raises(ValueError):
+        extract_product(CASES[0][1], "golden://", "html5lib")
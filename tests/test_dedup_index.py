@@ -0,0 +1,70 @@
+import asyncio
+import os
+import time
+
+from metro_parser.config import DATA_DIR
+from metro_parser.pipeline import ProductPipeline
+from metro_parser.utils.dedup_index import DedupIndex
+
+LINKS = [f"https://online.metro-cc.ru/products/product-{index}" for index in range(5)]
+
+
+def index_path():
+    return os.path.join(DATA_DIR, "dedup_index.sqlite3")
+
+
+def crawl(links, fetched):
+    """
+    Пропускает ссылки через конвейер с индексом дедупликации.
+    :param fetched: Список, в который добавляются загруженные ссылки.
+    :return: Кортеж (записанные товары, конвейер).
+    """
+    written = []
+
+    class Sink:
+        def write(self, product):
+            written.append(product)
+
+    async def fetch(url):
+        fetched.append(url)
+        return url
+
+    def parse(html_content, url):
+        return {"id": url.rsplit("-", 1)[-1], "name": "Товар", "link": url}
+
+    async def main():
+        with DedupIndex(index_path(), window=3600) as dedup:
+            async with ProductPipeline(fetch=fetch, parse=parse, sink=Sink(), dedup=dedup) as pipeline:
+                for link in links:
+                    await pipeline.put(link)
+        return pipeline
+
+    pipeline = asyncio.run(main())
+    return written, pipeline
+
+
+def test_next_run_reuses_products_within_window(data_dir):
+    fetched = []
+    first, _ = crawl(LINKS, fetched)
+    assert sorted(fetched) == LINKS
+
+    fetched.clear()
+    second, pipeline = crawl(LINKS, fetched)
+    assert fetched == []
+    assert pipeline.reused == len(LINKS)
+    assert sorted(second, key=lambda product: product["link"]) == sorted(first, key=lambda product: product["link"])
+
+
+def test_categories_are_not_stored_and_old_entries_expire(data_dir):
+    product = {"id": "1", "name": "Товар", "link": LINKS[0], "categories": ["https://online.metro-cc.ru/category/a"]}
+    with DedupIndex(index_path(), window=3600) as dedup:
+        dedup.add(product)
+
+    with DedupIndex(index_path(), window=3600) as dedup:
+        assert dedup.recent(LINKS[0]) == {"id": "1", "name": "Товар", "link": LINKS[0]}
+        assert dedup.recent(LINKS[1]) is None
+
+    time.sleep(0.05)
+    with DedupIndex(index_path(), window=0.01) as dedup:
+        assert dedup.expired == 1
+        assert dedup.recent(LINKS[0]) is None
@@ -0,0 +1,46 @@
+import asyncio
+import os
+
+from aiohttp import web
+
+from benchmarks.fixtures import CATEGORY_PATH
+from benchmarks.stub_server import build_app
+from metro_parser.config import DATA_DIR
+from metro_parser.distributed import Coordinator, Worker
+from metro_parser.utils.work_queue import SQLiteWorkQueue, DONE, FAILED
+
+PAGES = 1
+PER_PAGE = 5
+MISSING_PRODUCT = "/products/product-3"
+
+
+@web.middleware
+async def missing_product_middleware(request, handler):
+    if request.path == MISSING_PRODUCT:
+        return web.Response(status=404)
+    return await handler(request)
+
+
+def test_missing_product_fails_without_retries(with_stub_server):
+    queue = os.path.join(DATA_DIR, "work_queue.sqlite3")
+
+    async def run(base_url):
+        coordinator = Coordinator([f"{base_url}{CATEGORY_PATH}"], queue=queue)
+        worker = Worker(queue=queue, poll_interval=0.05)
+        await asyncio.gather(coordinator.run(), worker.run())
+        return coordinator, worker
+
+    coordinator, worker = with_stub_server(
+        lambda: build_app(PAGES, PER_PAGE, middlewares=[missing_product_middleware]), run
+    )
+    assert coordinator.products_count == PER_PAGE - 1
+    assert (worker.completed, worker.failed) == (PER_PAGE - 1, 1)
+
+    with SQLiteWorkQueue(queue) as work_queue:
+        assert work_queue.stats()[DONE] == PER_PAGE - 1
+        assert work_queue.stats()[FAILED] == 1
+        (attempts,) = work_queue.connection.execute(
+            "SELECT attempts FROM tasks WHERE url LIKE ?", (f"%{MISSING_PRODUCT}",)
+        ).fetchone()
+    # 404 не повторяется: ссылка выдана воркеру один раз
+    assert attempts == 1
@@ -0,0 +1,65 @@
+import json
+
+import pytest
+from aiohttp import web
+
+from benchmarks.bench_parser_backends import LISTING_URL, available_backends, golden_listing_cases
+from benchmarks.fixtures import CATEGORY_PATH, category_page, product_page
+from benchmarks.stub_server import build_app
+from metro_parser import parser as parser_module
+from metro_parser.config import OUTPUT_JSONL_FILE
+from metro_parser.extract import extract_embedded_products, extract_listing, extract_product
+from metro_parser.parser import MetroParser
+from metro_parser.utils.file_handler import FileHandler
+
+LISTING_CASES = golden_listing_cases()
+PAGES = 2
+PER_PAGE = 5
+
+
+@pytest.mark.parametrize("backend", available_backends())
+@pytest.mark.parametrize("name, html_content, expected", LISTING_CASES, ids=[name for name, _, _ in LISTING_CASES])
+def test_embedded_products_match_golden(backend, name, html_content, expected):
+    links, _, _ = extract_listing(html_content, LISTING_URL, backend)
+    assert extract_embedded_products(html_content, LISTING_URL, links) == expected
+
+
+def test_embedded_products_equal_product_pages():
+    html = category_page(1, 1, 20, embedded_state=True)
+    links, _, _ = extract_listing(html, LISTING_URL)
+    products = extract_embedded_products(html, LISTING_URL, links)
+    assert set(products) == set(links)
+    for index, link in enumerate(links):
+        assert products[link] == extract_product(product_page(index), link)
+
+
+def test_incomplete_record_is_left_for_product_page():
+    html = category_page(1, 1, 3, embedded_state=True)
+    start = html.index("window.__INITIAL_STATE__ = ") + len("window.__INITIAL_STATE__ = ")
+    end = html.index(";</script>", start)
+    state = json.loads(html[start:end])
+    del state["catalog"]["products"][1]["name"]
+    html = html[:start] + json.dumps(state, ensure_ascii=False) + html[end:]
+
+    links, _, _ = extract_listing(html, LISTING_URL)
+    products = extract_embedded_products(html, LISTING_URL, links)
+    assert set(products) == {links[0], links[2]}
+
+
+def test_crawl_with_embedded_state_skips_product_pages(with_stub_server, monkeypatch):
+    monkeypatch.setattr(parser_module, "USE_EMBEDDED_STATE", True)
+    product_requests = []
+
+    @web.middleware
+    async def count_product_requests(request, handler):
+        if request.path.startswith("/products/"):
+            product_requests.append(request.path)
+        return await handler(request)
+
+    async def run(base_url):
+        await MetroParser(f"{base_url}{CATEGORY_PATH}").run()
+
+    with_stub_server(lambda: build_app(PAGES, PER_PAGE, embedded_state=True, middlewares=[count_product_requests]), run)
+
+    assert product_requests == []
+    assert len(list(FileHandler.read_jsonl(OUTPUT_JSONL_FILE))) == PAGES * PER_PAGE
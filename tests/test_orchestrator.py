@@ -0,0 +1,45 @@
+from aiohttp import web
+
+from benchmarks.fixtures import category_page, product_page
+from metro_parser.config import OUTPUT_JSONL_FILE
+from metro_parser.orchestrator import CategoryOrchestrator
+from metro_parser.utils.file_handler import FileHandler
+
+PER_PAGE = 5
+
+
+def build_alias_app():
+    """
+    Stub-сервер с категориями /category/a и /category/b. В категории b те же товары,
+    что в a, но под другими ссылками: /products/alias-N отдаёт страницу товара N с тем же артикулом.
+    """
+
+    async def category(request):
+        html = category_page(1, 1, PER_PAGE)
+        if request.match_info["name"] == "b":
+            html = html.replace("/products/product-", "/products/alias-")
+        return web.Response(text=html, content_type="text/html")
+
+    async def product(request):
+        index = int(request.match_info["slug"].rsplit("-", 1)[-1])
+        return web.Response(text=product_page(index), content_type="text/html")
+
+    app = web.Application()
+    app.router.add_get("/category/{name}", category)
+    app.router.add_get("/products/{slug}", product)
+    return app
+
+
+def test_duplicate_article_keeps_categories_of_all_its_links(with_stub_server):
+    async def run(base_url):
+        orchestrator = CategoryOrchestrator([f"{base_url}/category/a", f"{base_url}/category/b"])
+        await orchestrator.run()
+        return base_url
+
+    base_url = with_stub_server(build_alias_app, run)
+
+    products = list(FileHandler.read_jsonl(OUTPUT_JSONL_FILE))
+    assert len(products) == PER_PAGE
+    assert len({product["id"] for product in products}) == PER_PAGE
+    for product in products:
+        assert sorted(product["categories"]) == [f"{base_url}/category/a", f"{base_url}/category/b"]
@@ -0,0 +1,74 @@
+import asyncio
+
+from metro_parser.pipeline import ProductPipeline
+
+
+class FlakySink:
+    def __init__(self, failing_links=()):
+        """
+        Sink, запись в который не удаётся для ссылок из failing_links.
+        """
+        self.failing_links = set(failing_links)
+        self.products = []
+
+    def write(self, product):
+        if product["link"] in self.failing_links:
+            raise OSError("Диск переполнен")
+        self.products.append(product)
+
+
+def run_pipeline(products, sink, async_sink=False, sink_batch_size=100):
+    """
+    Пропускает готовые товары через конвейер.
+    :return: Кортеж (конвейер, ссылки товаров, переданных в on_written).
+    """
+    notified = []
+
+    async def main():
+        async with ProductPipeline(
+            fetch=None,
+            parse=None,
+            sink=sink,
+            on_written=lambda product: notified.append(product["link"]),
+            async_sink=async_sink,
+            sink_batch_size=sink_batch_size,
+        ) as pipeline:
+            for product in products:
+                await pipeline.put_product(product)
+        return pipeline
+
+    return asyncio.run(main()), notified
+
+
+def product(link, article):
+    return {"id": article, "name": f"Товар {article}", "link": link}
+
+
+def test_duplicate_article_is_written_once_and_its_link_is_done():
+    sink = FlakySink()
+    pipeline, notified = run_pipeline([product("a", "1"), product("b", "1"), product("c", "2")], sink)
+
+    assert [item["link"] for item in sink.products] == ["a", "c"]
+    assert pipeline.duplicates == 1
+    assert sorted(notified) == ["a", "b", "c"]
+
+
+def test_failed_write_does_not_block_other_copies_of_the_article():
+    for batch_size in (1, 100):
+        sink = FlakySink(failing_links={"a"})
+        pipeline, notified = run_pipeline(
+            [product("a", "1"), product("b", "1"), product("c", "1")], sink, sink_batch_size=batch_size
+        )
+
+        assert [item["link"] for item in sink.products] == ["b"]
+        assert pipeline.duplicates == 1
+        # Ссылка товара, который не удалось записать, не отмечается обработанной
+        assert sorted(notified) == ["b", "c"]
+
+
+def test_async_sink_writes_the_same_products():
+    sink = FlakySink()
+    pipeline, _ = run_pipeline([product(str(index), str(index % 3)) for index in range(9)], sink, async_sink=True)
+
+    assert [item["link"] for item in sink.products] == ["0", "1", "2"]
+    assert pipeline.written == 3
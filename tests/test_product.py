@@ -0,0 +1,31 @@
+import pytest
+
+from benchmarks.bench_parser_backends import golden_cases
+from metro_parser.product import Product
+
+CASES = golden_cases()
+
+
+@pytest.mark.parametrize("expected", [product for _, _, product in CASES], ids=[name for name, _, _ in CASES])
+def test_product_serializes_to_the_same_dict(expected):
+    product = Product.from_dict(expected)
+    assert product.to_dict() == expected
+    assert list(product.to_dict()) == list(expected)
+
+
+def test_store_prices_and_categories_round_trip():
+    item = {
+        "id": "100007",
+        "name": "Стейк",
+        "brand": None,
+        "current_price": 1234.5,
+        "old_price": None,
+        "discount": "-15%",
+        "offline_prices": [{"actual_price": 1200.0, "old_price": None}],
+        "link": "https://online.metro-cc.ru/products/product-7",
+        "store_prices": {"10": {"current_price": 1234.5, "old_price": None, "discount": None, "offline_prices": []}},
+        "categories": ["https://online.metro-cc.ru/category/myasnye/myaso"],
+    }
+    product = Product.from_dict(item)
+    assert (product.current_price, product.discount) == (123450, 15)
+    assert product.to_dict() == item
@@ -0,0 +1,67 @@
+import asyncio
+
+from benchmarks.fixtures import product_slug
+from benchmarks.stub_proxy import StubProxy
+from benchmarks.stub_server import build_app, start_stub_server
+from metro_parser.utils.http_client import HTTPClient
+from metro_parser.utils.proxy_pool import ProxyPool
+from metro_parser.utils.scheduler import RequestScheduler
+
+REQUESTS = 40
+
+
+async def crawl_through_proxies(proxies):
+    runner, base_url = await start_stub_server(build_app())
+    try:
+        pool = ProxyPool([proxy.url for proxy in proxies], window=10, recheck_interval=60)
+        async with HTTPClient(scheduler=RequestScheduler(), proxy_pool=pool, save_responses=False) as client:
+            pages = await asyncio.gather(
+                *(client.fetch(f"{base_url}/products/{product_slug(index)}") for index in range(REQUESTS))
+            )
+            return pages, pool
+    finally:
+        await runner.cleanup()
+
+
+def test_requests_avoid_broken_proxy(data_dir):
+    async def run():
+        good = [await StubProxy("socks5").start(), await StubProxy("http").start()]
+        broken = await StubProxy("socks5", broken=True).start()
+        try:
+            pages, pool = await crawl_through_proxies([*good, broken])
+        finally:
+            for proxy in (*good, broken):
+                await proxy.close()
+        return pages, pool, good
+
+    pages, pool, good = asyncio.run(run())
+    assert len(pages) == REQUESTS and all(pages)
+    states = {proxy.url: proxy for proxy in pool.proxies}
+    broken_state = next(state for url, state in states.items() if url not in {proxy.url for proxy in good})
+    assert broken_state.evicted
+    assert pool.healthy == len(good)
+    # Обе рабочие заглушки получили запросы: нагрузка распределяется между здоровыми прокси
+    assert all(proxy.connections for proxy in good)
+
+
+def test_evicted_proxy_returns_after_successful_check(data_dir):
+    async def run():
+        runner, base_url = await start_stub_server(build_app())
+        proxy = await StubProxy("socks5", broken=True).start()
+        pool = ProxyPool([proxy.url], window=4, check_url=f"{base_url}/products/{product_slug(0)}")
+        try:
+            async with HTTPClient(scheduler=RequestScheduler(), proxy_pool=pool, save_responses=False):
+                state = pool.proxies[0]
+                for _ in range(4):
+                    pool.record(state, False)
+                assert state.evicted and not pool.healthy
+                assert not await pool.check(state)
+
+                proxy.broken = False
+                assert await pool.check(state)
+                return state.evicted, pool.healthy
+        finally:
+            await proxy.close()
+            await runner.cleanup()
+
+    assert asyncio.run(run()) == (False, 1)
@@ -0,0 +1,40 @@
+import os
+
+from metro_parser.config import DATA_DIR
+from metro_parser.utils.response_cache import ResponseCache
+
+
+def accessed_at(cache, url):
+    (value,) = cache.connection.execute("SELECT accessed_at FROM entries WHERE url = ?", (url,)).fetchone()
+    return value
+
+
+def test_access_times_are_written_in_batches(data_dir):
+    directory = os.path.join(DATA_DIR, "cache")
+    with ResponseCache(directory, flush_interval=3600) as cache:
+        cache.store("a", b"page a")
+        stored_at = accessed_at(cache, "a")
+        entry = cache.get("a")
+        assert entry.body == b"page a"
+        # Время доступа пока только в памяти
+        assert accessed_at(cache, "a") == stored_at
+        cache.flush()
+        assert accessed_at(cache, "a") > stored_at
+        cache.get("a")
+        pending = cache._accessed["a"]
+
+    with ResponseCache(directory) as cache:
+        # При закрытии накопленное время доступа записано
+        assert accessed_at(cache, "a") == pending
+
+
+def test_eviction_uses_pending_access_times(data_dir):
+    directory = os.path.join(DATA_DIR, "cache")
+    with ResponseCache(directory, max_size=25, evict_target=0.8, flush_interval=3600) as cache:
+        cache.store("old", b"0123456789")
+        cache.store("new", b"abcdefghij")
+        # "old" использован позже "new", но это ещё не записано в индекс
+        cache.get("old")
+        cache.store("third", b"ABCDEFGHIJ")
+        assert cache.get("old") is not None
+        assert cache.get("new") is None
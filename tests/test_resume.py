@@ -0,0 +1,77 @@
+from aiohttp import web
+
+from benchmarks.fixtures import CATEGORY_PATH
+from benchmarks.stub_server import build_app
+from metro_parser.config import OUTPUT_JSONL_FILE
+from metro_parser.parser import MetroParser
+from metro_parser.utils.file_handler import FileHandler
+
+PAGES = 4
+PER_PAGE = 5
+
+
+def failing_page_middleware(page, failures):
+    """
+    Middleware, отвечающее 403 на страницу категории page, пока в failures есть элемент.
+    """
+
+    @web.middleware
+    async def middleware(request, handler):
+        if failures and request.path == CATEGORY_PATH and request.query.get("page") == str(page):
+            return web.Response(status=403)
+        return await handler(request)
+
+    return middleware
+
+
+def crawl(with_stub_server, make_app, resume):
+    async def run(base_url):
+        parser = MetroParser(f"{base_url}{CATEGORY_PATH}")
+        await parser.run(resume=resume)
+        return parser
+
+    return with_stub_server(make_app, run)
+
+
+def written_links():
+    return {product["link"] for product in FileHandler.read_jsonl(OUTPUT_JSONL_FILE)}
+
+
+def test_resume_with_pagination_skips_loaded_pages(with_stub_server):
+    failures = [True]
+    make_app = lambda: build_app(PAGES, PER_PAGE, middlewares=[failing_page_middleware(3, failures)])
+
+    parser = crawl(with_stub_server, make_app, resume=False)
+    assert not parser.listing_complete
+    assert len(written_links()) == (PAGES - 1) * PER_PAGE
+
+    failures.clear()
+    parser = crawl(with_stub_server, make_app, resume=True)
+    assert parser.listing_complete
+    assert len(written_links()) == PAGES * PER_PAGE
+
+
+def test_resume_after_failed_next_page_follows_remaining_pages(with_stub_server):
+    failures = [True]
+    make_app = lambda: build_app(PAGES, PER_PAGE, paginate=False, middlewares=[failing_page_middleware(3, failures)])
+
+    parser = crawl(with_stub_server, make_app, resume=False)
+    assert not parser.listing_complete
+    assert len(written_links()) == 2 * PER_PAGE
+
+    # Страница 3 снова доступна: переход по следующим страницам должен дойти до конца категории
+    failures.clear()
+    parser = crawl(with_stub_server, make_app, resume=True)
+    assert parser.listing_complete
+    assert len(written_links()) == PAGES * PER_PAGE
+
+
+def test_resume_after_complete_follow_next_crawl(with_stub_server):
+    make_app = lambda: build_app(PAGES, PER_PAGE, paginate=False)
+
+    parser = crawl(with_stub_server, make_app, resume=False)
+    assert parser.listing_complete
+
+    parser = crawl(with_stub_server, make_app, resume=True)
+    assert parser.listing_complete
+    assert len(written_links()) == PAGES * PER_PAGE
@@ -0,0 +1,44 @@
+import pytest
+
+from benchmarks.fixtures import product_data, product_page
+from metro_parser.backends import PARSER_BACKENDS
+from metro_parser.extract import PRICE_KEYS, extract_store_product
+
+STORES = ("10", "12", "16")
+URL = "https://online.metro-cc.ru/products/product-7"
+INDEX = 7
+
+
+def expected_price(store):
+    data = product_data(INDEX, store)
+    return data["rubles"] + data["pennies"] / 100
+
+
+@pytest.mark.parametrize("backend", PARSER_BACKENDS)
+def test_prices_are_parsed_in_every_store(backend):
+    pages = {store: product_page(INDEX, store) for store in STORES}
+    product = extract_store_product(pages, URL, STORES, backend)
+
+    assert product["id"] == product_data(INDEX)["id"]
+    assert list(product["store_prices"]) == list(STORES)
+    for store in STORES:
+        assert product["store_prices"][store]["current_price"] == pytest.approx(expected_price(store))
+    assert product["current_price"] == pytest.approx(expected_price(STORES[0]))
+
+
+def test_main_prices_come_from_first_configured_store():
+    # Порядок страниц не определяет основной магазин
+    pages = {store: product_page(INDEX, store) for store in reversed(STORES)}
+    product = extract_store_product(pages, URL, STORES)
+    assert product["current_price"] == pytest.approx(expected_price(STORES[0]))
+
+
+def test_main_prices_are_empty_when_first_store_failed():
+    pages = {store: product_page(INDEX, store) for store in STORES[1:]}
+    product = extract_store_product(pages, URL, STORES)
+
+    assert product["id"] == product_data(INDEX)["id"]
+    assert all(product[key] is None for key in PRICE_KEYS)
+    assert list(product["store_prices"]) == list(STORES[1:])
+    for store in STORES[1:]:
+        assert product["store_prices"][store]["current_price"] == pytest.approx(expected_price(store))